@@ -1,8 +1,10 @@
 import time
 import json
+import uuid
+import asyncio
 import traceback
 from datetime import datetime
-from sqlalchemy import select, update
+from sqlalchemy import select, update, func
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -11,8 +13,14 @@ from models.device_model import Device, DeviceSchema
 from models.firmware_model import Firmware
 from models.model_model import Model
 from models.device_to_model_model import DeviceModelRelation
+from models.device_command_model import DeviceCommand
 import routes.device.request_schema as ReqeustSchema
 from utils.connection_manage import ConnectionManager
+from utils.log_manage import LogManager
+from utils.log_store_manage import DeviceLogStore
+from utils.write_behind_manage import DeviceWriteBehind
+from utils.rollout_manage import RolloutManager
+from utils.sql_manage import async_session_maker
 from utils.config_manage import ConfigManage
 import controllers.device.exception as DeviceExc
 import controllers.model.exception as ModelExc
@@ -22,6 +30,19 @@ import utils.exception as GeneralExc
 
 
 class DeviceController:
+
+    # Coalescing rule of commands queued for offline device, (rule, params key):
+    # `latest` only the newest pending command of the task survives,
+    # `dedupe` new command is dropped when the same one (same params key, if any) is already pending.
+    OFFLINE_COMMAND_RULES = {
+        "MODE_SWITCH": ("latest", None),
+        "MODEL_SWITCH": ("latest", None),
+        "OTA": ("latest", None),
+        "RESET": ("dedupe", None),
+        "MODEL_DOWNLOAD": ("dedupe", "model_id")
+    }
+    # Running bulk command dispatches, kept referenced until they settle even if the client stopped reading.
+    bulk_dispatches: set = set()
     
     @classmethod
     async def create_device(cls, db: AsyncSession, user_name: str, password: str, chip: str, mac: str):
@@ -112,6 +133,7 @@ class DeviceController:
             query = select(
                 Device,
                 Model.name.label("model_name"), # Model 的 name
+                Model.labels.label("model_labels"), # Model 的 labels
                 Firmware.name.label("firmware_name") # Firmware 的 name
             ).outerjoin(
                 Model, Device.current_model_id == Model.id
@@ -131,6 +153,7 @@ class DeviceController:
             if row:
                 device = row[0]
                 device.model_name = row.model_name
+                device.model_labels = row.model_labels
                 device.firmware_name = row.firmware_name
 
                 connection_state = ConnectionManager.get_device_connection_state(device_id=str(device.id))
@@ -205,14 +228,16 @@ class DeviceController:
                 raise FirmwareExc.FirmwareNotFound(details=f"Firmware with ID {firmware_id} not found.")
             
 
-            if not ConnectionManager.get_device_connection_state(device_id=device_id):
-                raise DeviceExc.DeviceNotConnected(details=f"Cannot deploy firmware, device {device_id} is offline.")
-
             task_params = {
                 "firmware_id": firmware_id,
                 "firmware_name": firmware.name,
                 "download_path":  f"{ConfigManage.SERVER_DOMAIN}/api/firmware/download/{user_id}/{firmware_id}"
             }
+
+            if not ConnectionManager.get_device_connection_state(device_id=device_id):
+                return await cls.enqueue_offline_command(db=db, user_id=user_id, device_id=device_id, task="OTA", task_params=task_params)
+
+            await cls.supersede_offline_commands(db=db, device_id=device_id, task="OTA")
             await ConnectionManager.send_task_to_device(user_id=user_id, device_id=device_id, task="OTA", task_params=task_params)
 
             return { 
@@ -226,7 +251,7 @@ class DeviceController:
         except FirmwareExc.FirmwareNotFound:
             raise
 
-        except DeviceExc.DeviceNotConnected:
+        except DeviceExc.DeviceCommandQueueFull:
             raise
 
         except SQLAlchemyError as e:
@@ -251,7 +276,7 @@ class DeviceController:
                 raise DeviceExc.DeviceNotFound(details=f"Device with ID {device_id} not found or permission denied.")
             
             if not ConnectionManager.get_device_connection_state(device_id=device_id):
-                raise DeviceExc.DeviceNotConnected(details=f"Cannot reset device, device {device_id} is offline.")
+                return await cls.enqueue_offline_command(db=db, user_id=user_id, device_id=device_id, task="RESET")
 
             await ConnectionManager.send_task_to_device(user_id=user_id, device_id=device_id, task="RESET")
 
@@ -263,7 +288,7 @@ class DeviceController:
         except DeviceExc.DeviceNotFound:
             raise
 
-        except DeviceExc.DeviceNotConnected:
+        except DeviceExc.DeviceCommandQueueFull:
             raise
 
         except SQLAlchemyError as e:
@@ -322,13 +347,14 @@ class DeviceController:
             if device is None:
                 raise DeviceExc.DeviceNotFound(details=f"Device with ID {device_id} not found or permission denied.")
             
-            if not ConnectionManager.get_device_connection_state(device_id=device_id):
-                raise DeviceExc.DeviceNotConnected(details=f"Cannot switch operation mode, device {device_id} is offline.")
-
             task_params = {
                 "mode": mode 
             }
 
+            if not ConnectionManager.get_device_connection_state(device_id=device_id):
+                return await cls.enqueue_offline_command(db=db, user_id=user_id, device_id=device_id, task="MODE_SWITCH", task_params=task_params)
+
+            await cls.supersede_offline_commands(db=db, device_id=device_id, task="MODE_SWITCH")
             await ConnectionManager.send_task_to_device(user_id=user_id, device_id=device_id, task="MODE_SWITCH", task_params=task_params)
 
             return { 
@@ -340,7 +366,7 @@ class DeviceController:
         except DeviceExc.DeviceNotFound:
             raise
 
-        except DeviceExc.DeviceNotFound:
+        except DeviceExc.DeviceCommandQueueFull:
             raise
 
         except SQLAlchemyError as e:
@@ -373,14 +399,14 @@ class DeviceController:
                 raise ModelExc.ModelAlreadyDeployed(details=f"Model {model_id} has already been deployed to device {device_id}.")
 
 
-            if not ConnectionManager.get_device_connection_state(device_id=device_id):
-                raise DeviceExc.DeviceNotConnected(details=f"Cannot deploy model, device {device_id} is offline.")
-
             task_params = {
                 "model_id": model_id,
                 "download_path": f"{ConfigManage.SERVER_DOMAIN}/api/model/download/{user_id}/{model_id}"
             }
 
+            if not ConnectionManager.get_device_connection_state(device_id=device_id):
+                return await cls.enqueue_offline_command(db=db, user_id=user_id, device_id=device_id, task="MODEL_DOWNLOAD", task_params=task_params)
+
             await ConnectionManager.send_task_to_device(user_id=user_id, device_id=device_id, task="MODEL_DOWNLOAD", task_params=task_params)
 
             return { 
@@ -392,7 +418,7 @@ class DeviceController:
         except DeviceExc.DeviceNotFound:
             raise
         
-        except DeviceExc.DeviceNotConnected:
+        except DeviceExc.DeviceCommandQueueFull:
             raise
 
         except ModelExc.ModelAlreadyDeployed:
@@ -423,14 +449,19 @@ class DeviceController:
             if model is None:
                 raise ModelExc.ModelNotFound(details=f"Model with ID {model_id} not found or permission denied.")
             
-            if not ConnectionManager.get_device_connection_state(device_id=device_id):
-                raise DeviceExc.DeviceNotConnected(details=f"Cannot switch model, device {device_id} is offline.")
-
             task_params = {
                 "model_id": model_id,
                 "model_name": model.name
             }
-            await ConnectionManager.send_task_to_device(user_id=user_id, device_id=device_id, task="MODEL_SWITCH", task_params=task_params)
+            task_context = {
+                "labels": model.labels
+            }
+
+            if not ConnectionManager.get_device_connection_state(device_id=device_id):
+                return await cls.enqueue_offline_command(db=db, user_id=user_id, device_id=device_id, task="MODEL_SWITCH", task_params=task_params, task_context=task_context)
+
+            await cls.supersede_offline_commands(db=db, device_id=device_id, task="MODEL_SWITCH")
+            await ConnectionManager.send_task_to_device(user_id=user_id, device_id=device_id, task="MODEL_SWITCH", task_params=task_params, task_context=task_context)
 
             return { 
                 "success": True,
@@ -443,7 +474,7 @@ class DeviceController:
         except ModelExc.ModelNotFound:
             raise
 
-        except DeviceExc.DeviceNotConnected:
+        except DeviceExc.DeviceCommandQueueFull:
             raise
 
         except SQLAlchemyError as e:
@@ -456,37 +487,339 @@ class DeviceController:
         
     
     @classmethod
-    async def task_completion_update(cls, db: AsyncSession, user_id: str, device_id: str, task_info: dict):
+    async def bulk_command(cls, db: AsyncSession, user_id: str, params: ReqeustSchema.BulkCommandParams):
+        """
+            Validate a bulk command and resolve its target devices with one ownership query, then return the
+            NDJSON lines (async generator) of stream_bulk_command.
+        """
         try:
-            update_values = {}
-            task_name = task_info["name"]
-            # result = None
-            print("task_info: ", task_info)
-
-            if task_name == "MODEL_DOWNLOAD":
-                device_model_relation = DeviceModelRelation(**{"device_id": device_id, "model_id": task_info["params"]["model_id"]})
-                db.add(device_model_relation)
-                await db.commit()
+            if params.device_ids is None and params.filter is None:
+                raise DeviceExc.BulkCommandInvalid(details="Either device_ids or filter is required.")
+
+            task = params.task.value
+            task_params, task_context = None, None
+            if task == "MODE_SWITCH":
+                if params.mode is None:
+                    raise DeviceExc.BulkCommandInvalid(details="mode is required by MODE_SWITCH.")
+                task_params = { "mode": params.mode.value }
+
+            elif task == "MODEL_SWITCH":
+                query = select(Model).where(Model.id == cls.parse_bulk_uuid(params.model_id, "model_id")).where(Model.user_id == user_id).where(Model.deleted_time == None)
+                result = await db.execute(query)
+                model = result.scalar_one_or_none()
+                if model is None:
+                    raise ModelExc.ModelNotFound(details=f"Model with ID {params.model_id} not found or permission denied.")
+                task_params = { "model_id": params.model_id, "model_name": model.name }
+                task_context = { "labels": model.labels }
+
+            elif task == "OTA":
+                query = select(Firmware).where(Firmware.id == cls.parse_bulk_uuid(params.firmware_id, "firmware_id")).where(Firmware.user_id == user_id).where(Firmware.deleted_time == None)
+                result = await db.execute(query)
+                firmware = result.scalar_one_or_none()
+                if firmware is None:
+                    raise FirmwareExc.FirmwareNotFound(details=f"Firmware with ID {params.firmware_id} not found.")
+                task_params = {
+                    "firmware_id": params.firmware_id,
+                    "firmware_name": firmware.name,
+                    "download_path":  f"{ConfigManage.SERVER_DOMAIN}/api/firmware/download/{user_id}/{params.firmware_id}"
+                }
 
-            else: 
-                if task_name == "MODE_SWITCH":
-                    update_values["operation_model"] = task_info["params"]["mode"]
-                elif task_name == "OTA":
-                    update_values["firmware_id"] = task_info["params"]["firmware_id"]
-                elif task_name == "MODEL_SWITCH":
-                    update_values["current_model_id"] = task_info["params"]["model_id"]
-
-                query = update(Device)                         \
-                    .where(Device.id == device_id)             \
-                    .where(Device.user_id == user_id)          \
-                    .values(update_values)
-                await db.execute(query)
-                await db.commit()
+            query = select(Device.id).where(Device.user_id == user_id).where(Device.deleted_time == None)
+            missing_ids = []
+            if params.device_ids is not None:
+                requested_ids = {}
+                for device_id in params.device_ids:
+                    try:
+                        requested_ids[str(uuid.UUID(device_id))] = device_id
+                    except ValueError:
+                        missing_ids.append(device_id)
+                query = query.where(Device.id.in_(list(requested_ids.keys())))
+
+            device_filter = params.filter
+            if device_filter and device_filter.operation_model:
+                query = query.where(Device.operation_model == device_filter.operation_model.value)
+            if device_filter and device_filter.current_model_id:
+                query = query.where(Device.current_model_id == cls.parse_bulk_uuid(device_filter.current_model_id, "filter.current_model_id"))
+            if device_filter and device_filter.firmware_id:
+                query = query.where(Device.firmware_id == cls.parse_bulk_uuid(device_filter.firmware_id, "filter.firmware_id"))
+            if device_filter and device_filter.chip:
+                query = query.where(Device.chip == device_filter.chip)
+
+            result = await db.execute(query)
+            device_ids = [str(device_id) for device_id in result.scalars().all()]
+            if params.device_ids is not None:
+                found_ids = set(device_ids)
+                missing_ids += [device_id for key, device_id in requested_ids.items() if key not in found_ids]
+            if device_filter and device_filter.connected is not None:
+                device_ids = [device_id for device_id in device_ids if bool(ConnectionManager.get_device_connection_state(device_id=device_id)) == device_filter.connected]
+
+            return cls.stream_bulk_command(user_id=user_id, task=task, task_params=task_params, task_context=task_context, device_ids=device_ids, missing_ids=missing_ids)
+
+        except DeviceExc.BulkCommandInvalid:
+            raise
+
+        except ModelExc.ModelNotFound:
+            raise
+
+        except FirmwareExc.FirmwareNotFound:
+            raise
 
         except SQLAlchemyError as e:
             await db.rollback()
-            raise GeneralExc.DatabaseError(message="Get device with deviceID failed.", details=str(e))
-            
+            raise GeneralExc.DatabaseError(message="Bulk device command failed.", details=str(e))
+
         except Exception as e:
+            print(traceback.format_exc())
             await db.rollback()
-            raise GeneralExc.DatabaseError(message="Get device with deviceID failed.", details=str(e))
\ No newline at end of file
+            raise GeneralExc.DatabaseError(message="Bulk device command failed.", details=str(e))
+
+
+    @classmethod
+    def parse_bulk_uuid(cls, value: str | None, field: str):
+        try:
+            return uuid.UUID(value)
+        except (TypeError, ValueError):
+            raise DeviceExc.BulkCommandInvalid(details=f"{field} must be a valid id.")
+
+
+    @classmethod
+    async def stream_bulk_command(cls, user_id: str, task: str, task_params: dict | None, task_context: dict | None, device_ids: list[str], missing_ids: list[str]):
+        """
+            Dispatch the task to every device with at most BULK_COMMAND_CONCURRENCY in flight and yield one line per
+            device as it settles: SENT, QUEUED (offline, see enqueue_offline_command) or an error code.
+            Dispatch goes on if the client stops reading, the last line is a summary.
+        """
+        summary = { "total": len(device_ids) + len(missing_ids), "sent": 0, "queued": 0, "failed": 0 }
+        for device_id in missing_ids:
+            summary["failed"] += 1
+            yield json.dumps({ "device_id": device_id, "success": False, "code": "DEVICE_NOT_FOUND", "message": "Device not found or permission denied." }) + "\n"
+
+        # Pending commands replaced by this one are dropped with one statement instead of once per device.
+        online_ids = [device_id for device_id in device_ids if ConnectionManager.get_device_connection_state(device_id=device_id)]
+        if online_ids and cls.OFFLINE_COMMAND_RULES.get(task, (None, None))[0] == "latest":
+            try:
+                async with async_session_maker() as db:
+                    query = update(DeviceCommand)                          \
+                        .where(DeviceCommand.device_id.in_(online_ids))    \
+                        .where(DeviceCommand.task == task)                 \
+                        .where(DeviceCommand.delivered_time == None)       \
+                        .where(DeviceCommand.deleted_time == None)         \
+                        .values(deleted_time=datetime.now())
+                    await db.execute(query)
+                    await db.commit()
+            except SQLAlchemyError:
+                print(traceback.format_exc())
+
+        semaphore = asyncio.Semaphore(ConfigManage.BULK_COMMAND_CONCURRENCY)
+
+        async def dispatch(device_id: str):
+            async with semaphore:
+                return await cls.dispatch_bulk_command(user_id=user_id, device_id=device_id, task=task, task_params=task_params, task_context=task_context)
+
+        dispatches = [asyncio.ensure_future(dispatch(device_id)) for device_id in device_ids]
+        for dispatch_task in dispatches:
+            cls.bulk_dispatches.add(dispatch_task)
+            dispatch_task.add_done_callback(cls.bulk_dispatches.discard)
+
+        for next_result in asyncio.as_completed(dispatches):
+            result = await next_result
+            if not result["success"]:
+                summary["failed"] += 1
+            elif result["status"] == "QUEUED":
+                summary["queued"] += 1
+            else:
+                summary["sent"] += 1
+            yield json.dumps(result) + "\n"
+
+        yield json.dumps({ "summary": summary }) + "\n"
+
+
+    @classmethod
+    async def dispatch_bulk_command(cls, user_id: str, device_id: str, task: str, task_params: dict | None, task_context: dict | None):
+        try:
+            if ConnectionManager.get_device_connection_state(device_id=device_id):
+                await ConnectionManager.send_task_to_device(user_id=user_id, device_id=device_id, task=task, task_params=task_params, task_context=task_context)
+                return { "device_id": device_id, "success": True, "status": "SENT" }
+
+            if task not in cls.OFFLINE_COMMAND_RULES:
+                raise DeviceExc.DeviceNotConnected(details=f"Cannot perform {task}, device {device_id} is offline.")
+
+            async with async_session_maker() as db:
+                await cls.enqueue_offline_command(db=db, user_id=user_id, device_id=device_id, task=task, task_params=task_params, task_context=task_context)
+            return { "device_id": device_id, "success": True, "status": "QUEUED" }
+
+        except GeneralExc.BasedError as e:
+            return { "device_id": device_id, "success": False, "code": e.code, "message": e.message, "details": e.details }
+
+        except Exception as e:
+            print(traceback.format_exc())
+            return { "device_id": device_id, "success": False, "code": "UNKNOWN_ERROR", "message": str(e) }
+
+
+    @classmethod
+    async def task_completion_update(cls, user_id: str, device_id: str, task_info: dict):
+        """Queue the device change of a completed task, written in batches by DeviceWriteBehind."""
+        task_name = task_info["name"]
+        print("task_info: ", task_info)
+        RolloutManager.record_task_result(task_info=task_info, status="COMPLETED")
+
+        if task_name == "MODEL_DOWNLOAD":
+            DeviceWriteBehind.enqueue_relation(device_id=device_id, model_id=task_info["params"]["model_id"])
+            return
+
+        update_values = {}
+        if task_name == "MODE_SWITCH":
+            update_values["operation_model"] = task_info["params"]["mode"]
+        elif task_name == "OTA":
+            update_values["firmware_id"] = task_info["params"]["firmware_id"]
+        elif task_name == "MODEL_SWITCH":
+            update_values["current_model_id"] = task_info["params"]["model_id"]
+
+        if update_values:
+            DeviceWriteBehind.enqueue_update(user_id=user_id, device_id=device_id, values=update_values)
+
+
+    @classmethod
+    async def supersede_offline_commands(cls, db: AsyncSession, device_id: str, task: str):
+        """Drop pending commands replaced by a newer command of the same task (`latest` rule)."""
+        rule, _ = cls.OFFLINE_COMMAND_RULES.get(task, (None, None))
+        if rule != "latest":
+            return
+
+        query = update(DeviceCommand)                              \
+            .where(DeviceCommand.device_id == device_id)           \
+            .where(DeviceCommand.task == task)                     \
+            .where(DeviceCommand.delivered_time == None)           \
+            .where(DeviceCommand.deleted_time == None)             \
+            .values(deleted_time=datetime.now())
+        await db.execute(query)
+
+
+    @classmethod
+    async def enqueue_offline_command(cls, db: AsyncSession, user_id: str, device_id: str, task: str, task_params: dict | None = None, task_context: dict | None = None):
+        rule, key = cls.OFFLINE_COMMAND_RULES.get(task, (None, None))
+
+        if rule == "latest":
+            await cls.supersede_offline_commands(db=db, device_id=device_id, task=task)
+
+        elif rule == "dedupe":
+            query = select(DeviceCommand.params)                   \
+                .where(DeviceCommand.device_id == device_id)       \
+                .where(DeviceCommand.task == task)                 \
+                .where(DeviceCommand.delivered_time == None)       \
+                .where(DeviceCommand.deleted_time == None)
+            result = await db.execute(query)
+            for params in result.scalars().all():
+                if key is None or (params or {}).get(key) == (task_params or {}).get(key):
+                    return {
+                        "success": True,
+                        "data": { "queued": True },
+                        "message": f"Device {device_id} is offline, the same {task} task is already queued."
+                    }
+
+        query = select(func.count(DeviceCommand.id))               \
+            .where(DeviceCommand.device_id == device_id)           \
+            .where(DeviceCommand.delivered_time == None)           \
+            .where(DeviceCommand.deleted_time == None)
+        result = await db.execute(query)
+        if result.scalar_one() >= ConfigManage.OFFLINE_COMMAND_QUEUE_SIZE:
+            await db.rollback()
+            raise DeviceExc.DeviceCommandQueueFull(details=f"Device {device_id} is offline and already has {ConfigManage.OFFLINE_COMMAND_QUEUE_SIZE} queued tasks.")
+
+        db.add(DeviceCommand(device_id=device_id, user_id=user_id, task=task, params=task_params, context=task_context))
+        await db.commit()
+        return {
+            "success": True,
+            "data": { "queued": True },
+            "message": f"Device {device_id} is offline, {task} task is queued and will be sent when device reconnects."
+        }
+
+
+    @classmethod
+    async def drain_offline_commands(cls, db: AsyncSession, user_id: str, device_id: str):
+        """Send the commands queued while the device was offline, in the order they were queued."""
+        try:
+            query = select(DeviceCommand)                          \
+                .where(DeviceCommand.device_id == device_id)       \
+                .where(DeviceCommand.delivered_time == None)       \
+                .where(DeviceCommand.deleted_time == None)         \
+                .order_by(DeviceCommand.created_time)
+            result = await db.execute(query)
+            commands = result.scalars().all()
+            if not commands:
+                return
+
+            print(f"{user_id}:{device_id} - Deliver {len(commands)} queued tasks.")
+            for command in commands:
+                # Only a command really sent leaves the queue, the rest waits for the next connection in order.
+                try:
+                    sent = await ConnectionManager.send_task_to_device(user_id=user_id, device_id=device_id, task=command.task, task_params=command.params, task_context=command.context)
+                except Exception as e:
+                    print(f"{user_id}:{device_id} - Deliver queued task {command.id} failed: {e}")
+                    sent = False
+                if not sent:
+                    break
+                command.delivered_time = datetime.now()
+            await db.commit()
+
+        except SQLAlchemyError as e:
+            await db.rollback()
+            raise GeneralExc.DatabaseError(message="Deliver queued device tasks failed.", details=str(e))
+
+
+    @classmethod
+    async def get_device_log_tail(cls, db: AsyncSession, user_id: str, device_id: str, limit: int):
+        try:
+            query = select(Device.id).where(Device.id == device_id).where(Device.user_id == user_id).where(Device.deleted_time == None)
+            result = await db.execute(query)
+            if result.scalar_one_or_none() is None:
+                raise DeviceExc.DeviceNotFound(details=f"Device with ID {device_id} not found or permission denied.")
+
+            # Ring buffer of the connected device first, the on-disk log when it does not hold enough lines.
+            logs = LogManager.tail(user_id=user_id, device_id=device_id, limit=limit)
+            if len(logs) < limit:
+                logs = await DeviceLogStore.tail(device_id=device_id, limit=limit) or logs
+
+            return {
+                "success": True,
+                "data": {
+                    "logs": logs
+                },
+                "message": "Get device log tail sucessfully."
+            }
+
+        except DeviceExc.DeviceNotFound:
+            raise
+
+        except SQLAlchemyError as e:
+            raise GeneralExc.DatabaseError(message="Get device log tail failed.", details=str(e))
+
+        except Exception as e:
+            raise GeneralExc.UnknownError(message="Get device log tail failed.", details=str(e))
+
+
+    @classmethod
+    async def get_device_log_range(cls, db: AsyncSession, user_id: str, device_id: str, start: float, end: float, limit: int):
+        try:
+            query = select(Device.id).where(Device.id == device_id).where(Device.user_id == user_id).where(Device.deleted_time == None)
+            result = await db.execute(query)
+            if result.scalar_one_or_none() is None:
+                raise DeviceExc.DeviceNotFound(details=f"Device with ID {device_id} not found or permission denied.")
+
+            logs = await DeviceLogStore.range(device_id=device_id, start_time=start, end_time=end, limit=limit)
+            return {
+                "success": True,
+                "data": {
+                    "logs": logs
+                },
+                "message": "Get device log range sucessfully."
+            }
+
+        except DeviceExc.DeviceNotFound:
+            raise
+
+        except SQLAlchemyError as e:
+            raise GeneralExc.DatabaseError(message="Get device log range failed.", details=str(e))
+
+        except Exception as e:
+            raise GeneralExc.UnknownError(message="Get device log range failed.", details=str(e))
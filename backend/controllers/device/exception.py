@@ -23,4 +23,14 @@ class DeviceTaskFailed(BasedError):
 class DevicePermissionDenied(BasedError):
     """當使用者試圖存取不屬於他們的設備時拋出此錯誤。"""
     def __init__(self, message: str = "Permission denied for this device.", details: str | None = None):
-        super().__init__(message, details, code="DEVICE_PERMISSION_DENIED", status_code=403)
\ No newline at end of file
+        super().__init__(message, details, code="DEVICE_PERMISSION_DENIED", status_code=403)
+
+class DeviceCommandQueueFull(BasedError):
+    """當離線設備的待送指令佇列已滿時拋出此錯誤。"""
+    def __init__(self, message: str = "Device command queue is full.", details: str | None = None):
+        super().__init__(message, details, code="DEVICE_COMMAND_QUEUE_FULL", status_code=429)
+
+class BulkCommandInvalid(BasedError):
+    """當批次指令缺少目標設備或任務參數時拋出此錯誤。"""
+    def __init__(self, message: str = "Bulk command is invalid.", details: str | None = None):
+        super().__init__(message, details, code="BULK_COMMAND_INVALID", status_code=400)
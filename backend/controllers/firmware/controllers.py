@@ -1,6 +1,8 @@
 import os
 import json
 import uuid
+import random
+import asyncio
 import traceback
 from pathlib import Path
 from datetime import datetime
@@ -8,19 +10,41 @@ from fastapi import UploadFile
 from fastapi.responses import FileResponse
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
+from sqlalchemy import select, update, insert, func
 
 from models.firmware_model import Firmware
+from models.firmware_rollout_model import FirmwareRollout, FirmwareRolloutDevice
 from models.device_model import Device
 from utils.config_manage import ConfigManage
+from utils.sql_manage import async_session_maker
+from utils.rollout_manage import RolloutManager
+from utils.storage_manage import StorageManager
+from controllers.device.controllers import DeviceController
 import controllers.firmware.exception as FirmwareExc
+import controllers.device.exception as DeviceExc
 import utils.exception as GeneralExc
 
+class LimitedFileResponse(FileResponse):
+    """FileResponse releasing its download slot once sent, also when the client went away in the middle."""
+
+    def __init__(self, path: str, release, **kwargs):
+        super().__init__(path, **kwargs)
+        self.release = release
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.release()
+
+
 class FirmwareController:
+
+    # Simultaneous firmware downloads of this worker, its share of FIRMWARE_DOWNLOAD_CONCURRENCY, see download_firmware
+    download_slots: asyncio.Semaphore | None = None
     
     @classmethod
     async def create_firmware(cls, db: AsyncSession , file: UploadFile,  user_id: str, name: str, description: str):
-        firmware = None
         try:
             query = select(Firmware).where(Firmware.user_id == user_id, Firmware.name == name, Firmware.deleted_time == None)
             result = await db.execute(query)
@@ -33,22 +57,23 @@ class FirmwareController:
 
             directory = f"{ConfigManage.STORAGE_PATH}/firmwares/{user_id}/"
             file_path = f"{directory}{firmware_id}.{file_extension}"
-  
-            
-            firmware = Firmware(name=name, description=description, user_id=user_id, file_path=file_path)
-            db.add(firmware)
-            await db.commit()
-            await db.refresh(firmware)
-
-            os.makedirs(directory, exist_ok=True)
-            with open(file_path, "wb") as f:
-                f.write(await file.read())
+            stored_file = await StorageManager.save_upload(file=file, file_path=file_path, max_size=ConfigManage.FIRMWARE_MAX_SIZE)
 
+            # The row is added only once the file is complete, a failed insert must not leave the file behind.
+            try:
+                firmware = Firmware(name=name, description=description, user_id=user_id, file_path=file_path)
+                db.add(firmware)
+                await db.commit()
+                await db.refresh(firmware)
+            except BaseException:
+                StorageManager.remove_file(file_path)
+                raise
 
             return { 
                 "success": True,
                 "data": {
-                    "firmwares": [firmware]
+                    "firmwares": [firmware],
+                    "file": stored_file
                 },
                 "message": "Upload firmware sucessfully."
             }
@@ -57,10 +82,10 @@ class FirmwareController:
         except FirmwareExc.FirmwareAlreadyExists:
             raise
 
+        except GeneralExc.FileTooLarge:
+            raise
+
         except IOError as e:
-            if firmware and firmware.id:
-                await db.delete(firmware)
-                await db.commit()
             raise FirmwareExc.FileUploadFailed(details=str(e))
 
         except SQLAlchemyError as e:
@@ -147,12 +172,14 @@ class FirmwareController:
 
 
     @classmethod
-    async def download_firmware(cls, db: AsyncSession, user_id: str, firmware_id: str):
+    async def download_firmware(cls, user_id: str, firmware_id: str):
         try:
 
-            query = select(Firmware).where(Firmware.user_id == user_id).where(Firmware.id == firmware_id).where(Firmware.deleted_time == None)
-            result = await db.execute(query)
-            firmware = result.scalar_one_or_none()
+            # Own short session, a download waiting for a slot must not hold a pooled connection.
+            async with async_session_maker() as db:
+                query = select(Firmware).where(Firmware.user_id == user_id).where(Firmware.id == firmware_id).where(Firmware.deleted_time == None)
+                result = await db.execute(query)
+                firmware = result.scalar_one_or_none()
 
             if firmware is None:
                 raise FirmwareExc.FirmwareNotFound(details=f"Firmware with ID {firmware_id} not found.")
@@ -161,7 +188,20 @@ class FirmwareController:
             if not os.path.exists(path):
                 raise FirmwareExc.PhysicalFileNotFound(details=f"File for firmware ID {firmware_id} is missing at path: {path}")
 
-            return FileResponse(path)
+            # Caps the uplink used by OTA, a device waits for a free slot up to FIRMWARE_DOWNLOAD_WAIT seconds.
+            # The cap is for the whole server, every worker gets its share of it.
+            if cls.download_slots is None:
+                cls.download_slots = asyncio.Semaphore(max(ConfigManage.FIRMWARE_DOWNLOAD_CONCURRENCY // max(ConfigManage.SERVER_WORKERS, 1), 1))
+            try:
+                await asyncio.wait_for(cls.download_slots.acquire(), timeout=ConfigManage.FIRMWARE_DOWNLOAD_WAIT)
+            except asyncio.TimeoutError:
+                raise FirmwareExc.FirmwareDownloadBusy(details=f"retry_after: {round(random.uniform(1, 2) * ConfigManage.FIRMWARE_DOWNLOAD_WAIT)}")
+
+            try:
+                return LimitedFileResponse(path, release=cls.download_slots.release)
+            except BaseException:
+                cls.download_slots.release()
+                raise
 
 
         except FirmwareExc.FirmwareNotFound:
@@ -170,9 +210,229 @@ class FirmwareController:
         except FirmwareExc.PhysicalFileNotFound:
             raise
 
+        except FirmwareExc.FirmwareDownloadBusy:
+            raise
+
         except SQLAlchemyError as e:
             raise GeneralExc.DatabaseError(message="Get firmwares failed.", details=str(e))
         
         except Exception as e:
             raise GeneralExc.UnknownError(message="Get firmwares failed.", details=str(e))
 
+
+
+class FirmwareRolloutController:
+
+    @classmethod
+    async def create_rollout(cls, db: AsyncSession, user_id: str, firmware_id: str, device_ids: list[str] | None, canary_percent: float | None, wave_multiplier: float | None, error_threshold: float | None):
+        try:
+            firmware_id = DeviceController.parse_bulk_uuid(firmware_id, "firmware_id")
+            if device_ids is not None:
+                device_ids = [DeviceController.parse_bulk_uuid(device_id, "device_ids") for device_id in device_ids]
+
+            query = select(Firmware).where(Firmware.id == firmware_id).where(Firmware.user_id == user_id).where(Firmware.deleted_time == None)
+            result = await db.execute(query)
+            if result.scalar_one_or_none() is None:
+                raise FirmwareExc.FirmwareNotFound(details=f"Firmware with ID {firmware_id} not found.")
+
+            # Ownership of every target is checked with one query, ids of other users are ignored.
+            query = select(Device.id).where(Device.user_id == user_id).where(Device.deleted_time == None)
+            if device_ids is not None:
+                query = query.where(Device.id.in_(device_ids))
+            result = await db.execute(query)
+            targets = list(result.scalars().all())
+            if not targets:
+                raise FirmwareExc.RolloutNoTargets(details="None of the devices exists or belongs to the user.")
+
+            # Canary and every wave are a random sample of the fleet.
+            random.shuffle(targets)
+            canary_percent = canary_percent or ConfigManage.ROLLOUT_CANARY_PERCENT
+            wave_multiplier = wave_multiplier or ConfigManage.ROLLOUT_WAVE_MULTIPLIER
+            wave_sizes = RolloutManager.plan_waves(total=len(targets), canary_percent=canary_percent, wave_multiplier=wave_multiplier)
+
+            rollout = FirmwareRollout(
+                user_id=user_id,
+                firmware_id=firmware_id,
+                status="RUNNING",
+                canary_percent=canary_percent,
+                wave_multiplier=wave_multiplier,
+                error_threshold=ConfigManage.ROLLOUT_ERROR_THRESHOLD if error_threshold is None else error_threshold,
+                wave_count=len(wave_sizes),
+                current_wave=0,
+                runner_id=uuid.uuid4()
+            )
+            db.add(rollout)
+            await db.flush()
+
+            rows = []
+            for wave, size in enumerate(wave_sizes):
+                start = sum(wave_sizes[:wave])
+                rows += [{ "rollout_id": rollout.id, "device_id": device_id, "wave": wave, "status": "PENDING" } for device_id in targets[start:start + size]]
+            await db.execute(insert(FirmwareRolloutDevice), rows)
+            await db.commit()
+            await db.refresh(rollout)
+
+            RolloutManager.start_runner(rollout_id=rollout.id, runner_id=rollout.runner_id)
+            return {
+                "success": True,
+                "data": {
+                    "rollouts": [await cls.describe_rollout(db=db, rollout=rollout)]
+                },
+                "message": f"Firmware rollout to {len(targets)} devices in {len(wave_sizes)} waves started."
+            }
+
+        except FirmwareExc.FirmwareNotFound:
+            raise
+
+        except FirmwareExc.RolloutNoTargets:
+            raise
+
+        except DeviceExc.BulkCommandInvalid:
+            raise
+
+        except SQLAlchemyError as e:
+            await db.rollback()
+            raise GeneralExc.DatabaseError(message="Create firmware rollout failed.", details=str(e))
+
+        except Exception as e:
+            print(traceback.format_exc())
+            await db.rollback()
+            raise GeneralExc.UnknownError(message="Create firmware rollout failed.", details=str(e))
+
+
+    @classmethod
+    async def describe_rollout(cls, db: AsyncSession, rollout: FirmwareRollout):
+        query = select(FirmwareRolloutDevice.wave, FirmwareRolloutDevice.status, func.count(FirmwareRolloutDevice.id)) \
+            .where(FirmwareRolloutDevice.rollout_id == rollout.id)                                                    \
+            .group_by(FirmwareRolloutDevice.wave, FirmwareRolloutDevice.status)
+        result = await db.execute(query)
+        waves = [{ "wave": wave + 1, "devices": 0 } for wave in range(rollout.wave_count)]
+        for wave, status, count in result.all():
+            waves[wave][status] = count
+            waves[wave]["devices"] += count
+
+        return {
+            "id": rollout.id,
+            "firmware_id": rollout.firmware_id,
+            "status": rollout.status,
+            "pause_reason": rollout.pause_reason,
+            "current_wave": rollout.current_wave + 1,
+            "wave_count": rollout.wave_count,
+            "canary_percent": rollout.canary_percent,
+            "wave_multiplier": rollout.wave_multiplier,
+            "error_threshold": rollout.error_threshold,
+            "created_time": rollout.created_time,
+            "waves": waves
+        }
+
+
+    @classmethod
+    async def get_user_rollout(cls, db: AsyncSession, user_id: str, rollout_id: str, lock: bool = False):
+        query = select(FirmwareRollout).where(FirmwareRollout.id == rollout_id).where(FirmwareRollout.user_id == user_id).where(FirmwareRollout.deleted_time == None)
+        if lock:
+            query = query.with_for_update()
+        result = await db.execute(query)
+        rollout = result.scalar_one_or_none()
+        if rollout is None:
+            raise FirmwareExc.RolloutNotFound(details=f"Firmware rollout with ID {rollout_id} not found.")
+        return rollout
+
+
+    @classmethod
+    async def get_rollouts(cls, db: AsyncSession, user_id: str):
+        try:
+            query = select(FirmwareRollout).where(FirmwareRollout.user_id == user_id).where(FirmwareRollout.deleted_time == None).order_by(FirmwareRollout.created_time.desc())
+            result = await db.execute(query)
+            return {
+                "success": True,
+                "data": {
+                    "rollouts": [await cls.describe_rollout(db=db, rollout=rollout) for rollout in result.scalars().all()]
+                },
+                "message": "Get firmware rollouts sucessfully."
+            }
+
+        except SQLAlchemyError as e:
+            raise GeneralExc.DatabaseError(message="Get firmware rollouts failed.", details=str(e))
+
+        except Exception as e:
+            raise GeneralExc.UnknownError(message="Get firmware rollouts failed.", details=str(e))
+
+
+    @classmethod
+    async def get_rollout(cls, db: AsyncSession, user_id: str, rollout_id: str):
+        try:
+            rollout = await cls.get_user_rollout(db=db, user_id=user_id, rollout_id=rollout_id)
+            return {
+                "success": True,
+                "data": {
+                    "rollouts": [await cls.describe_rollout(db=db, rollout=rollout)]
+                },
+                "message": "Get firmware rollout sucessfully."
+            }
+
+        except FirmwareExc.RolloutNotFound:
+            raise
+
+        except SQLAlchemyError as e:
+            raise GeneralExc.DatabaseError(message="Get firmware rollout failed.", details=str(e))
+
+        except Exception as e:
+            raise GeneralExc.UnknownError(message="Get firmware rollout failed.", details=str(e))
+
+
+    @classmethod
+    async def change_rollout_status(cls, db: AsyncSession, user_id: str, rollout_id: str, action: str, error_threshold: float | None = None, retry_failed: bool = False):
+        """
+            action: PAUSE (RUNNING), RESUME (PAUSED) or CANCEL (RUNNING / PAUSED).
+            The runner of a paused / cancelled rollout stops at its next check, a resumed rollout gets a new runner.
+        """
+        allowed = { "PAUSE": ("RUNNING",), "RESUME": ("PAUSED",), "CANCEL": ("RUNNING", "PAUSED") }
+        try:
+            rollout = await cls.get_user_rollout(db=db, user_id=user_id, rollout_id=rollout_id, lock=True)
+            if rollout.status not in allowed[action]:
+                raise FirmwareExc.RolloutStateConflict(details=f"Cannot {action.lower()} a {rollout.status.lower()} rollout.")
+
+            if action == "PAUSE":
+                rollout.status = "PAUSED"
+                rollout.pause_reason = "MANUAL"
+            elif action == "CANCEL":
+                rollout.status = "CANCELLED"
+            else:
+                if error_threshold is not None:
+                    rollout.error_threshold = error_threshold
+                if retry_failed:
+                    query = update(FirmwareRolloutDevice)                                   \
+                        .where(FirmwareRolloutDevice.rollout_id == rollout.id)              \
+                        .where(FirmwareRolloutDevice.wave == rollout.current_wave)          \
+                        .where(FirmwareRolloutDevice.status.in_(["FAILED", "SKIPPED"]))     \
+                        .values(status="PENDING", reason=None)
+                    await db.execute(query)
+                rollout.status = "RUNNING"
+                rollout.pause_reason = None
+                rollout.wave_started_time = datetime.now()
+                rollout.runner_id = uuid.uuid4()
+            await db.commit()
+
+            if action == "RESUME":
+                RolloutManager.start_runner(rollout_id=rollout.id, runner_id=rollout.runner_id)
+            return {
+                "success": True,
+                "data": {
+                    "rollouts": [await cls.describe_rollout(db=db, rollout=rollout)]
+                },
+                "message": f"Firmware rollout {rollout.status.lower()}."
+            }
+
+        except FirmwareExc.RolloutNotFound:
+            raise
+
+        except FirmwareExc.RolloutStateConflict:
+            raise
+
+        except SQLAlchemyError as e:
+            await db.rollback()
+            raise GeneralExc.DatabaseError(message=f"{action.capitalize()} firmware rollout failed.", details=str(e))
+
+        except Exception as e:
+            await db.rollback()
+            raise GeneralExc.UnknownError(message=f"{action.capitalize()} firmware rollout failed.", details=str(e))
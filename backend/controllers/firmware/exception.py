@@ -23,4 +23,24 @@ class FileUploadFailed(BasedError):
 class PhysicalFileNotFound(BasedError):
     """當資料庫中有紀錄，但實體檔案在伺服器上遺失時拋出。"""
     def __init__(self, message: str = "Firmware file is missing from the server.", details: str | None = None):
-        super().__init__(message, details, code="FIRMWARE_FILE_NOT_FOUND", status_code=404)
\ No newline at end of file
+        super().__init__(message, details, code="FIRMWARE_FILE_NOT_FOUND", status_code=404)
+
+class FirmwareDownloadBusy(BasedError):
+    """當同時下載韌體的數量已達上限且等待逾時時拋出此錯誤。"""
+    def __init__(self, message: str = "Too many firmware downloads, retry later.", details: str | None = None):
+        super().__init__(message, details, code="FIRMWARE_DOWNLOAD_BUSY", status_code=503)
+
+class RolloutNotFound(BasedError):
+    """當找不到指定的韌體發佈 (rollout) 時拋出此錯誤。"""
+    def __init__(self, message: str = "Firmware rollout not found.", details: str | None = None):
+        super().__init__(message, details, code="ROLLOUT_NOT_FOUND", status_code=404)
+
+class RolloutNoTargets(BasedError):
+    """當韌體發佈沒有任何可部署的設備時拋出此錯誤。"""
+    def __init__(self, message: str = "Firmware rollout has no target device.", details: str | None = None):
+        super().__init__(message, details, code="ROLLOUT_NO_TARGETS", status_code=400)
+
+class RolloutStateConflict(BasedError):
+    """當韌體發佈目前的狀態不允許此操作 (例如恢復已完成的發佈) 時拋出此錯誤。"""
+    def __init__(self, message: str = "Firmware rollout state does not allow this operation.", details: str | None = None):
+        super().__init__(message, details, code="ROLLOUT_STATE_CONFLICT", status_code=409)
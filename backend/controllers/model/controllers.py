@@ -15,6 +15,7 @@ from models.model_model import Model
 from models.device_model import Device
 from models.device_to_model_model import DeviceModelRelation
 from utils.config_manage import ConfigManage
+from utils.storage_manage import StorageManager
 import utils.exception as GeneralExc
 import controllers.model.exception as ModelExc
 
@@ -22,7 +23,6 @@ class ModelController:
     
     @classmethod
     async def create_model(cls, db: AsyncSession , file: UploadFile,  user_id: str, name: str, description: str, model_type: str, labels: str):
-        model = None
         try:
             query = select(Model).where(Model.user_id == user_id, Model.name == name, Model.deleted_time == None)
             result = await db.execute(query)
@@ -36,21 +36,23 @@ class ModelController:
             file_extension = Path(original_filename).suffix
             directory = f"{ConfigManage.STORAGE_PATH}/models/{user_id}/"
             file_path = f"{directory}{model_id}.{file_extension}"
-            
-            model = Model(id=model_id, name=name, description=description, user_id=user_id, model_type=model_type, labels=parsed_labels, file_path=file_path)
-            db.add(model)
-            await db.commit()
-            await db.refresh(model)
+            stored_file = await StorageManager.save_upload(file=file, file_path=file_path, max_size=ConfigManage.MODEL_MAX_SIZE)
 
-            
-            os.makedirs(directory, exist_ok=True)
-            with open(file_path, "wb") as f:
-                f.write(await file.read())
+            # The row is added only once the file is complete, a failed insert must not leave the file behind.
+            try:
+                model = Model(id=model_id, name=name, description=description, user_id=user_id, model_type=model_type, labels=parsed_labels, file_path=file_path)
+                db.add(model)
+                await db.commit()
+                await db.refresh(model)
+            except BaseException:
+                StorageManager.remove_file(file_path)
+                raise
 
             return { 
                 "success": True,
                 "data": {
-                    "models": [model]
+                    "models": [model],
+                    "file": stored_file
                 },
                 "message": "Upload model sucessfully."
             }
@@ -59,15 +61,15 @@ class ModelController:
         except ModelExc.ModelAlreadyExists:
             raise
 
+        except GeneralExc.FileTooLarge:
+            raise
+
         
         except json.JSONDecodeError as e:
             raise ModelExc.InvalidLabelFormat(details=str(e))
         
 
         except IOError as e:
-            if model and model.id:
-                await db.delete(model)
-                await db.commit()
             raise ModelExc.ModelUploadFailed(details=str(e))
 
         except SQLAlchemyError as e:
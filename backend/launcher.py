@@ -0,0 +1,106 @@
+import os
+import signal
+import socket
+import asyncio
+import multiprocessing
+import uvicorn
+
+from utils.config_manage import ConfigManage
+from utils.presence_manage import LocalBroker
+
+
+'''
+    Multi-process entry point, run `python launcher.py` instead of `python main.py`.
+
+    The supervisor binds the listening socket once and starts SERVER_WORKERS uvicorn workers sharing it.
+    It also hosts the presence broker, so every worker sees which worker owns each device / frontend websocket,
+    and REST commands landing on any worker are routed to the owner of the device socket.
+    A crashed worker is restarted alone, devices connected to other workers are not affected.
+'''
+
+RESTART_DELAY = 1.0
+MONITOR_INTERVAL = 1.0
+
+
+def run_worker(worker_index: int, sock: socket.socket):
+    config = uvicorn.Config("main:app", ws_ping_interval=600, log_level="debug")
+    server = uvicorn.Server(config)
+    print(f"Worker {worker_index} started, pid: {os.getpid()}")
+    server.run(sockets=[sock])
+
+
+class Supervisor:
+
+    def __init__(self, host: str, port: int, workers: int):
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.context = multiprocessing.get_context("spawn")
+        self.processes: dict[int, multiprocessing.Process] = {}
+        self.broker = LocalBroker(socket_path=ConfigManage.PRESENCE_SOCKET_PATH)
+        self.sock = None
+        self.should_exit = False
+
+
+    def bind_socket(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(2048)
+        sock.set_inheritable(True)
+        return sock
+
+
+    def start_worker(self, worker_index: int):
+        process = self.context.Process(target=run_worker, args=(worker_index, self.sock), name=f"worker-{worker_index}")
+        process.start()
+        self.processes[worker_index] = process
+
+
+    def handle_exit(self, sig, frame):
+        print(f"Supervisor received signal {sig}, shutting down workers...")
+        self.should_exit = True
+
+
+    async def run(self):
+        # Workers must connect to the broker hosted here instead of hosting their own.
+        os.environ["PRESENCE_BACKEND"] = "local"
+        os.environ["PRESENCE_SOCKET_PATH"] = ConfigManage.PRESENCE_SOCKET_PATH
+        await self.broker.start()
+
+        self.sock = self.bind_socket()
+        print(f"Supervisor listening on {self.host}:{self.port}, workers: {self.workers}")
+        for worker_index in range(self.workers):
+            self.start_worker(worker_index)
+
+        while not self.should_exit:
+            await asyncio.sleep(MONITOR_INTERVAL)
+            for worker_index, process in list(self.processes.items()):
+                if not process.is_alive() and not self.should_exit:
+                    print(f"Worker {worker_index} (pid: {process.pid}) exited with code {process.exitcode}, restarting...")
+                    process.close()
+                    await asyncio.sleep(RESTART_DELAY)
+                    self.start_worker(worker_index)
+
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+        for process in self.processes.values():
+            process.join(timeout=10)
+            if process.is_alive():
+                process.kill()
+
+        self.sock.close()
+        await self.broker.stop()
+        print("Supervisor shutdown complete.")
+
+
+if __name__ == '__main__':
+    supervisor = Supervisor(
+        host=ConfigManage.SERVER_HOST or "0.0.0.0",
+        port=int(ConfigManage.SERVER_PORT or 8000),
+        workers=max(ConfigManage.SERVER_WORKERS, 1)
+    )
+    signal.signal(signal.SIGINT, supervisor.handle_exit)
+    signal.signal(signal.SIGTERM, supervisor.handle_exit)
+    asyncio.run(supervisor.run())
@@ -9,6 +9,12 @@ from routes.device.router import router as device_router
 from routes.firmware.router import router as firmware_router
 from routes.model.router import router as model_router
 from utils.sql_manage import init_db, clean_db
+from utils.annotation_manage import AnnotationManager
+from utils.connection_manage import ConnectionManager
+from utils.log_store_manage import DeviceLogStore
+from utils.write_behind_manage import DeviceWriteBehind
+from utils.rollout_manage import RolloutManager
+from utils.config_manage import ConfigManage
 from middlewares.global_error_handler import register_exception_handlers
 
 
@@ -16,7 +22,16 @@ from middlewares.global_error_handler import register_exception_handlers
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
+    AnnotationManager.start()
+    await ConnectionManager.start()
+    await RolloutManager.start()
+    DeviceLogStore.start()
     yield
+    await RolloutManager.stop()
+    await ConnectionManager.stop()
+    await DeviceWriteBehind.stop()
+    DeviceLogStore.shutdown()
+    AnnotationManager.shutdown()
     await clean_db()
 
 
@@ -49,8 +64,12 @@ if __name__ == '__main__':
     # https://myapollo.com.tw/blog/begin-to-asyncio/#google_vignette
     app_env = os.getenv("APP_ENV", "production")
     is_dev_mode = (app_env == "development")
-    print(f"Running in {app_env} mode. Hot-Reload: {is_dev_mode}")
-    uvicorn.run("main:app", host='0.0.0.0', port=8000, reload=is_dev_mode, workers=1, ws_ping_interval=600, log_level="debug")
+    workers = ConfigManage.SERVER_WORKERS
+    if workers > 1 and ConfigManage.PRESENCE_BACKEND == "memory":
+        print(f"PRESENCE_BACKEND is memory, connection state can not be shared between {workers} workers, fallback to 1 worker.")
+        workers = 1
+    print(f"Running in {app_env} mode. Hot-Reload: {is_dev_mode}, Workers: {workers}")
+    uvicorn.run("main:app", host='0.0.0.0', port=8000, reload=is_dev_mode, workers=workers, ws_ping_interval=600, log_level="debug")
 
 '''
 Version 2.0
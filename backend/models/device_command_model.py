@@ -0,0 +1,17 @@
+import uuid
+from models.base_model import Base
+from sqlalchemy.sql import func
+from sqlalchemy import Column, String, UUID, DateTime, JSON, ForeignKey
+
+class DeviceCommand(Base):
+    __tablename__ = 'device_commands'
+    id = Column(UUID(as_uuid=True), default=uuid.uuid4 , nullable=False, primary_key=True)
+    device_id = Column(UUID(as_uuid=True), ForeignKey('devices.id'), nullable=False, index=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=False)
+    task = Column(String, nullable=False)
+    params = Column(JSON, nullable=True)
+    context = Column(JSON, nullable=True)
+    delivered_time = Column(DateTime, nullable=True)
+    created_time = Column(DateTime, nullable=False, server_default=func.now())
+    updated_time = Column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
+    deleted_time = Column(DateTime, nullable=True)
@@ -0,0 +1,37 @@
+import uuid
+from models.base_model import Base
+from sqlalchemy.sql import func
+from sqlalchemy import Column, String, UUID, DateTime, ForeignKey, Integer, Float
+
+class FirmwareRollout(Base):
+    __tablename__ = 'firmware_rollouts'
+    id = Column(UUID(as_uuid=True), default=uuid.uuid4 , nullable=False, primary_key=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=False)
+    firmware_id = Column(UUID(as_uuid=True), ForeignKey('firmwares.id'), nullable=False)
+    # RUNNING, PAUSED, COMPLETED, CANCELLED
+    status = Column(String, nullable=False, default="RUNNING")
+    canary_percent = Column(Float, nullable=False)
+    wave_multiplier = Column(Float, nullable=False)
+    error_threshold = Column(Float, nullable=False)
+    wave_count = Column(Integer, nullable=False)
+    current_wave = Column(Integer, nullable=False, default=0)
+    wave_started_time = Column(DateTime, nullable=True)
+    pause_reason = Column(String, nullable=True)
+    # Worker loop driving the rollout, a loop stops as soon as it is replaced (resume) or the rollout is not RUNNING
+    runner_id = Column(UUID(as_uuid=True), nullable=True)
+    created_time = Column(DateTime, nullable=False, server_default=func.now())
+    updated_time = Column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
+    deleted_time = Column(DateTime, nullable=True)
+
+
+class FirmwareRolloutDevice(Base):
+    __tablename__ = 'firmware_rollout_devices'
+    id = Column(UUID(as_uuid=True), default=uuid.uuid4 , nullable=False, primary_key=True)
+    rollout_id = Column(UUID(as_uuid=True), ForeignKey('firmware_rollouts.id'), nullable=False, index=True)
+    device_id = Column(UUID(as_uuid=True), ForeignKey('devices.id'), nullable=False)
+    wave = Column(Integer, nullable=False)
+    # PENDING, SENT, COMPLETED, FAILED, SKIPPED (offline when its wave started)
+    status = Column(String, nullable=False, default="PENDING")
+    reason = Column(String, nullable=True)
+    created_time = Column(DateTime, nullable=False, server_default=func.now())
+    updated_time = Column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
@@ -23,4 +23,25 @@ class ModeSwtichParams(BaseModel):
     mode: ModeEnum
 
 class DeleteManyDeviceParams(BaseModel):
-    device_ids: list[str]
\ No newline at end of file
+    device_ids: list[str]
+class BulkTaskEnum(str, Enum):
+    RESET = "RESET"
+    INFERENCE = "INFERENCE"
+    MODE_SWITCH = "MODE_SWITCH"
+    MODEL_SWITCH = "MODEL_SWITCH"
+    OTA = "OTA"
+
+class BulkDeviceFilter(BaseModel):
+    operation_model: ModeEnum | None = None
+    current_model_id: str | None = None
+    firmware_id: str | None = None
+    chip: str | None = None
+    connected: bool | None = None
+
+class BulkCommandParams(BaseModel):
+    task: BulkTaskEnum
+    device_ids: list[str] | None = None
+    filter: BulkDeviceFilter | None = None
+    mode: ModeEnum | None = None
+    model_id: str | None = None
+    firmware_id: str | None = None
@@ -6,14 +6,18 @@ import asyncio
 from PIL import Image, ImageDraw
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.websockets import WebSocketState 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, WebSocketException, Depends
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, WebSocketException, Depends, Query
+from fastapi.responses import StreamingResponse
 from jwt.exceptions import InvalidTokenError, ExpiredSignatureError
 import utils.exception as GeneralExc
-from utils.sql_manage import get_db
+from utils.sql_manage import get_db, async_session_maker
 import routes.device.request_schema as ReqeustScheme
 from controllers.device.controllers import DeviceController
 from controllers.user.controllers import UserController
 from utils.connection_manage import ConnectionManager
+from utils.inbox_manage import DeviceInbox, InboxOverflow
+from utils.admission_manage import AdmissionController
+from utils.config_manage import ConfigManage
 
 
 router = APIRouter()
@@ -34,16 +38,86 @@ async def get_device_with_id(device_id: str, db: AsyncSession = Depends(get_db),
     return await DeviceController.get_device_with_deviceId(db=db, device_id=device_id, user_id=current_user.get('user_id', None))
 
 
+@router.get("/frames/metrics")
+async def get_frame_metrics(current_user = Depends(UserController.get_current_user)):
+    return {
+        "success": True,
+        "data": {
+            "frames": ConnectionManager.get_frame_stats(user_id=current_user.get('user_id', None)),
+            "inbound": ConnectionManager.get_inbound_frame_stats(user_id=current_user.get('user_id', None)),
+            "sessions": ConnectionManager.get_session_stats(user_id=current_user.get('user_id', None))
+        },
+        "message": "Get frame delivery metrics sucessfully."
+    }
+
+
+@router.get("/tasks/metrics")
+async def get_task_metrics(current_user = Depends(UserController.get_current_user)):
+    return {
+        "success": True,
+        "data": ConnectionManager.get_task_stats(user_id=current_user.get('user_id', None)),
+        "message": "Get device task metrics sucessfully."
+    }
+
+
+@router.get("/queues/metrics")
+async def get_queue_metrics(current_user = Depends(UserController.get_current_user)):
+    return {
+        "success": True,
+        "data": ConnectionManager.get_inbox_stats(user_id=current_user.get('user_id', None)),
+        "message": "Get device queue metrics sucessfully."
+    }
+
+
+@router.get("/handlers/metrics")
+async def get_handler_metrics(current_user = Depends(UserController.get_current_user)):
+    return {
+        "success": True,
+        "data": ConnectionManager.get_handler_stats(),
+        "message": "Get device message handler metrics sucessfully."
+    }
+
+
+@router.get("/admission/metrics")
+async def get_admission_metrics(current_user = Depends(UserController.get_current_user)):
+    return {
+        "success": True,
+        "data": AdmissionController.stats(),
+        "message": "Get device connect admission metrics sucessfully."
+    }
+
+
+@router.get("/logs/{device_id}/tail")
+async def get_device_log_tail(device_id: str, limit: int = Query(100, ge=1, le=5000), db: AsyncSession = Depends(get_db), current_user = Depends(UserController.get_current_user)):
+    return await DeviceController.get_device_log_tail(db=db, user_id=current_user.get('user_id', None), device_id=device_id, limit=limit)
+
+
+@router.get("/logs/{device_id}/range")
+async def get_device_log_range(device_id: str, start: float, end: float, limit: int = Query(1000, ge=1, le=5000), db: AsyncSession = Depends(get_db), current_user = Depends(UserController.get_current_user)):
+    return await DeviceController.get_device_log_range(db=db, user_id=current_user.get('user_id', None), device_id=device_id, start=start, end=end, limit=limit)
+
+
 @router.post("/delete-many")
 async def delete_device(params: ReqeustScheme.DeleteManyDeviceParams, db: AsyncSession = Depends(get_db), current_user = Depends(UserController.get_current_user)):
     return await DeviceController.delete_device(db=db, device_ids=params.device_ids, user_id=current_user.get('user_id', None))
 
 
 @router.websocket("/ws")
-async def websocket_init(websocket: WebSocket, db: AsyncSession = Depends(get_db)):
-    current_device = await UserController.get_current_device(websocket.headers["authorization"])
-    text_queue = asyncio.Queue(maxsize=50)
-    binary_queue = asyncio.Queue(maxsize=50)
+async def websocket_init(websocket: WebSocket):
+    # Reject before any token / database work when too many devices are connecting, see AdmissionController.
+    retry_after = AdmissionController.admit()
+    if retry_after is not None:
+        await websocket.accept()
+        await websocket.close(code=1013, reason=json.dumps({ "retry_after": retry_after }))
+        return
+
+    handshaking = True
+    try:
+        current_device = await UserController.get_current_device(websocket.headers["authorization"])
+    except Exception:
+        AdmissionController.release()
+        raise
+    inbox = None
     process_task = None
     device_id = None
     user_id = None
@@ -51,35 +125,57 @@ async def websocket_init(websocket: WebSocket, db: AsyncSession = Depends(get_db
     try:
         device_id = current_device["device_id"]
         user_id = current_device["user_id"]
-        device = await DeviceController.get_device_with_deviceId(db=db, device_id=device_id, user_id=user_id)
-        mode = device["data"]["devices"][0].operation_model
-        model_id = str(device["data"]["devices"][0].current_model_id) if device["data"]["devices"][0].current_model_id else None
+
+        # A valid resume token skips the device lookup and the INIT handshake.
+        resume_session = await ConnectionManager.resume_device_session(device_id=device_id, user_id=user_id, token=websocket.headers.get("x-resume-token"))
+        if resume_session:
+            mode = resume_session["mode"]
+            model_id = resume_session["model_id"]
+            labels = resume_session["labels"]
+        else:
+            # Sessions are only opened around database work, the connection must not hold one while it is alive.
+            async with async_session_maker() as db:
+                device = await DeviceController.get_device_with_deviceId(db=db, device_id=device_id, user_id=user_id)
+            mode = device["data"]["devices"][0].operation_model
+            model_id = str(device["data"]["devices"][0].current_model_id) if device["data"]["devices"][0].current_model_id else None
+            labels = device["data"]["devices"][0].model_labels
+
+        inbox = DeviceInbox(device_id=device_id, lane_config={
+            "control": (ConfigManage.DEVICE_CONTROL_QUEUE_SIZE, ConfigManage.DEVICE_CONTROL_QUEUE_POLICY),
+            "telemetry": (ConfigManage.DEVICE_TELEMETRY_QUEUE_SIZE, ConfigManage.DEVICE_TELEMETRY_QUEUE_POLICY),
+            "media": (ConfigManage.DEVICE_MEDIA_QUEUE_SIZE, ConfigManage.DEVICE_MEDIA_QUEUE_POLICY)
+        })
 
         await websocket.accept()
-        await ConnectionManager.connect_device(user_id=user_id , device_id=device_id, model_id=model_id, mode=mode, websocket=websocket)
-        process_task = asyncio.create_task(ConnectionManager.listen_device_message(text_queue, binary_queue, db, user_id, device_id, DeviceController.task_completion_update))
+        await ConnectionManager.connect_device(user_id=user_id , device_id=device_id, model_id=model_id, mode=mode, websocket=websocket, labels=labels, resumed=resume_session is not None)
+        process_task = asyncio.create_task(ConnectionManager.listen_device_message(inbox, async_session_maker, user_id, device_id, DeviceController.task_completion_update, DeviceController.drain_offline_commands))
+        if resume_session:
+            async with async_session_maker() as db:
+                await DeviceController.drain_offline_commands(db, user_id, device_id)
+        AdmissionController.release()
+        handshaking = False
 
         while True:
             data = await websocket.receive()
-            if "text" in data:
-
-                try:
-                    await asyncio.wait_for(text_queue.put(data.get("text", None)), timeout=1.0)
-                except asyncio.TimeoutError:
-                    print(f"Queue put timed out for text message from {device_id}. Queue might be full.")
-
-
-            elif "bytes" in data:
-                try:
-                     await asyncio.wait_for(binary_queue.put(data.get("bytes", None)), timeout=1.0)
-                except asyncio.TimeoutError:
-                     print(f"Queue put timed out for bytes message from {device_id}. Queue might be full.")
+            if data["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(code=data.get("code", 1000))
+            message = data.get("text", None) if "text" in data else data.get("bytes", None)
+            if message is not None:
+                await inbox.put(message)
             
 
     except WebSocketDisconnect:
         log_id = f"{user_id}:{device_id}" if device_id else f"{user_id}"
         print(f"[{log_id}] WebSocket disconnected by client.")
 
+    except InboxOverflow as e:
+        log_id = f"{user_id}:{device_id}" if device_id else f"{user_id}"
+        print(f"[{log_id}] Device inbox overflow, close websocket: {e}")
+        try:
+            await websocket.close(code=1013, reason=str(e))
+        except Exception as close_ex:
+            print(f"[{log_id}] Exception during websocket.close() after inbox overflow: {close_ex}")
+
     except InvalidTokenError as e:
         print(traceback.format_exc())
         raise GeneralExc.InValidTokenError(details=str(e))
@@ -105,18 +201,16 @@ async def websocket_init(websocket: WebSocket, db: AsyncSession = Depends(get_db
         log_id = f"{user_id}:{device_id}" if device_id else f"{user_id}"
         print(f"[{log_id}] Cleaning up resources for WebSocket connection...")
 
+        if handshaking:
+            AdmissionController.release()
+
         if device_id:
-            await ConnectionManager.disconnect_device(user_id=user_id, device_id=device_id)
+            await ConnectionManager.disconnect_device(user_id=user_id, device_id=device_id, websocket=websocket)
 
-        # 1. Signal the processing task to shut down by putting None in queues.
-        if text_queue: # Check if initialized
-            try:
-                text_queue.put_nowait(None)
-                print(f"[{log_id}] Sent None to text_queue for task shutdown.")
-            except asyncio.QueueFull:
-                print(f"[{log_id}] Text queue full when trying to send None. Task might be stuck or already exited.")
-            except Exception as qe_text:
-                print(f"[{log_id}] Error putting None to text_queue: {qe_text}")
+        # 1. Signal the processing task to shut down by closing the inbox.
+        if inbox: # Check if initialized
+            inbox.close()
+            print(f"[{log_id}] Closed device inbox for task shutdown.")
 
         # 2. Cancel the task and wait for it to finish.
         if process_task and not process_task.done():
@@ -162,6 +256,12 @@ async def model_deploy(params: ReqeustScheme.ModelDeploymentParams, db: AsyncSes
     return await DeviceController.model_deploy(db=db, user_id=current_user.get('user_id', None), device_id=params.device_id, model_id=params.model_id)
 
 
+@router.post("/bulk")
+async def bulk_command(params: ReqeustScheme.BulkCommandParams, db: AsyncSession = Depends(get_db), current_user = Depends(UserController.get_current_user)):
+    lines = await DeviceController.bulk_command(db=db, user_id=current_user.get('user_id', None), params=params)
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
+
 @router.get("/model_switch/{device_id}/{model_id}")
 async def model_download(device_id: str, model_id:str, db: AsyncSession = Depends(get_db), current_user = Depends(UserController.get_current_user)):
     return await DeviceController.model_switch(db=db, user_id=current_user.get('user_id', None), device_id=device_id, model_id=model_id)
\ No newline at end of file
@@ -0,0 +1,14 @@
+from pydantic import BaseModel, Field
+
+class CreateRolloutParams(BaseModel):
+    firmware_id: str
+    # All devices of the user when omitted
+    device_ids: list[str] | None = None
+    canary_percent: float | None = Field(default=None, gt=0, le=100)
+    wave_multiplier: float | None = Field(default=None, ge=1)
+    error_threshold: float | None = Field(default=None, ge=0, le=1)
+
+class ResumeRolloutParams(BaseModel):
+    error_threshold: float | None = Field(default=None, ge=0, le=1)
+    # Send the OTA again to failed and skipped devices of the current wave
+    retry_failed: bool = False
@@ -1,8 +1,8 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import APIRouter, Depends, File, Form, UploadFile
 from utils.sql_manage import get_db
-import routes.device.request_schema as ReqeustScheme
-from controllers.firmware.controllers import FirmwareController
+import routes.firmware.request_schema as ReqeustScheme
+from controllers.firmware.controllers import FirmwareController, FirmwareRolloutController
 from controllers.user.controllers import UserController
 
 
@@ -24,11 +24,49 @@ async def get_firmwares(db: AsyncSession = Depends(get_db), current_user = Depen
     return await FirmwareController.get_firmwares(db=db, user_id=current_user.get("user_id", None))
 
 
+@router.post("/rollouts")
+async def create_rollout(params: ReqeustScheme.CreateRolloutParams, db: AsyncSession = Depends(get_db), current_user = Depends(UserController.get_current_user)):
+    return await FirmwareRolloutController.create_rollout(
+        db=db,
+        user_id=current_user.get("user_id", None),
+        firmware_id=params.firmware_id,
+        device_ids=params.device_ids,
+        canary_percent=params.canary_percent,
+        wave_multiplier=params.wave_multiplier,
+        error_threshold=params.error_threshold
+    )
+
+
+@router.get("/rollouts")
+async def get_rollouts(db: AsyncSession = Depends(get_db), current_user = Depends(UserController.get_current_user)):
+    return await FirmwareRolloutController.get_rollouts(db=db, user_id=current_user.get("user_id", None))
+
+
+@router.get("/rollouts/{rollout_id}")
+async def get_rollout(rollout_id: str, db: AsyncSession = Depends(get_db), current_user = Depends(UserController.get_current_user)):
+    return await FirmwareRolloutController.get_rollout(db=db, user_id=current_user.get("user_id", None), rollout_id=rollout_id)
+
+
+@router.post("/rollouts/{rollout_id}/pause")
+async def pause_rollout(rollout_id: str, db: AsyncSession = Depends(get_db), current_user = Depends(UserController.get_current_user)):
+    return await FirmwareRolloutController.change_rollout_status(db=db, user_id=current_user.get("user_id", None), rollout_id=rollout_id, action="PAUSE")
+
+
+@router.post("/rollouts/{rollout_id}/resume")
+async def resume_rollout(rollout_id: str, params: ReqeustScheme.ResumeRolloutParams, db: AsyncSession = Depends(get_db), current_user = Depends(UserController.get_current_user)):
+    return await FirmwareRolloutController.change_rollout_status(db=db, user_id=current_user.get("user_id", None), rollout_id=rollout_id, action="RESUME", error_threshold=params.error_threshold, retry_failed=params.retry_failed)
+
+
+@router.post("/rollouts/{rollout_id}/cancel")
+async def cancel_rollout(rollout_id: str, db: AsyncSession = Depends(get_db), current_user = Depends(UserController.get_current_user)):
+    return await FirmwareRolloutController.change_rollout_status(db=db, user_id=current_user.get("user_id", None), rollout_id=rollout_id, action="CANCEL")
+
+
 @router.delete("/{firmware_id}")
 async def delete_firmware(firmware_id: str, db: AsyncSession = Depends(get_db), current_user = Depends(UserController.get_current_user)):
     return await FirmwareController.delete_firmware(db=db, firmware_id=firmware_id, user_id=current_user.get("user_id", None))
 
 
 @router.get("/download/{user_id}/{firmware_id}")
-async def model_download(user_id: str, firmware_id: str, db: AsyncSession = Depends(get_db)):
-    return await FirmwareController.download_firmware(db=db, firmware_id=firmware_id, user_id=user_id)
+async def model_download(user_id: str, firmware_id: str):
+    return await FirmwareController.download_firmware(firmware_id=firmware_id, user_id=user_id)
@@ -36,23 +36,26 @@ async def verify_token(current_user = Depends(UserController.get_current_user)):
 @router.websocket("/ws/{user_id}")
 async def websocket_init(websocket: WebSocket, user_id: str):
     # https://github.com/fastapi/fastapi/issues/2370
+    session = None
     try:
         await websocket.accept()
-        await ConnectionManager.connect_frontend(user_id=user_id, websocket=websocket)
+        session = await ConnectionManager.connect_frontend(user_id=user_id, websocket=websocket)
 
         while True:
             data = await websocket.receive_json()
-            print(data)
+            await ConnectionManager.handle_frontend_message(session=session, data=data)
 
             
     except WebSocketDisconnect:
         print("Websocket disconnected")
-        await ConnectionManager.disconnect_frontend(user_id=user_id)
     
     except WebSocketException:
         print("Websocket exception")
-        await ConnectionManager.disconnect_frontend(user_id=user_id)
 
     except Exception as e:
         print(traceback.format_exc())
-        print("Unknown excpetion")
\ No newline at end of file
+        print("Unknown excpetion")
+
+    finally:
+        if session:
+            await ConnectionManager.disconnect_frontend(user_id=user_id, session_id=session.session_id)
\ No newline at end of file
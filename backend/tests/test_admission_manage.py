@@ -0,0 +1,27 @@
+from utils.admission_manage import AdmissionController, TokenBucket
+from utils.config_manage import ConfigManage
+
+
+def test_bucket_rejects_once_burst_is_taken():
+    bucket = TokenBucket(rate=10, burst=2)
+    assert bucket.take() == 0
+    assert bucket.take() == 0
+    assert 0 < bucket.take() <= 0.1
+
+
+def test_zero_rate_is_no_limit():
+    bucket = TokenBucket(rate=0, burst=1)
+    assert [bucket.take() for _ in range(5)] == [0] * 5
+
+
+def test_concurrency_rejection_with_zero_rate(monkeypatch):
+    monkeypatch.setattr(AdmissionController, "bucket", TokenBucket(rate=0, burst=1))
+    monkeypatch.setattr(AdmissionController, "handshakes", 0)
+    monkeypatch.setattr(AdmissionController, "rejected", { "rate": 0, "concurrency": 0 })
+    monkeypatch.setattr(ConfigManage, "DEVICE_HANDSHAKE_CONCURRENCY", 1)
+    monkeypatch.setattr(ConfigManage, "DEVICE_CONNECT_RETRY_JITTER", 0)
+
+    assert AdmissionController.admit() is None
+    assert AdmissionController.admit() == 1
+    assert AdmissionController.rejected == { "rate": 0, "concurrency": 1 }
+    assert AdmissionController.stats()["tokens"] == 1
@@ -0,0 +1,166 @@
+import asyncio
+import pytest
+
+from utils.connection_manage import ConnectionManager
+from utils.resume_manage import ResumeTokenManager
+from utils.presence_manage import InMemoryPresenceBackend
+from utils.task_manage import TaskStatus, TaskStore, RetryPolicy
+
+
+class FakeWebSocket:
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_json(self, message):
+        self.sent.append(message)
+
+
+@pytest.fixture(autouse=True)
+def manager(monkeypatch):
+    store = TaskStore(max_size=100, terminal_ttl=60, ack_timeout=0.05, progress_timeout=60)
+    store.on_timeout = ConnectionManager.handle_task_timeout
+    monkeypatch.setattr(ConnectionManager, "tasks", store)
+    monkeypatch.setattr(ConnectionManager, "active_devices", {})
+    monkeypatch.setattr(ConnectionManager, "presence", InMemoryPresenceBackend(worker_id="worker-a"))
+    monkeypatch.setattr(ConnectionManager, "resume_timers", {})
+    async def active_frontend_task(**kwargs):
+        pass
+    monkeypatch.setattr(ConnectionManager, "active_frontend_task", active_frontend_task)
+    return ConnectionManager
+
+
+def add_device(device_id: str = "device-1"):
+    websocket = FakeWebSocket()
+    ConnectionManager.active_devices[device_id] = { "websocket": websocket, "connection_state": "connected", "user_id": "user-1", "mode": None, "model_id": None, "labels": {} }
+    return websocket
+
+
+@pytest.mark.parametrize("task", ["INFERENCE", "RESET"])
+def test_fire_and_forget_task_is_not_tracked(task):
+    async def run():
+        websocket = add_device()
+        await ConnectionManager.send_task_to_device(user_id="user-1", device_id="device-1", task=task)
+        await asyncio.sleep(0.1)
+        return websocket
+
+    websocket = asyncio.run(run())
+    assert [message["action"] for message in websocket.sent] == [task]
+    assert ConnectionManager.tasks.tasks == {}
+    assert not ConnectionManager.tasks.has_in_flight(device_id="device-1")
+
+
+def test_task_action_is_tracked_until_acked():
+    async def run():
+        add_device()
+        await ConnectionManager.send_task_to_device(user_id="user-1", device_id="device-1", task="MODE_SWITCH", task_params={ "mode": "INFERENCE_MODE" })
+        return next(iter(ConnectionManager.tasks.tasks.values()))
+
+    task = asyncio.run(run())
+    assert task["name"] == "MODE_SWITCH"
+    assert task["status"] == TaskStatus.PENDING_ACK
+
+
+def test_inference_is_sent_once_without_timeout_error(monkeypatch):
+    frontend = []
+    async def active_frontend_task(**kwargs):
+        frontend.append(kwargs)
+    monkeypatch.setattr(ConnectionManager, "active_frontend_task", active_frontend_task)
+
+    async def run():
+        websocket = add_device()
+        await ConnectionManager.send_task_to_device(user_id="user-1", device_id="device-1", task="INFERENCE")
+        await asyncio.sleep(0.3)
+        return websocket
+
+    websocket = asyncio.run(run())
+    assert len(websocket.sent) == 1
+    assert frontend == []
+
+
+def test_unacknowledged_task_action_is_resent_then_failed(monkeypatch):
+    frontend = []
+    async def active_frontend_task(**kwargs):
+        frontend.append(kwargs)
+    monkeypatch.setattr(ConnectionManager, "active_frontend_task", active_frontend_task)
+    monkeypatch.setattr(ConnectionManager, "retry_policies", { "default": RetryPolicy(max_attempts=2, multiplier=1, max_delay=0.05, jitter=0) })
+
+    async def run():
+        websocket = add_device()
+        await ConnectionManager.send_task_to_device(user_id="user-1", device_id="device-1", task="OTA", task_params={ "firmware_id": "firmware-1" })
+        await asyncio.sleep(0.3)
+        return websocket
+
+    websocket = asyncio.run(run())
+    assert [message["action"] for message in websocket.sent] == ["OTA", "OTA"]
+    assert [(message["status"], message["reason"]) for message in frontend] == [("ERROR", "TIMEOUT")]
+
+
+def parked_task(task_id: str, status: str = TaskStatus.PENDING_ACK):
+    message = { "task_id": task_id, "action": "OTA" }
+    return { "task_id": task_id, "device_id": "device-1", "user_id": "user-1", "name": "OTA", "status": status, "params": {}, "context": { "message": message }, "attempts": 1, "created_time": 0, "updated_time": 0 }
+
+
+def test_resume_on_other_worker_adopts_parked_tasks(monkeypatch):
+    monkeypatch.setattr(ResumeTokenManager, "verify", lambda token, device_id, user_id: { "jti": "jti-1" })
+    published = []
+    async def publish(worker_id, message):
+        published.append((worker_id, message))
+    monkeypatch.setattr(ConnectionManager.presence, "publish", publish)
+    ConnectionManager.presence.apply_set("resume", "device-1", {
+        "jti": "jti-1", "user_id": "user-1", "mode": None, "model_id": None, "labels": {}, "expires": float("inf"),
+        "tasks": [parked_task("task-1"), parked_task("task-2", status=TaskStatus.IN_PROGRESS)],
+        "worker_id": "worker-b"
+    })
+
+    async def run():
+        session = await ConnectionManager.resume_device_session(device_id="device-1", user_id="user-1", token="token")
+        again = await ConnectionManager.resume_device_session(device_id="device-1", user_id="user-1", token="token")
+        return session, again, set(ConnectionManager.tasks.timers)
+
+    session, again, timers = asyncio.run(run())
+    assert session["worker_id"] == "worker-b"
+    assert again is None
+    assert set(ConnectionManager.tasks.tasks) == { "task-1", "task-2" }
+    assert timers == { "task-1", "task-2" }
+    assert published == [("worker-b", { "type": "RESUME_TAKEN", "device_id": "device-1" })]
+
+
+def test_parking_worker_drops_tasks_once_resumed_elsewhere(monkeypatch):
+    frontend = []
+    async def active_frontend_task(**kwargs):
+        frontend.append(kwargs)
+    monkeypatch.setattr(ConnectionManager, "active_frontend_task", active_frontend_task)
+
+    async def run():
+        websocket = add_device()
+        ConnectionManager.active_devices["device-1"]["resume_jti"] = "jti-1"
+        await ConnectionManager.send_task_to_device(user_id="user-1", device_id="device-1", task="OTA", task_params={ "firmware_id": "firmware-1" })
+        await ConnectionManager.disconnect_device(user_id="user-1", device_id="device-1", websocket=websocket)
+        assert ConnectionManager.presence.get("resume", "device-1")["tasks"][0]["name"] == "OTA"
+
+        # Other worker took the entry, its RESUME_TAKEN is not delivered yet when the ack timer fires.
+        ConnectionManager.presence.apply_delete("resume", "device-1")
+        await asyncio.sleep(0.1)
+        assert ConnectionManager.tasks.tasks == {}
+
+        await ConnectionManager.handle_routed_message({ "type": "RESUME_TAKEN", "device_id": "device-1" })
+        return ConnectionManager.resume_timers
+
+    assert asyncio.run(run()) == {}
+    assert [message for message in frontend if message.get("reason") == "TIMEOUT"] == []
+
+
+def test_task_failed_while_parked_is_not_adopted():
+    async def run():
+        websocket = add_device()
+        ConnectionManager.active_devices["device-1"]["resume_jti"] = "jti-1"
+        await ConnectionManager.send_task_to_device(user_id="user-1", device_id="device-1", task="OTA", task_params={ "firmware_id": "firmware-1" })
+        await ConnectionManager.disconnect_device(user_id="user-1", device_id="device-1", websocket=websocket)
+        await asyncio.sleep(0.1)
+        session = ConnectionManager.presence.get("resume", "device-1")
+        ConnectionManager.release_parked_session(device_id="device-1")
+        return session
+
+    session = asyncio.run(run())
+    assert session["tasks"] == []
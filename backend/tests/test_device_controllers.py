@@ -0,0 +1,68 @@
+import uuid
+import asyncio
+import pytest
+
+from controllers.device.controllers import DeviceController
+from models.device_command_model import DeviceCommand
+from utils.connection_manage import ConnectionManager
+
+
+class FakeResult:
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return self.rows
+
+
+class FakeSession:
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.commits = 0
+
+    async def execute(self, query):
+        return FakeResult(self.rows)
+
+    async def commit(self):
+        self.commits += 1
+
+    async def rollback(self):
+        pass
+
+
+def create_command(task: str):
+    return DeviceCommand(id=uuid.uuid4(), device_id=uuid.uuid4(), task=task, params=None, context=None)
+
+
+@pytest.mark.parametrize("connected_sends, delivered", [(3, 3), (1, 1), (0, 0)])
+def test_drain_stops_at_first_failed_send(monkeypatch, connected_sends, delivered):
+    sent = []
+    async def send_task_to_device(user_id, device_id, task, task_params=None, task_context=None):
+        if len(sent) >= connected_sends:
+            return False
+        sent.append(task)
+        return True
+    monkeypatch.setattr(ConnectionManager, "send_task_to_device", send_task_to_device)
+
+    commands = [create_command(task) for task in ("MODE_SWITCH", "OTA", "RESET")]
+    db = FakeSession(commands)
+    asyncio.run(DeviceController.drain_offline_commands(db, "user-1", "device-1"))
+
+    assert sent == ["MODE_SWITCH", "OTA", "RESET"][:delivered]
+    assert [command.delivered_time is not None for command in commands] == [True] * delivered + [False] * (3 - delivered)
+    assert db.commits == 1
+
+
+def test_drain_keeps_command_when_send_raises(monkeypatch):
+    async def send_task_to_device(**kwargs):
+        raise RuntimeError("websocket closed")
+    monkeypatch.setattr(ConnectionManager, "send_task_to_device", send_task_to_device)
+
+    commands = [create_command("OTA")]
+    asyncio.run(DeviceController.drain_offline_commands(FakeSession(commands), "user-1", "device-1"))
+    assert commands[0].delivered_time is None
@@ -0,0 +1,75 @@
+import asyncio
+import tempfile
+import pytest
+
+import controllers.firmware.controllers as FirmwareControllers
+import controllers.firmware.exception as FirmwareExc
+from controllers.firmware.controllers import FirmwareController
+from models.firmware_model import Firmware
+from utils.config_manage import ConfigManage
+
+
+class FakeResult:
+
+    def __init__(self, row):
+        self.row = row
+
+    def scalar_one_or_none(self):
+        return self.row
+
+
+class FakeSession:
+    opened = 0
+
+    def __init__(self, row):
+        self.row = row
+
+    async def __aenter__(self):
+        FakeSession.opened += 1
+        return self
+
+    async def __aexit__(self, *args):
+        FakeSession.opened -= 1
+
+    async def execute(self, query):
+        return FakeResult(self.row)
+
+
+class RecordingSemaphore(asyncio.Semaphore):
+
+    def __init__(self, value):
+        super().__init__(value)
+        self.sessions_open = []
+
+    async def acquire(self):
+        self.sessions_open.append(FakeSession.opened)
+        return await super().acquire()
+
+
+@pytest.fixture
+def firmware(monkeypatch):
+    file = tempfile.NamedTemporaryFile(suffix=".bin")
+    row = Firmware(id="firmware-1", user_id="user-1", file_path=file.name)
+    monkeypatch.setattr(FirmwareControllers, "async_session_maker", lambda: FakeSession(row))
+    monkeypatch.setattr(ConfigManage, "FIRMWARE_DOWNLOAD_WAIT", 0.05)
+    yield row
+    file.close()
+
+
+def test_download_waits_for_slot_without_db_session(monkeypatch, firmware):
+    slots = RecordingSemaphore(0)
+    monkeypatch.setattr(FirmwareController, "download_slots", slots)
+
+    with pytest.raises(FirmwareExc.FirmwareDownloadBusy):
+        asyncio.run(FirmwareController.download_firmware(user_id="user-1", firmware_id="firmware-1"))
+    assert slots.sessions_open == [0]
+
+
+def test_download_holds_slot_until_sent(monkeypatch, firmware):
+    slots = RecordingSemaphore(1)
+    monkeypatch.setattr(FirmwareController, "download_slots", slots)
+
+    response = asyncio.run(FirmwareController.download_firmware(user_id="user-1", firmware_id="firmware-1"))
+    assert slots.locked()
+    response.release()
+    assert not slots.locked()
@@ -0,0 +1,77 @@
+import time
+import pytest
+
+from utils.frame_manage import FrameCodec, FramePairer
+
+
+def test_codec_round_trip():
+    frame = FrameCodec.encode(device_id="device-1", sequence=7, content_type=2, payload=b"image")
+    assert FrameCodec.decode(frame) == ("device-1", 7, 2, b"image")
+
+
+def test_codec_wraps_sequence():
+    frame = FrameCodec.encode(device_id="d", sequence=2 ** 32 + 3, content_type=0, payload=b"")
+    assert FrameCodec.decode(frame)[1] == 3
+
+
+def test_codec_rejects_unknown_version():
+    frame = bytes((FrameCodec.VERSION + 1,)) + FrameCodec.encode(device_id="d", sequence=1, content_type=0, payload=b"")[1:]
+    with pytest.raises(ValueError):
+        FrameCodec.decode(frame)
+
+
+def test_pair_by_sequence_metadata_first():
+    pairer = FramePairer(timeout=5, max_pending=4)
+    assert pairer.put_metadata({ "seq": 1 }) is None
+    assert pairer.put_frame(FrameCodec.encode(device_id="d", sequence=1, content_type=0, payload=b"one")) == ({ "seq": 1 }, b"one")
+    assert pairer.stats()["paired"] == 1
+
+
+def test_pair_by_sequence_frame_first():
+    pairer = FramePairer(timeout=5, max_pending=4)
+    assert pairer.put_frame(FrameCodec.encode(device_id="d", sequence=1, content_type=0, payload=b"one")) is None
+    assert pairer.put_metadata({ "seq": 1 }) == b"one"
+    assert pairer.stats()["pending"] == 0
+
+
+def test_lost_half_does_not_shift_next_pairs():
+    pairer = FramePairer(timeout=5, max_pending=4)
+    pairer.put_metadata({ "seq": 1 })
+    pairer.put_metadata({ "seq": 2 })
+    assert pairer.put_frame(FrameCodec.encode(device_id="d", sequence=2, content_type=0, payload=b"two")) == ({ "seq": 2 }, b"two")
+
+
+def test_legacy_metadata_first():
+    pairer = FramePairer(timeout=5, max_pending=4)
+    assert pairer.put_metadata({ "status": "COMPLETED" }) is None
+    assert pairer.put_frame(b"\x89PNG one") == ({ "status": "COMPLETED" }, b"\x89PNG one")
+    assert pairer.stats() == { "paired": 0, "legacy_paired": 1, "orphaned_metadata": 0, "orphaned_frames": 0, "pending": 0 }
+
+
+def test_legacy_frame_first():
+    pairer = FramePairer(timeout=5, max_pending=4)
+    for index in range(3):
+        assert pairer.put_frame(f"\x89PNG {index}".encode()) is None
+        assert pairer.put_metadata({ "index": index }) == f"\x89PNG {index}".encode()
+    assert pairer.stats() == { "paired": 0, "legacy_paired": 3, "orphaned_metadata": 0, "orphaned_frames": 0, "pending": 0 }
+
+
+def test_max_pending_evicts_oldest():
+    pairer = FramePairer(timeout=5, max_pending=2)
+    for sequence in range(3):
+        pairer.put_metadata({ "seq": sequence })
+    assert pairer.stats()["orphaned_metadata"] == 1
+    assert pairer.put_frame(FrameCodec.encode(device_id="d", sequence=0, content_type=0, payload=b"")) is None
+
+
+def test_timeout_evicts_pending(monkeypatch):
+    pairer = FramePairer(timeout=5, max_pending=4)
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    pairer.put_frame(b"\x89PNG legacy")
+    pairer.put_metadata({ "seq": 1 })
+    monkeypatch.setattr(time, "monotonic", lambda: now + 6)
+    assert pairer.put_metadata({ "status": "COMPLETED" }) is None
+    assert pairer.stats()["orphaned_frames"] == 1
+    assert pairer.stats()["orphaned_metadata"] == 1
+    assert pairer.stats()["pending"] == 1
@@ -0,0 +1,59 @@
+import json
+import time
+import asyncio
+
+from utils.heartbeat_manage import TimerWheel
+from utils.inbox_manage import DeviceInbox
+
+
+def advance(wheel: TimerWheel, ticks: int) -> list:
+    return [(tick, entry) for tick in range(1, ticks + 1) for entry in wheel.advance()]
+
+
+def test_entry_is_due_after_its_delay():
+    wheel = TimerWheel(tick=1, slots=10)
+    wheel.schedule("a", 3)
+    wheel.schedule("b", 1)
+    wheel.schedule("c", 2.5)
+    assert len(wheel) == 3
+    assert advance(wheel, 5) == [(1, "b"), (3, "a"), (3, "c")]
+    assert len(wheel) == 0
+
+
+def test_delay_is_at_least_one_tick():
+    wheel = TimerWheel(tick=1, slots=10)
+    wheel.schedule("a", 0)
+    assert wheel.advance() == ["a"]
+
+
+def test_delay_is_capped_by_wheel_size():
+    wheel = TimerWheel(tick=1, slots=4)
+    wheel.schedule("a", 100)
+    assert advance(wheel, 4) == [(3, "a")]
+
+
+def test_positions_wrap_around():
+    wheel = TimerWheel(tick=1, slots=4)
+    advance(wheel, 3)
+    wheel.schedule("a", 2)
+    assert advance(wheel, 4) == [(2, "a")]
+
+
+def test_for_timeout_fits_the_timeout():
+    wheel = TimerWheel.for_timeout(tick=1, timeout=45)
+    wheel.schedule("a", 45)
+    assert advance(wheel, 50) == [(45, "a")]
+
+
+def test_inbox_counts_heartbeats_without_queueing_them():
+    async def run():
+        inbox = DeviceInbox(device_id="device-1", lane_config={ name: (8, "drop-oldest") for name in DeviceInbox.LANES })
+        inbox.last_seen = time.monotonic() - 60
+        await inbox.put(json.dumps({ "action": "HEARTBEAT" }))
+        return inbox
+
+    inbox = asyncio.run(run())
+    stats = inbox.stats()
+    assert stats["heartbeats"] == 1
+    assert stats["idle_seconds"] < 1
+    assert all(lane["depth"] == 0 for lane in stats["lanes"].values())
@@ -0,0 +1,132 @@
+import json
+import asyncio
+import pytest
+
+from utils.inbox_manage import DeviceInbox, MessageLane, InboxOverflow
+
+
+def create_inbox(maxsize: int = 8, control: str = "block", telemetry: str = "drop-oldest", media: str = "drop-oldest"):
+    return DeviceInbox(device_id="device-1", lane_config={ "control": (maxsize, control), "telemetry": (maxsize, telemetry), "media": (maxsize, media) })
+
+
+def test_messages_are_classified_into_lanes():
+    async def run():
+        inbox = create_inbox()
+        await inbox.put(json.dumps({ "action": "OTA", "status": "RECEIVED" }))
+        await inbox.put(json.dumps({ "action": "LOG", "level": "info", "message": "boot" }))
+        await inbox.put(json.dumps({ "action": "INFERENCE_RESULT" }))
+        await inbox.put(b"\x89PNG")
+        return inbox
+
+    inbox = asyncio.run(run())
+    assert [len(inbox.lanes[name].queue) for name in DeviceInbox.LANES] == [1, 1, 2]
+
+
+def test_control_is_consumed_before_telemetry():
+    async def run():
+        inbox = create_inbox()
+        await inbox.put(json.dumps({ "action": "LOG", "message": "first" }))
+        await inbox.put(json.dumps({ "action": "MODE_SWITCH", "status": "COMPLETED" }))
+        return [(await inbox.get(("control", "telemetry")))["action"] for _ in range(2)]
+
+    assert asyncio.run(run()) == ["MODE_SWITCH", "LOG"]
+
+
+def test_get_waits_for_message_and_returns_none_when_closed():
+    async def run():
+        inbox = create_inbox()
+        waiter = asyncio.create_task(inbox.get(("media",)))
+        await asyncio.sleep(0)
+        await inbox.put(b"frame")
+        assert await waiter == b"frame"
+
+        waiter = asyncio.create_task(inbox.get(("control", "telemetry")))
+        await asyncio.sleep(0)
+        inbox.close()
+        return await waiter
+
+    assert asyncio.run(run()) is None
+
+
+def test_invalid_messages_are_not_queued():
+    async def run():
+        inbox = create_inbox()
+        await inbox.put("not json")
+        await inbox.put("[1, 2]")
+        return inbox
+
+    inbox = asyncio.run(run())
+    stats = inbox.stats()
+    assert stats["invalid"] == 2
+    assert all(lane["depth"] == 0 for lane in stats["lanes"].values())
+
+
+def test_unknown_overflow_policy_is_rejected():
+    with pytest.raises(ValueError):
+        MessageLane(name="media", maxsize=2, overflow="drop-all")
+
+
+def test_drop_oldest_keeps_newest_messages():
+    async def run():
+        lane = MessageLane(name="media", maxsize=2, overflow="drop-oldest")
+        for index in range(4):
+            assert await lane.put(index)
+        return lane
+
+    lane = asyncio.run(run())
+    assert list(lane.queue) == [2, 3]
+    assert lane.stats()["dropped"] == 2
+    assert lane.stats()["accepted"] == 4
+    assert lane.stats()["high_water"] == 2
+
+
+def test_drop_newest_keeps_oldest_messages():
+    async def run():
+        lane = MessageLane(name="telemetry", maxsize=2, overflow="drop-newest")
+        return lane, [await lane.put(index) for index in range(4)]
+
+    lane, accepted = asyncio.run(run())
+    assert accepted == [True, True, False, False]
+    assert list(lane.queue) == [0, 1]
+    assert lane.stats()["dropped"] == 2
+
+
+def test_disconnect_raises_when_full():
+    async def run():
+        inbox = create_inbox(maxsize=1, telemetry="disconnect")
+        await inbox.put(json.dumps({ "action": "LOG", "message": "first" }))
+        with pytest.raises(InboxOverflow):
+            await inbox.put(json.dumps({ "action": "LOG", "message": "second" }))
+        return inbox
+
+    inbox = asyncio.run(run())
+    assert inbox.lanes["telemetry"].stats()["dropped"] == 1
+
+
+def test_block_waits_for_room():
+    async def run():
+        lane = MessageLane(name="control", maxsize=1, overflow="block")
+        await lane.put("first")
+        writer = asyncio.create_task(lane.put("second"))
+        await asyncio.sleep(0.01)
+        assert not writer.done()
+        assert lane.pop() == "first"
+        await asyncio.wait_for(writer, timeout=1)
+        return lane
+
+    lane = asyncio.run(run())
+    assert list(lane.queue) == ["second"]
+    assert lane.stats()["blocked"] == 1
+    assert lane.stats()["dropped"] == 0
+
+
+def test_close_releases_blocked_writer():
+    async def run():
+        lane = MessageLane(name="control", maxsize=1, overflow="block")
+        await lane.put("first")
+        writer = asyncio.create_task(lane.put("second"))
+        await asyncio.sleep(0.01)
+        lane.close()
+        await asyncio.wait_for(writer, timeout=1)
+
+    asyncio.run(run())
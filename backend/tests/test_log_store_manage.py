@@ -0,0 +1,123 @@
+import os
+import time
+import uuid
+import asyncio
+import pytest
+
+from utils.config_manage import ConfigManage
+from utils.log_store_manage import DeviceLogStore
+
+
+DEVICE_ID = str(uuid.uuid4())
+# Inside the retention window, older segments would be deleted on rotation.
+BASE = int(time.time()) - 86400
+
+
+@pytest.fixture(autouse=True)
+def storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(ConfigManage, "STORAGE_PATH", str(tmp_path))
+    monkeypatch.setattr(ConfigManage, "LOG_STORE_SEGMENT_BYTES", 1024 * 1024)
+    monkeypatch.setattr(ConfigManage, "LOG_STORE_SEGMENT_SECONDS", 3600)
+    monkeypatch.setattr(ConfigManage, "LOG_STORE_RETENTION_DAYS", 7)
+    monkeypatch.setattr(ConfigManage, "LOG_STORE_MAX_DEVICE_BYTES", 1024 * 1024)
+    yield tmp_path
+    DeviceLogStore.close_writer(device_id=DEVICE_ID)
+
+
+def append(start: float, count: int, step: float = 1.0):
+    DeviceLogStore.append_lines(DEVICE_ID, [{ "time": start + index * step, "level": "info", "message": f"line {index}" } for index in range(count)])
+
+
+def messages(lines: list):
+    return [line["message"] for line in lines]
+
+
+def test_tail_returns_newest_lines_in_order():
+    append(start=BASE, count=10)
+    assert messages(DeviceLogStore.read_tail(DEVICE_ID, limit=3)) == ["line 7", "line 8", "line 9"]
+    assert len(DeviceLogStore.read_tail(DEVICE_ID, limit=100)) == 10
+
+
+def test_tail_skips_partial_last_line():
+    append(start=BASE, count=2)
+    writer = DeviceLogStore.writers[DEVICE_ID]
+    writer.file.write(f"{(BASE + 2) * 1000} {{\"level\": \"in".encode("utf-8"))
+    writer.file.flush()
+    assert messages(DeviceLogStore.read_tail(DEVICE_ID, limit=5)) == ["line 0", "line 1"]
+
+
+def test_range_is_inclusive_and_limited():
+    append(start=BASE, count=100)
+    lines = DeviceLogStore.read_range(DEVICE_ID, start_time=BASE + 10, end_time=BASE + 20, limit=100)
+    assert messages(lines) == [f"line {index}" for index in range(10, 21)]
+    lines = DeviceLogStore.read_range(DEVICE_ID, start_time=BASE + 10, end_time=BASE + 20, limit=4)
+    assert messages(lines) == [f"line {index}" for index in range(10, 14)]
+    assert DeviceLogStore.read_range(DEVICE_ID, start_time=BASE + 10_000, end_time=BASE + 10_100, limit=10) == []
+
+
+def test_segments_rotate_by_time_and_range_spans_them(monkeypatch):
+    monkeypatch.setattr(ConfigManage, "LOG_STORE_SEGMENT_SECONDS", 10)
+    append(start=BASE, count=35)
+    assert len(DeviceLogStore.list_segments(DEVICE_ID)) == 4
+    lines = DeviceLogStore.read_range(DEVICE_ID, start_time=BASE + 8, end_time=BASE + 12, limit=100)
+    assert messages(lines) == [f"line {index}" for index in range(8, 13)]
+    assert messages(DeviceLogStore.read_tail(DEVICE_ID, limit=7)) == [f"line {index}" for index in range(28, 35)]
+
+
+def test_segments_rotate_by_size(monkeypatch):
+    append(start=BASE, count=1)
+    segment_size = os.path.getsize(DeviceLogStore.list_segments(DEVICE_ID)[0][1])
+    monkeypatch.setattr(ConfigManage, "LOG_STORE_SEGMENT_BYTES", segment_size * 5)
+    append(start=BASE + 1, count=19)
+    assert len(DeviceLogStore.list_segments(DEVICE_ID)) == 4
+    assert len(DeviceLogStore.read_tail(DEVICE_ID, limit=100)) == 20
+
+
+def test_retention_drops_expired_segments_but_keeps_newest(monkeypatch):
+    monkeypatch.setattr(ConfigManage, "LOG_STORE_SEGMENT_SECONDS", 60)
+    old = time.time() - 30 * 86400
+    append(start=old, count=3, step=60)
+    append(start=time.time(), count=2, step=60)
+    segments = DeviceLogStore.list_segments(DEVICE_ID)
+    assert segments[0][0] > int(old * 1000) + 60_000
+    assert messages(DeviceLogStore.read_tail(DEVICE_ID, limit=10))[-2:] == ["line 0", "line 1"]
+
+
+def test_retention_caps_device_size(monkeypatch):
+    monkeypatch.setattr(ConfigManage, "LOG_STORE_SEGMENT_SECONDS", 10)
+    append(start=BASE, count=1)
+    segment_size = os.path.getsize(DeviceLogStore.list_segments(DEVICE_ID)[0][1])
+    monkeypatch.setattr(ConfigManage, "LOG_STORE_MAX_DEVICE_BYTES", segment_size * 30)
+    append(start=BASE + 1, count=99)
+    total = sum(os.path.getsize(path) for _, path in DeviceLogStore.list_segments(DEVICE_ID))
+    assert total <= segment_size * 30 + segment_size * 10
+    assert messages(DeviceLogStore.read_tail(DEVICE_ID, limit=1)) == ["line 98"]
+
+
+def test_retention_sweep_expires_quiet_devices(monkeypatch, storage):
+    monkeypatch.setattr(ConfigManage, "LOG_STORE_SEGMENT_SECONDS", 60)
+    old = time.time() - 30 * 86400
+    append(start=old, count=3, step=60)
+    DeviceLogStore.close_writer(device_id=DEVICE_ID)
+    for _, path in DeviceLogStore.list_segments(DEVICE_ID):
+        os.utime(path, (old + 180, old + 180))
+
+    active_device_id = str(uuid.uuid4())
+    DeviceLogStore.append_lines(active_device_id, [{ "time": old, "level": "info", "message": "line 0" }])
+    os.makedirs(storage / "device_logs" / "not-a-device")
+
+    DeviceLogStore.enforce_all_retention()
+    assert DeviceLogStore.list_segments(DEVICE_ID) == []
+    # Open for writing on this worker, its newest segment is kept.
+    assert len(DeviceLogStore.list_segments(active_device_id)) == 1
+    DeviceLogStore.close_writer(device_id=active_device_id)
+
+
+def test_reads_reject_non_uuid_device_id():
+    with pytest.raises(ValueError):
+        DeviceLogStore.read_tail("../etc", limit=1)
+
+
+def test_disabled_without_storage_path(monkeypatch):
+    monkeypatch.setattr(ConfigManage, "STORAGE_PATH", None)
+    assert asyncio.run(DeviceLogStore.tail(DEVICE_ID, limit=10)) == []
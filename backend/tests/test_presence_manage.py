@@ -0,0 +1,44 @@
+import asyncio
+import tempfile
+
+from utils.presence_manage import InMemoryPresenceBackend, LocalPresenceBackend
+
+
+async def on_message(message):
+    pass
+
+
+def test_in_memory_take_returns_entry_once():
+    async def run():
+        backend = InMemoryPresenceBackend(worker_id="worker-a")
+        backend.set("resume", "device-1", { "jti": "1" })
+        return await backend.take("resume", "device-1"), await backend.take("resume", "device-1")
+
+    first, second = asyncio.run(run())
+    assert first == { "jti": "1", "worker_id": "worker-a" }
+    assert second is None
+
+
+def test_local_take_goes_to_one_worker_only():
+    async def run():
+        socket_path = f"{tempfile.mkdtemp()}/presence.sock"
+        backends = [LocalPresenceBackend(socket_path=socket_path, worker_id=f"worker-{index}") for index in range(3)]
+        for backend in backends:
+            await backend.start(on_message)
+        try:
+            backends[0].set("resume", "device-1", { "jti": "1" })
+            for _ in range(50):
+                if all(backend.get("resume", "device-1") for backend in backends):
+                    break
+                await asyncio.sleep(0.01)
+
+            results = await asyncio.gather(*[backend.take("resume", "device-1") for backend in backends])
+            await asyncio.sleep(0.05)
+            return results, [backend.get("resume", "device-1") for backend in backends]
+        finally:
+            for backend in reversed(backends):
+                await backend.stop()
+
+    results, remaining = asyncio.run(run())
+    assert [result for result in results if result] == [{ "jti": "1", "worker_id": "worker-0" }]
+    assert remaining == [None, None, None]
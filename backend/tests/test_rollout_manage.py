@@ -0,0 +1,27 @@
+import pytest
+
+from utils.rollout_manage import RolloutManager
+
+
+def test_plan_waves_grows_from_canary():
+    assert RolloutManager.plan_waves(total=100, canary_percent=5, wave_multiplier=2) == [5, 10, 20, 40, 25]
+
+
+def test_plan_waves_canary_has_at_least_one_device():
+    assert RolloutManager.plan_waves(total=3, canary_percent=1, wave_multiplier=2) == [1, 2]
+
+
+def test_plan_waves_multiplier_one_still_grows():
+    assert RolloutManager.plan_waves(total=10, canary_percent=10, wave_multiplier=1) == [1, 2, 3, 4]
+
+
+def test_plan_waves_single_device():
+    assert RolloutManager.plan_waves(total=1, canary_percent=5, wave_multiplier=2) == [1]
+
+
+@pytest.mark.parametrize("total", [1, 7, 50, 99, 1000])
+@pytest.mark.parametrize("canary_percent, wave_multiplier", [(5, 2), (10, 1.5), (100, 2), (0.1, 3)])
+def test_plan_waves_covers_every_device(total, canary_percent, wave_multiplier):
+    sizes = RolloutManager.plan_waves(total=total, canary_percent=canary_percent, wave_multiplier=wave_multiplier)
+    assert sum(sizes) == total
+    assert all(size > 0 for size in sizes)
@@ -0,0 +1,147 @@
+import asyncio
+import pytest
+
+from utils.task_manage import TaskStatus, TaskStore, RetryPolicy
+
+
+def create_store(**kwargs):
+    return TaskStore(**{ "max_size": 10, "terminal_ttl": 0.05, "ack_timeout": 0.05, "progress_timeout": 0.1, **kwargs })
+
+
+def add_task(store: TaskStore, task_id: str, device_id: str = "device-1"):
+    return store.add(task_id=task_id, device_id=device_id, user_id="user-1", name="OTA", params={}, context=None)
+
+
+def test_ack_timeout_fires():
+    async def run():
+        store = create_store()
+        timeouts = []
+        async def on_timeout(task, stage):
+            timeouts.append((task["task_id"], stage))
+        store.on_timeout = on_timeout
+        add_task(store, "task-1")
+        await asyncio.sleep(0.1)
+        return timeouts
+
+    assert asyncio.run(run()) == [("task-1", "ack")]
+
+
+def test_progress_timeout_replaces_ack_timeout():
+    async def run():
+        store = create_store()
+        timeouts = []
+        async def on_timeout(task, stage):
+            timeouts.append(stage)
+        store.on_timeout = on_timeout
+        add_task(store, "task-1")
+        store.update_status(task_id="task-1", status=TaskStatus.ACKNOWLEDGED)
+        await asyncio.sleep(0.07)
+        assert timeouts == []
+        await asyncio.sleep(0.07)
+        return timeouts
+
+    assert asyncio.run(run()) == ["progress"]
+
+
+def test_terminal_task_expires_after_ttl():
+    async def run():
+        store = create_store()
+        add_task(store, "task-1")
+        store.update_status(task_id="task-1", status=TaskStatus.COMPLETED)
+        assert store.get("task-1")["status"] == TaskStatus.COMPLETED
+        await asyncio.sleep(0.08)
+        return store
+
+    store = asyncio.run(run())
+    assert store.get("task-1") is None
+    assert store.device_tasks == {}
+    assert store.timers == {}
+
+
+def test_full_store_evicts_terminal_task_first():
+    async def run():
+        store = create_store(max_size=2, terminal_ttl=60)
+        add_task(store, "task-1")
+        add_task(store, "task-2")
+        store.update_status(task_id="task-2", status=TaskStatus.FAILED)
+        add_task(store, "task-3")
+        return store
+
+    store = asyncio.run(run())
+    assert list(store.tasks) == ["task-1", "task-3"]
+
+
+def test_full_store_evicts_oldest_in_flight_task():
+    async def run():
+        store = create_store(max_size=2)
+        for task_id in ("task-1", "task-2", "task-3"):
+            add_task(store, task_id)
+        return store
+
+    store = asyncio.run(run())
+    assert list(store.tasks) == ["task-2", "task-3"]
+    assert "task-1" not in store.timers
+
+
+def test_retry_counts_attempts_and_rearms_ack():
+    async def run():
+        store = create_store()
+        timeouts = []
+        async def on_timeout(task, stage):
+            timeouts.append(task["attempts"])
+        store.on_timeout = on_timeout
+        add_task(store, "task-1")
+        store.update_status(task_id="task-1", status=TaskStatus.ACKNOWLEDGED)
+        store.retry(task_id="task-1", delay=0.02)
+        await asyncio.sleep(0.05)
+        return store, timeouts
+
+    store, timeouts = asyncio.run(run())
+    assert store.get("task-1")["status"] == TaskStatus.PENDING_ACK
+    assert timeouts == [2]
+
+
+def test_in_flight_per_device():
+    async def run():
+        store = create_store()
+        add_task(store, "task-1", device_id="device-1")
+        add_task(store, "task-2", device_id="device-1")
+        add_task(store, "task-3", device_id="device-2")
+        store.update_status(task_id="task-2", status=TaskStatus.COMPLETED)
+        assert store.in_flight_count() == 2
+        assert store.in_flight_count(device_id="device-1") == 1
+        assert store.has_in_flight(device_id="device-1")
+        assert not store.has_in_flight(device_id="device-1", exclude_task_id="task-1")
+        store.remove_device(device_id="device-1")
+        return store
+
+    store = asyncio.run(run())
+    assert list(store.tasks) == ["task-3"]
+    assert list(store.timers) == ["task-3"]
+
+
+def test_retry_policy_backoff_is_capped():
+    policy = RetryPolicy(max_attempts=5, multiplier=2, max_delay=25, jitter=0)
+    assert [policy.delay(ack_timeout=10, attempt=attempt) for attempt in (2, 3, 4, 5)] == [10, 20, 25, 25]
+
+
+def test_retry_policy_jitter_is_bounded():
+    policy = RetryPolicy(max_attempts=3, multiplier=2, max_delay=300, jitter=0.5)
+    for _ in range(100):
+        assert 20 <= policy.delay(ack_timeout=10, attempt=3) <= 30
+
+
+def test_retry_policy_attempts():
+    policy = RetryPolicy(max_attempts=3)
+    assert policy.can_retry(1) and policy.can_retry(2)
+    assert not policy.can_retry(3)
+    assert not RetryPolicy(max_attempts=0).can_retry(1)
+
+
+def test_retry_policy_overrides():
+    policies = RetryPolicy.from_config(default={ "max_attempts": 2, "max_delay": 60 }, overrides='{"OTA": {"max_attempts": 5}}')
+    assert policies["OTA"].max_attempts == 5
+    assert policies["OTA"].max_delay == 60
+    assert policies["default"].max_attempts == 2
+    with pytest.raises(TypeError):
+        RetryPolicy.from_config(default={}, overrides='{"OTA": {"unknown": 1}}')
@@ -0,0 +1,90 @@
+import time
+import random
+
+from utils.config_manage import ConfigManage
+
+
+class TokenBucket:
+    """Refills `rate` tokens per second up to `burst`, a connect takes one token. A rate of 0 or less is no limit."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+
+    def refill(self):
+        if self.rate <= 0:
+            self.tokens = float(self.burst)
+            return
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+    def take(self) -> float:
+        """0 when a token is taken, otherwise seconds until the next token is available."""
+        if self.rate <= 0:
+            return 0
+        self.refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """
+        Admission control of device websocket handshakes of this worker.
+        A handshake needs a token of the connect rate bucket (DEVICE_CONNECT_RATE per second, DEVICE_CONNECT_BURST)
+        and a free slot of DEVICE_HANDSHAKE_CONCURRENCY, the slot is held from token verification until INIT is sent.
+        A rejected device gets `retry_after` seconds spread by DEVICE_CONNECT_RETRY_JITTER, so a reconnecting fleet
+        comes back as a ramp instead of a second spike.
+    """
+
+    bucket = TokenBucket(rate=ConfigManage.DEVICE_CONNECT_RATE, burst=ConfigManage.DEVICE_CONNECT_BURST)
+    handshakes = 0
+    admitted = 0
+    rejected = { "rate": 0, "concurrency": 0 }
+
+
+    @classmethod
+    def retry_after(cls, wait: float):
+        return round(wait + random.uniform(0, ConfigManage.DEVICE_CONNECT_RETRY_JITTER), 1)
+
+
+    @classmethod
+    def admit(cls) -> float | None:
+        """None when the handshake is admitted (release() must follow), otherwise retry_after seconds."""
+        if cls.handshakes >= ConfigManage.DEVICE_HANDSHAKE_CONCURRENCY:
+            cls.rejected["concurrency"] += 1
+            return cls.retry_after(1 / cls.bucket.rate if cls.bucket.rate > 0 else 1)
+
+        wait = cls.bucket.take()
+        if wait > 0:
+            cls.rejected["rate"] += 1
+            return cls.retry_after(wait)
+
+        cls.handshakes += 1
+        cls.admitted += 1
+        return None
+
+
+    @classmethod
+    def release(cls):
+        cls.handshakes = max(cls.handshakes - 1, 0)
+
+
+    @classmethod
+    def stats(cls):
+        cls.bucket.refill()
+        return {
+            "handshakes": cls.handshakes,
+            "handshake_limit": ConfigManage.DEVICE_HANDSHAKE_CONCURRENCY,
+            "tokens": round(cls.bucket.tokens, 2),
+            "rate": cls.bucket.rate,
+            "burst": cls.bucket.burst,
+            "admitted": cls.admitted,
+            "rejected": dict(cls.rejected)
+        }
@@ -0,0 +1,116 @@
+import io
+import asyncio
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageDraw, ImageFont
+
+from utils.config_manage import ConfigManage
+
+
+_font = None
+
+
+def draw_inference_boxes(image_bytes: bytes, inference_results: list) -> bytes:
+    """Run inside the worker process, draw bounding boxes on the JPEG and re-encode it."""
+    global _font
+    if _font is None:
+        _font = ImageFont.load_default()
+
+    image = Image.open(io.BytesIO(image_bytes))
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    draw = ImageDraw.Draw(image)
+
+    for result in inference_results:
+        category = result.get('category', 'N/A')
+        score = result.get('score', 0.0)
+        box = result.get('box', [])
+
+        if len(box) == 4:
+            left_up_x, left_up_y, right_down_x, right_down_y = map(int, box)
+
+            # 1. 繪製原始辨識框
+            draw.rectangle(
+                [(left_up_x, left_up_y), (right_down_x, right_down_y)],
+                outline="red",
+                width=2
+            )
+
+            # 2. 顯示的文字
+            text = f"Category: {category}, Score: {score:.1%}"
+
+            # 3. 在辨識框的左上角繪製文字
+            text_position = (left_up_x + 5, left_up_y + 5)
+
+            # 為了讓文字更清晰，先畫一個小的背景矩形
+            text_bbox = draw.textbbox(text_position, text, font=_font)
+            draw.rectangle(text_bbox, fill="red")
+            draw.text(text_position, text, fill="white", font=_font)
+
+        else:
+            print(f"Warning: Invalid bounding box format: {box}")
+
+    output_stream = io.BytesIO()
+    image.save(output_stream, format="JPEG")
+    return output_stream.getvalue()
+
+
+class AnnotationManager:
+    """
+        Offload the PIL decode / draw / encode work of INFERENCE_RESULT to a process pool,
+        so the event loop only hands over bytes and awaits the finished frame.
+    """
+
+    executor: ProcessPoolExecutor | None = None
+    submit_slots: asyncio.Semaphore | None = None
+    device_locks: dict = {}
+
+
+    @classmethod
+    def start(cls):
+        if cls.executor is None:
+            cls.executor = ProcessPoolExecutor(max_workers=ConfigManage.ANNOTATION_WORKERS)
+            cls.submit_slots = asyncio.Semaphore(ConfigManage.ANNOTATION_QUEUE_SIZE)
+            print(f"Annotation worker pool started, workers: {ConfigManage.ANNOTATION_WORKERS}, queue size: {ConfigManage.ANNOTATION_QUEUE_SIZE}")
+
+
+    @classmethod
+    def shutdown(cls):
+        if cls.executor:
+            cls.executor.shutdown(wait=False, cancel_futures=True)
+            cls.executor = None
+            cls.submit_slots = None
+            cls.device_locks.clear()
+            print("Annotation worker pool shutdown.")
+
+
+    @classmethod
+    def release_device(cls, device_id: str):
+        if device_id in cls.device_locks:
+            del cls.device_locks[device_id]
+
+
+    @classmethod
+    async def annotate(cls, device_id: str, image_bytes: bytes, inference_results: list) -> bytes | None:
+        """
+            Return the annotated JPEG, or None when the submit queue is full and the frame is dropped.
+            Frames of the same device are processed one at a time, so they come back in arrival order.
+        """
+        if cls.executor is None:
+            cls.start()
+
+        if cls.submit_slots.locked():
+            print(f"[{device_id}] Annotation queue is full, drop frame.")
+            return None
+
+        async with cls.submit_slots:
+            device_lock = cls.device_locks.setdefault(device_id, asyncio.Lock())
+            async with device_lock:
+                try:
+                    loop = asyncio.get_running_loop()
+                    return await loop.run_in_executor(cls.executor, draw_inference_boxes, image_bytes, inference_results)
+                except Exception:
+                    print(f"[{device_id}] Annotation worker failed.")
+                    print(traceback.format_exc())
+                    return None
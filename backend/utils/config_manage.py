@@ -14,15 +14,89 @@ class ConfigManage:
     SERVER_HOST=os.getenv("SERVER_HOST")
     SERVER_PORT=os.getenv("SERVER_PORT")
     SERVER_DOMAIN=os.getenv("SERVER_DOMAIN")
+    SERVER_WORKERS=int(os.getenv("SERVER_WORKERS") or 1)
 
     # Local Storage Config
     STORAGE_PATH=os.getenv("STORAGE_PATH")
+    UPLOAD_CHUNK_SIZE=int(os.getenv("UPLOAD_CHUNK_SIZE") or 1024 * 1024)
+    FIRMWARE_MAX_SIZE=int(os.getenv("FIRMWARE_MAX_SIZE") or 256 * 1024 * 1024)
+    MODEL_MAX_SIZE=int(os.getenv("MODEL_MAX_SIZE") or 1024 * 1024 * 1024)
 
     # Authentication Config
     SECRET_KEY=os.getenv("SECRET_KEY")
     ALGORITHM=os.getenv("ALGORITHM")
     ACCESS_TOKEN_EXPIRE_MINUTES=os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES")
 
+    # Inference Annotation Config
+    ANNOTATION_WORKERS=int(os.getenv("ANNOTATION_WORKERS") or os.cpu_count() or 1)
+    ANNOTATION_QUEUE_SIZE=int(os.getenv("ANNOTATION_QUEUE_SIZE") or 64)
+    ANNOTATION_MODE=os.getenv("ANNOTATION_MODE") or "server"
+
+    # Frontend Image Transport Config
+    FRONTEND_IMAGE_TRANSPORT=os.getenv("FRONTEND_IMAGE_TRANSPORT") or "json"
+    FRONTEND_SESSION_QUEUE_SIZE=int(os.getenv("FRONTEND_SESSION_QUEUE_SIZE") or 256)
+    FRAME_PAIR_TIMEOUT=float(os.getenv("FRAME_PAIR_TIMEOUT") or 5)
+    FRAME_PAIR_MAX_PENDING=int(os.getenv("FRAME_PAIR_MAX_PENDING") or 8)
+
+    # Device Inbound Lane Config
+    DEVICE_CONTROL_QUEUE_SIZE=int(os.getenv("DEVICE_CONTROL_QUEUE_SIZE") or 256)
+    DEVICE_TELEMETRY_QUEUE_SIZE=int(os.getenv("DEVICE_TELEMETRY_QUEUE_SIZE") or 128)
+    DEVICE_MEDIA_QUEUE_SIZE=int(os.getenv("DEVICE_MEDIA_QUEUE_SIZE") or 32)
+    DEVICE_CONTROL_QUEUE_POLICY=os.getenv("DEVICE_CONTROL_QUEUE_POLICY") or "block"
+    DEVICE_TELEMETRY_QUEUE_POLICY=os.getenv("DEVICE_TELEMETRY_QUEUE_POLICY") or "drop-oldest"
+    DEVICE_MEDIA_QUEUE_POLICY=os.getenv("DEVICE_MEDIA_QUEUE_POLICY") or "drop-oldest"
+
+    # Device Log Config
+    LOG_FLUSH_INTERVAL=float(os.getenv("LOG_FLUSH_INTERVAL") or 0.25)
+    LOG_BATCH_MAX_SIZE=int(os.getenv("LOG_BATCH_MAX_SIZE") or 200)
+    LOG_BUFFER_SIZE=int(os.getenv("LOG_BUFFER_SIZE") or 500)
+    LOG_STORE_SEGMENT_BYTES=int(os.getenv("LOG_STORE_SEGMENT_BYTES") or 8 * 1024 * 1024)
+    LOG_STORE_SEGMENT_SECONDS=int(os.getenv("LOG_STORE_SEGMENT_SECONDS") or 3600)
+    LOG_STORE_RETENTION_DAYS=float(os.getenv("LOG_STORE_RETENTION_DAYS") or 7)
+    LOG_STORE_MAX_DEVICE_BYTES=int(os.getenv("LOG_STORE_MAX_DEVICE_BYTES") or 256 * 1024 * 1024)
+    LOG_STORE_RETENTION_INTERVAL=float(os.getenv("LOG_STORE_RETENTION_INTERVAL") or 3600)
+
+    # Presence Backend Config
+    PRESENCE_BACKEND=os.getenv("PRESENCE_BACKEND") or "memory"
+    PRESENCE_SOCKET_PATH=os.getenv("PRESENCE_SOCKET_PATH") or "/tmp/aiot_presence.sock"
+
+    # Device Task Lifecycle Config
+    TASK_STORE_MAX_SIZE=int(os.getenv("TASK_STORE_MAX_SIZE") or 10000)
+    TASK_TERMINAL_TTL=float(os.getenv("TASK_TERMINAL_TTL") or 300)
+    TASK_ACK_TIMEOUT=float(os.getenv("TASK_ACK_TIMEOUT") or 30)
+    TASK_PROGRESS_TIMEOUT=float(os.getenv("TASK_PROGRESS_TIMEOUT") or 1800)
+    TASK_RETRY_MAX_ATTEMPTS=int(os.getenv("TASK_RETRY_MAX_ATTEMPTS") or 3)
+    TASK_RETRY_MULTIPLIER=float(os.getenv("TASK_RETRY_MULTIPLIER") or 2.0)
+    TASK_RETRY_MAX_DELAY=float(os.getenv("TASK_RETRY_MAX_DELAY") or 300)
+    TASK_RETRY_JITTER=float(os.getenv("TASK_RETRY_JITTER") or 0.2)
+    TASK_RETRY_POLICIES=os.getenv("TASK_RETRY_POLICIES") or None
+    OFFLINE_COMMAND_QUEUE_SIZE=int(os.getenv("OFFLINE_COMMAND_QUEUE_SIZE") or 32)
+    WRITE_BEHIND_FLUSH_INTERVAL=float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL") or 0.5)
+    WRITE_BEHIND_BATCH_SIZE=int(os.getenv("WRITE_BEHIND_BATCH_SIZE") or 500)
+    BULK_COMMAND_CONCURRENCY=int(os.getenv("BULK_COMMAND_CONCURRENCY") or 16)
+
+    # Firmware Rollout Config
+    ROLLOUT_CANARY_PERCENT=float(os.getenv("ROLLOUT_CANARY_PERCENT") or 5)
+    ROLLOUT_WAVE_MULTIPLIER=float(os.getenv("ROLLOUT_WAVE_MULTIPLIER") or 2)
+    ROLLOUT_ERROR_THRESHOLD=float(os.getenv("ROLLOUT_ERROR_THRESHOLD") or 0.2)
+    ROLLOUT_POLL_INTERVAL=float(os.getenv("ROLLOUT_POLL_INTERVAL") or 2)
+    ROLLOUT_WAVE_TIMEOUT=float(os.getenv("ROLLOUT_WAVE_TIMEOUT") or 1800)
+    FIRMWARE_DOWNLOAD_CONCURRENCY=int(os.getenv("FIRMWARE_DOWNLOAD_CONCURRENCY") or 20)
+    FIRMWARE_DOWNLOAD_WAIT=float(os.getenv("FIRMWARE_DOWNLOAD_WAIT") or 30)
+
+    # Device Session Resume Config
+    RESUME_GRACE_SECONDS=float(os.getenv("RESUME_GRACE_SECONDS") or 60)
+
+    # Device Connect Admission Config
+    DEVICE_HANDSHAKE_CONCURRENCY=int(os.getenv("DEVICE_HANDSHAKE_CONCURRENCY") or 32)
+    DEVICE_CONNECT_RATE=float(os.getenv("DEVICE_CONNECT_RATE") or 50)
+    DEVICE_CONNECT_BURST=int(os.getenv("DEVICE_CONNECT_BURST") or 100)
+    DEVICE_CONNECT_RETRY_JITTER=float(os.getenv("DEVICE_CONNECT_RETRY_JITTER") or 10)
+
+    # Device Heartbeat Config
+    HEARTBEAT_INTERVAL=float(os.getenv("HEARTBEAT_INTERVAL") or 15)
+    HEARTBEAT_MISSED_LIMIT=int(os.getenv("HEARTBEAT_MISSED_LIMIT") or 3)
+
 
     @classmethod
     def get(cls, key, default=None):
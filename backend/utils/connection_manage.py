@@ -1,5 +1,4 @@
 import os
-import io
 import json
 import base64
 import asyncio
@@ -7,73 +6,392 @@ import traceback
 import time
 from uuid import uuid4
 from fastapi import WebSocket
-from PIL import Image, ImageDraw, ImageFont
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Callable
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from utils.config_manage import ConfigManage
+from utils.annotation_manage import AnnotationManager
+from utils.frame_manage import FrameCodec, FrameContentType, FrameMailbox, FramePairer
+from utils.presence_manage import PresenceBackend, InMemoryPresenceBackend, create_presence_backend
+from utils.session_manage import FrontendSession, interest_matches, merge_interests
+from utils.task_manage import TaskStatus, TaskStore, RetryPolicy
+from utils.resume_manage import ResumeTokenManager
+from utils.inbox_manage import DeviceInbox
+from utils.log_manage import LogManager
+from utils.heartbeat_manage import TimerWheel
+
+# Device stream kind of each frontend action, used by per-device subscriptions
+FRONTEND_STREAM_KINDS = {
+    "INFERENCE_RESULT": "frames",
+    "INFERENCE_METADATA": "frames",
+    "LOG": "logs",
+    "LOG_BATCH": "logs",
+    "MODE_SWITCH": "tasks",
+    "OTA": "tasks",
+    "MODEL_DOWNLOAD": "tasks",
+    "MODEL_SWITCH": "tasks"
+}
+
+class DeviceMessageContext:
+    """
+        State of one device websocket passed to every device message handler.
+        No database session is held by the connection, `device_connected_callback` gets a session of `session_maker` only
+        for its own work, `device_update_callback` (task completed) needs none as its writes are batched.
+    """
+
+    def __init__(self, session_maker: Callable[[], AsyncSession], user_id: str, device_id: str, device_update_callback, device_connected_callback=None):
+        self.session_maker = session_maker
+        self.user_id = user_id
+        self.device_id = device_id
+        self.frames = FramePairer(timeout=ConfigManage.FRAME_PAIR_TIMEOUT, max_pending=ConfigManage.FRAME_PAIR_MAX_PENDING)
+        self.device_update_callback = device_update_callback
+        self.device_connected_callback = device_connected_callback
+        self.log_id = f"{user_id}:{device_id}"
 
-class TaskStatus:
-    PENDING_ACK = "PENDING_ACK"
-    ACKNOWLEDGED = "ACKNOWLEDGED"
-    IN_PROGRESS = "IN_PROGRESS"
-    COMPLETED = "COMPLETED"
-    FAILED = "FAILED"
 
 class ConnectionManager:
 
     active_devices: dict = {}
     active_frontends: dict = {}
+    frame_mailboxes: dict = {}
+    resume_timers: dict = {}
+    # Device message handlers keyed by (action, status), see register_handler / register_task_action
+    handlers: dict = {}
+    task_actions: set = set()
+    handler_stats: dict = {}
+    handler_timing_hook = None
+    # Called with (task_info, reason) when a task fails by device ERROR or TIMEOUT, see RolloutManager
+    on_task_failed: Optional[Callable[[dict, str], Any]] = None
+    # Single reaper of devices missing HEARTBEAT_MISSED_LIMIT heartbeats, see reap_stale_devices
+    heartbeat_wheel: TimerWheel = TimerWheel.for_timeout(tick=1, timeout=ConfigManage.HEARTBEAT_INTERVAL * ConfigManage.HEARTBEAT_MISSED_LIMIT)
+    heartbeat_task: Optional[asyncio.Task] = None
+    presence: PresenceBackend = InMemoryPresenceBackend()
+    tasks: TaskStore = TaskStore(
+        max_size=ConfigManage.TASK_STORE_MAX_SIZE,
+        terminal_ttl=ConfigManage.TASK_TERMINAL_TTL,
+        ack_timeout=ConfigManage.TASK_ACK_TIMEOUT,
+        progress_timeout=ConfigManage.TASK_PROGRESS_TIMEOUT
+    )
+    retry_policies: Dict[str, RetryPolicy] = RetryPolicy.from_config(
+        default={
+            "max_attempts": ConfigManage.TASK_RETRY_MAX_ATTEMPTS,
+            "multiplier": ConfigManage.TASK_RETRY_MULTIPLIER,
+            "max_delay": ConfigManage.TASK_RETRY_MAX_DELAY,
+            "jitter": ConfigManage.TASK_RETRY_JITTER
+        },
+        overrides=ConfigManage.TASK_RETRY_POLICIES
+    )
 
 
     @classmethod
-    async def connect_device(cls, user_id: str, device_id: str, mode: str, model_id: str, websocket: WebSocket):
+    async def start(cls):
+        cls.tasks.on_timeout = cls.handle_task_timeout
+        LogManager.on_flush = cls.send_log_batch
+        cls.presence = create_presence_backend()
+        await cls.presence.start(on_message=cls.handle_routed_message)
+        if ConfigManage.HEARTBEAT_INTERVAL > 0:
+            cls.heartbeat_task = asyncio.create_task(cls.reap_stale_devices())
+
+
+    @classmethod
+    async def stop(cls):
+        if cls.heartbeat_task:
+            cls.heartbeat_task.cancel()
+            cls.heartbeat_task = None
+        await cls.presence.stop()
+
+
+    @classmethod
+    async def handle_routed_message(cls, message: dict):
+        """Handle message published by other worker to the websocket owned by this worker."""
+        message_type = message.get("type")
+        if message_type == "SEND_TASK":
+            await cls.send_task_to_device(user_id=message["user_id"], device_id=message["device_id"], task=message["task"], task_params=message.get("task_params"), task_context=message.get("task_context"))
+        elif message_type == "RESUME_TAKEN":
+            cls.release_parked_session(device_id=message["device_id"])
+        elif message_type == "FRONTEND_MESSAGE":
+            payload = message["message"]
+            if message["message_type"] == "byte":
+                payload = base64.b64decode(payload)
+            cls.deliver_to_sessions(user_id=message["user_id"], message_type=message["message_type"], payload=payload, device_id=message.get("device_id"), kind=message.get("kind"))
+        elif message_type == "FRONTEND_FRAME":
+            messages = [(item_type, base64.b64decode(payload) if item_type == "byte" else payload) for item_type, payload in message["messages"]]
+            cls.deliver_frame_to_sessions(user_id=message["user_id"], device_id=message["device_id"], messages=messages)
+        else:
+            print(f"Unknown routed message type: {message_type}")
+
+
+    @classmethod
+    def sync_device_presence(cls, device_id: str):
+        device = cls.active_devices.get(device_id)
+        if device is None:
+            return
+        cls.presence.set("device", device_id, {
+            "user_id": device["user_id"],
+            "connection_state": device["connection_state"],
+            "tasks": { task["task_id"]: { "name": task["name"], "status": task["status"], "attempts": task["attempts"] } for task in cls.tasks.get_device_tasks(device_id) if task["status"] in TaskStatus.IN_FLIGHT }
+        })
+
+
+    @classmethod
+    async def connect_device(cls, user_id: str, device_id: str, mode: str, model_id: str, websocket: WebSocket, labels: Optional[Dict] = None, resumed: bool = False):
+        """
+            resumed: device presented a valid resume token, its session and pending tasks are restored
+            without INIT handshake, otherwise tasks of the previous session are dropped and INIT is sent.
+        """
 
         if(device_id in cls.active_devices):
             del cls.active_devices[device_id]
             print(f"Removed existed device websocket connection due to new connection for device_id: {device_id}")
 
+        resume_timer = cls.resume_timers.pop(device_id, None)
+        if resume_timer:
+            resume_timer.cancel()
+        if not resumed:
+            cls.tasks.remove_device(device_id=device_id)
+
         cls.active_devices[device_id] = {
             "websocket": websocket,
-            "connection_state": "busy",
+            "connection_state": "busy" if not resumed or cls.tasks.has_in_flight(device_id=device_id) else "connected",
             "user_id": user_id,
-            "tasks": {}
+            "mode": mode,
+            "model_id": model_id,
+            "labels": labels or {}
         }
         
-        print(f"active devices: {cls.active_devices[device_id]}")
-        print(f"Created websocket device connection, device_id: {device_id}")
-        await cls.send_init_to_device(device_id=device_id, init_params={ "mode": mode, "model_id": model_id })
+        cls.sync_device_presence(device_id=device_id)
+        print(f"Created websocket device connection, device_id: {device_id}, resumed: {resumed}")
+
+        if not resumed:
+            await cls.send_init_to_device(device_id=device_id, init_params={ "mode": mode, "model_id": model_id, "heartbeat_interval": ConfigManage.HEARTBEAT_INTERVAL })
+            return
+
+        # Tasks the device may have missed while offline are resent with the same task_id.
+        pending_tasks = [task for task in cls.tasks.get_device_tasks(device_id) if task["status"] in TaskStatus.IN_FLIGHT and task["name"] in cls.task_actions]
+        await cls.send_message_to_device(device_id, {
+            "action": "RESUMED",
+            "task_ids": [task["task_id"] for task in pending_tasks],
+            "heartbeat_interval": ConfigManage.HEARTBEAT_INTERVAL
+        })
+        for task in pending_tasks:
+            if task["status"] == TaskStatus.PENDING_ACK:
+                # The ack window restarts with the resend, the one armed before the disconnect may be almost over.
+                cls.tasks.update_status(task_id=task["task_id"], status=TaskStatus.PENDING_ACK)
+                await cls.send_message_to_device(device_id, task["context"]["message"])
+        await cls.issue_resume_token(device_id=device_id)
+        await cls.active_frontend_task(user_id=user_id, task="CONNECTED", type="text", device_id=device_id)
 
 
     @classmethod
-    async def disconnect_device(cls, user_id: str, device_id: str):
-        if(device_id in cls.active_devices):
+    async def disconnect_device(cls, user_id: str, device_id: str, websocket: WebSocket | None = None):
+        device = cls.active_devices.get(device_id)
+        if device and websocket is not None and device["websocket"] is not websocket:
+            # The device already reconnected with a new websocket, only the stale one is closed.
+            print(f"Skip cleanup of replaced device websocket connection, device_id: {device_id}")
+            return
+        if device is None and websocket is not None:
+            # Already cleaned up by the heartbeat reaper, the websocket loop is only ending now.
+            return
+
+        if device:
             del cls.active_devices[device_id]
             print(f"Cleaned up device websocket connection for device_id: {device_id}")
+
+        if device and device.get("resume_jti") and ConfigManage.RESUME_GRACE_SECONDS > 0:
+            cls.park_device_session(device_id=device_id, device=device)
+        else:
+            cls.tasks.remove_device(device_id=device_id)
+        cls.presence.delete("device", device_id)
+        AnnotationManager.release_device(device_id=device_id)
+        await LogManager.release_device(device_id=device_id)
+        cls.close_frame_mailboxes(device_id=device_id)
         print(f"Delete existed device websocket connection, device_id: {device_id}")
         await cls.active_frontend_task(user_id=user_id, task="DISCONNECTED", type="text", device_id=device_id)
 
 
+    @classmethod
+    async def issue_resume_token(cls, device_id: str):
+        device = cls.active_devices.get(device_id)
+        if device is None:
+            return
+        token, jti = ResumeTokenManager.issue(device_id=device_id, user_id=device["user_id"], mode=device["mode"], model_id=device["model_id"])
+        device["resume_jti"] = jti
+        await cls.send_message_to_device(device_id, { "action": "RESUME_TOKEN", "resume_token": token, "grace_seconds": ConfigManage.RESUME_GRACE_SECONDS })
+
+
+    @classmethod
+    async def update_device_session(cls, device_id: str, **values):
+        """Record the new mode / model_id of the device and re-issue its resume token."""
+        if device_id not in cls.active_devices:
+            return
+        cls.active_devices[device_id].update(values)
+        await cls.issue_resume_token(device_id=device_id)
+
+
+    @classmethod
+    def park_device_session(cls, device_id: str, device: dict):
+        """
+            Keep session and pending tasks of a disconnected device for RESUME_GRACE_SECONDS, visible to every worker.
+            The tasks are copied into the entry so the worker taking the resume can adopt them.
+        """
+        cls.presence.set("resume", device_id, {
+            "jti": device["resume_jti"],
+            "user_id": device["user_id"],
+            "mode": device["mode"],
+            "model_id": device["model_id"],
+            "labels": device["labels"],
+            "expires": time.time() + ConfigManage.RESUME_GRACE_SECONDS,
+            "tasks": cls.parked_tasks(device_id=device_id)
+        })
+        loop = asyncio.get_running_loop()
+        cls.resume_timers[device_id] = loop.call_later(ConfigManage.RESUME_GRACE_SECONDS, cls.expire_device_session, device_id)
+
+
+    @classmethod
+    def parked_tasks(cls, device_id: str):
+        return [task for task in cls.tasks.get_device_tasks(device_id) if task["status"] in TaskStatus.IN_FLIGHT]
+
+
+    @classmethod
+    def refresh_parked_session(cls, device_id: str):
+        """Pending tasks of the parked entry follow the local store, a task failed while parked is not adopted."""
+        session = cls.presence.get("resume", device_id)
+        if cls.presence.is_local(session):
+            cls.presence.set("resume", device_id, { **session, "tasks": cls.parked_tasks(device_id=device_id) })
+
+
+    @classmethod
+    def release_parked_session(cls, device_id: str):
+        """The session parked here was resumed on another worker, which adopted its tasks."""
+        resume_timer = cls.resume_timers.pop(device_id, None)
+        if resume_timer:
+            resume_timer.cancel()
+        if device_id not in cls.active_devices:
+            cls.tasks.remove_device(device_id=device_id)
+            print(f"Parked session of device: {device_id} resumed on other worker.")
+
+
+    @classmethod
+    def expire_device_session(cls, device_id: str):
+        cls.resume_timers.pop(device_id, None)
+        cls.presence.delete("resume", device_id)
+        if device_id not in cls.active_devices:
+            cls.tasks.remove_device(device_id=device_id)
+            print(f"Resume grace window of device: {device_id} expired.")
+
+
+    @classmethod
+    async def resume_device_session(cls, device_id: str, user_id: str, token: str | None) -> dict | None:
+        """
+            Parked session matching the resume token, None when the device must go through full INIT.
+            The entry is taken atomically, so the single use token resumes on one worker only. A session parked by other
+            worker brings its pending tasks along, that worker is told to drop its copies and timers.
+        """
+        if not token:
+            return None
+        claims = ResumeTokenManager.verify(token=token, device_id=device_id, user_id=user_id)
+        if claims is None:
+            return None
+        session = cls.presence.get("resume", device_id)
+        if session is None or session["jti"] != claims["jti"] or session["expires"] < time.time():
+            print(f"Resume session of device: {device_id} not found or expired.")
+            return None
+
+        session = await cls.presence.take("resume", device_id)
+        if session is None or session["jti"] != claims["jti"]:
+            print(f"Resume session of device: {device_id} was taken by other connection.")
+            return None
+
+        if not cls.presence.is_local(session):
+            for task in session.get("tasks", []):
+                cls.tasks.restore(task)
+            await cls.presence.publish(worker_id=session["worker_id"], message={ "type": "RESUME_TAKEN", "device_id": device_id })
+        return session
+
+
     @classmethod    
-    async def connect_frontend(cls, user_id: str, websocket: WebSocket):
-        if(user_id in cls.active_frontends):
-            del cls.active_frontends[user_id]
-            print(f"Removed existed frontend websocket connection due to new connection for user_id: {user_id}")
-        cls.active_frontends[user_id] = websocket
-        print(f"Created websocket frontend connection, user_id: {user_id}")
+    async def connect_frontend(cls, user_id: str, websocket: WebSocket) -> FrontendSession:
+        session = FrontendSession(user_id=user_id, websocket=websocket, queue_size=ConfigManage.FRONTEND_SESSION_QUEUE_SIZE)
+        cls.active_frontends.setdefault(user_id, {})[session.session_id] = session
+        cls.sync_frontend_presence(user_id=user_id)
+        print(f"Created websocket frontend connection, user_id: {user_id}, session_id: {session.session_id}, sessions: {len(cls.active_frontends[user_id])}")
+        return session
         
 
     @classmethod
-    async def disconnect_frontend(cls, user_id: str):
-        if(user_id in cls.active_frontends):
-            del cls.active_frontends[user_id]
-            print(f"Cleaned up frontend websocket connection for user_id: {user_id}")
+    async def disconnect_frontend(cls, user_id: str, session_id: str):
+        sessions = cls.active_frontends.get(user_id, {})
+        session = sessions.pop(session_id, None)
+        if session:
+            session.close()
+            cls.close_frame_mailboxes(viewer_id=session_id)
+            print(f"Cleaned up frontend websocket connection for user_id: {user_id}, session_id: {session_id}")
+        if not sessions:
+            cls.active_frontends.pop(user_id, None)
+        cls.sync_frontend_presence(user_id=user_id)
         print(f"Delete existed frontend websocket connection, user_id: {user_id}")
 
 
+    @classmethod
+    async def handle_frontend_message(cls, session: FrontendSession, data: dict):
+        """
+            Frontend stream subscription messages:
+            { "action": "SUBSCRIBE", "device_id": "<device_id or *>", "kinds": ["frames", "logs", "tasks"] }
+            { "action": "UNSUBSCRIBE", "device_id": "<device_id or *>", "kinds": [...] (optional, default all kinds) }
+        """
+        action = data.get("action", None)
+        device_id = data.get("device_id", None)
+        if action not in ("SUBSCRIBE", "UNSUBSCRIBE") or device_id is None:
+            print(f"[{session.user_id}:{session.session_id}] Invalid frontend message: {data}")
+            return
+
+        if action == "SUBSCRIBE":
+            session.subscribe(device_id=device_id, kinds=data.get("kinds", list(FrontendSession.STREAM_KINDS)))
+        else:
+            session.unsubscribe(device_id=device_id, kinds=data.get("kinds", None))
+        cls.sync_frontend_presence(user_id=session.user_id)
+
+
+    @classmethod
+    def sync_frontend_presence(cls, user_id: str):
+        """
+            Presence namespace `frontend:{user_id}` has one entry per worker holding sessions of the user,
+            with the merged subscriptions of those sessions, so device owner worker can skip streams nobody watches.
+        """
+        sessions = cls.active_frontends.get(user_id)
+        if sessions:
+            cls.presence.set(f"frontend:{user_id}", cls.presence.worker_id, {
+                "sessions": len(sessions),
+                "subscriptions": merge_interests([session.interest() for session in sessions.values()])
+            })
+        else:
+            cls.presence.delete(f"frontend:{user_id}", cls.presence.worker_id)
+
+
+    @classmethod
+    def has_frontend(cls, user_id: str):
+        return user_id in cls.active_frontends or len(cls.presence.items(f"frontend:{user_id}")) > 0
+
+
+    @classmethod
+    def is_subscribed(cls, user_id: str, device_id: str, kind: str):
+        """Whether any session of the user, on any worker, is subscribed to the device stream."""
+        return any(interest_matches(interest=value.get("subscriptions"), device_id=device_id, kind=kind) for _, value in cls.presence.items(f"frontend:{user_id}"))
+
+
+    @classmethod
+    def remote_frontend_workers(cls, user_id: str, device_id: str | None = None, kind: str | None = None):
+        return [
+            worker_id for worker_id, value in cls.presence.items(f"frontend:{user_id}")
+            if worker_id != cls.presence.worker_id and interest_matches(interest=value.get("subscriptions"), device_id=device_id, kind=kind)
+        ]
+
+
     @classmethod
     def get_device_connection_state(cls, device_id: str):
-        if(device_id in cls.active_devices):
-            connection_state = cls.active_devices.get(device_id).get("connection_state")
+        device_presence = cls.presence.get("device", device_id)
+        if(device_presence):
+            connection_state = device_presence.get("connection_state")
             return connection_state
         else:
             return None
@@ -83,37 +401,188 @@ class ConnectionManager:
     def set_device_connection_state(cls, device_id: str, task_id: str | None, connection_state: str, task_status: str | None):
         if(device_id in cls.active_devices):
             if task_id and task_status:
-                cls.active_devices.get(device_id)["connection_state"] = connection_state
-                cls.active_devices.get(device_id)["tasks"][task_id]["status"] = task_status
-            else:
-                cls.active_devices.get(device_id)["connection_state"] = connection_state
+                if cls.tasks.update_status(task_id=task_id, status=task_status) is None:
+                    print(f"Task: {task_id} of device: {device_id} is not in task store, it may be expired or evicted.")
+                # Another task still in flight keeps the device busy.
+                if connection_state == "connected" and cls.tasks.has_in_flight(device_id=device_id, exclude_task_id=task_id):
+                    connection_state = "busy"
+            cls.active_devices.get(device_id)["connection_state"] = connection_state
+            cls.sync_device_presence(device_id=device_id)
             return device_id
         else:
             return None
 
 
     @classmethod
-    async def send_message_to_device(cls, device_id: str, message: str):
+    def set_device_labels(cls, device_id: str, labels: Optional[Dict]):
+        if(device_id in cls.active_devices):
+            cls.active_devices.get(device_id)["labels"] = labels or {}
+            return device_id
+        else:
+            return None
+
+
+    @classmethod
+    def resolve_inference_labels(cls, device_id: str, inference_results: list):
+        labels = cls.active_devices.get(device_id, {}).get("labels", {})
+        resolved_results = []
+        for result in inference_results:
+            category = result.get("category", "N/A")
+            if isinstance(labels, list):
+                label = labels[category] if isinstance(category, int) and 0 <= category < len(labels) else str(category)
+            else:
+                label = labels.get(str(category), str(category))
+            resolved_results.append({
+                "category": category,
+                "label": label,
+                "score": result.get("score", 0.0),
+                "box": result.get("box", [])
+            })
+        return resolved_results
+
+
+    @classmethod
+    async def send_message_to_device(cls, device_id: str, message: str) -> bool:
+        """False when the device has no websocket on this worker, nothing is sent."""
         if(device_id in cls.active_devices):
             websocket_connection: WebSocket = cls.active_devices.get(device_id).get("websocket")
             await websocket_connection.send_json(message)
+            return True
         else:
             print(f"Websocket connection doen't exist for device_id: {device_id}")  
+            return False
 
 
     @classmethod
-    async def send_message_to_frontend(cls, user_id: str, message_type: str, message):
-        if(user_id in cls.active_frontends):
-            if message_type == "text":
-                websocket_connection: WebSocket = cls.active_frontends[user_id]
-                await websocket_connection.send_json(message)
-            elif message_type == "byte":
-                websocket_connection: WebSocket = cls.active_frontends[user_id]
-                await websocket_connection.send_bytes(message)
-        else:
-            print(f"Websocket connection doen't exist for user_id: {user_id}")  
+    async def send_message_to_frontend(cls, user_id: str, message_type: str, message, device_id: str | None = None, kind: str | None = None):
+        """
+            Serialize the message once and fan it out to every session of the user, including sessions on other workers.
+            Message with device_id and kind is a device stream, only delivered to sessions subscribed to it.
+        """
+        if not cls.has_frontend(user_id=user_id):
+            print(f"Websocket connection doen't exist for user_id: {user_id}")
+            return
+
+        payload = json.dumps(message) if message_type == "text" else message
+        cls.deliver_to_sessions(user_id=user_id, message_type=message_type, payload=payload, device_id=device_id, kind=kind)
+
+        for worker_id in cls.remote_frontend_workers(user_id=user_id, device_id=device_id, kind=kind):
+            routed_message = {
+                "type": "FRONTEND_MESSAGE",
+                "user_id": user_id,
+                "device_id": device_id,
+                "kind": kind,
+                "message_type": message_type,
+                "message": base64.b64encode(payload).decode("utf-8") if message_type == "byte" else payload
+            }
+            await cls.presence.publish(worker_id=worker_id, message=routed_message)
+
+
+    @classmethod
+    def deliver_to_sessions(cls, user_id: str, message_type: str, payload, device_id: str | None = None, kind: str | None = None):
+        for session in cls.active_frontends.get(user_id, {}).values():
+            if session.is_subscribed(device_id=device_id, kind=kind):
+                session.enqueue(message_type=message_type, payload=payload)
 
     
+    @classmethod
+    async def send_frame_to_frontend(cls, user_id: str, device_id: str, image_bytes: bytes, metadata: Optional[Dict] = None):
+        """Put the frame (and its metadata) into the viewer mailbox, a newer frame replaces the one not yet sent."""
+        if not cls.is_subscribed(user_id=user_id, device_id=device_id, kind="frames"):
+            return
+
+        messages = []
+        if metadata:
+            messages.append(("text", json.dumps(metadata)))
+
+        if ConfigManage.FRONTEND_IMAGE_TRANSPORT == "binary":
+            sequence = cls.next_frame_sequence(device_id=device_id)
+            frame = FrameCodec.encode(device_id=device_id, sequence=sequence, content_type=FrameContentType.JPEG, payload=image_bytes)
+            messages.append(("byte", frame))
+        else:
+            encoded_image = base64.b64encode(image_bytes).decode("utf-8")
+            sending_message = {
+                "action": "INFERENCE_RESULT",
+                "device_id": device_id,
+                "image_data": encoded_image
+            }
+            messages.append(("text", json.dumps(sending_message)))
+
+        cls.deliver_frame_to_sessions(user_id=user_id, device_id=device_id, messages=messages)
+
+        # Sessions on other workers, one mailbox per worker, that worker fans out to its own sessions.
+        for worker_id in cls.remote_frontend_workers(user_id=user_id, device_id=device_id, kind="frames"):
+            async def publish_callback(message_type, message, worker_id=worker_id):
+                routed_message = {
+                    "type": "FRONTEND_FRAME",
+                    "user_id": user_id,
+                    "device_id": device_id,
+                    "messages": message
+                }
+                await cls.presence.publish(worker_id=worker_id, message=routed_message)
+            routed_messages = [(item_type, base64.b64encode(payload).decode("utf-8") if item_type == "byte" else payload) for item_type, payload in messages]
+            cls.put_frame_mailbox(device_id=device_id, viewer_id=worker_id, messages=[("routed", routed_messages)], send_callback=publish_callback)
+
+
+    @classmethod
+    def deliver_frame_to_sessions(cls, user_id: str, device_id: str, messages: list):
+        for session in cls.active_frontends.get(user_id, {}).values():
+            if not session.is_subscribed(device_id=device_id, kind="frames"):
+                continue
+            cls.put_frame_mailbox(device_id=device_id, viewer_id=session.session_id, messages=messages, send_callback=session.send)
+
+
+    @classmethod
+    def put_frame_mailbox(cls, device_id: str, viewer_id: str, messages: list, send_callback):
+        mailbox_key = (device_id, viewer_id)
+        if mailbox_key not in cls.frame_mailboxes:
+            cls.frame_mailboxes[mailbox_key] = FrameMailbox(device_id=device_id, viewer_id=viewer_id, send_callback=send_callback)
+        cls.frame_mailboxes[mailbox_key].put(messages)
+
+
+    @classmethod
+    def close_frame_mailboxes(cls, device_id: str | None = None, viewer_id: str | None = None):
+        for mailbox_key in list(cls.frame_mailboxes.keys()):
+            if (device_id and mailbox_key[0] == device_id) or (viewer_id and mailbox_key[1] == viewer_id):
+                cls.frame_mailboxes.pop(mailbox_key).close()
+
+
+    @classmethod
+    def get_frame_stats(cls, user_id: str):
+        session_ids = cls.active_frontends.get(user_id, {}).keys()
+        return [{ **mailbox.stats(), "session_id": viewer_id } for (_, viewer_id), mailbox in cls.frame_mailboxes.items() if viewer_id in session_ids]
+
+
+    @classmethod
+    def get_inbound_frame_stats(cls, user_id: str):
+        return [
+            { "device_id": device_id, **device["frame_pairer"].stats() }
+            for device_id, device in cls.active_devices.items() if device["user_id"] == user_id and "frame_pairer" in device
+        ]
+
+
+    @classmethod
+    def get_inbox_stats(cls, user_id: str):
+        return [
+            { "device_id": device_id, **device["inbox"].stats() }
+            for device_id, device in cls.active_devices.items() if device["user_id"] == user_id and "inbox" in device
+        ]
+
+
+    @classmethod
+    def get_session_stats(cls, user_id: str):
+        return [session.stats() for session in cls.active_frontends.get(user_id, {}).values()]
+
+
+    @classmethod
+    def next_frame_sequence(cls, device_id: str):
+        device = cls.active_devices.get(device_id)
+        if device is None:
+            return 0
+        device["frame_seq"] = device.get("frame_seq", -1) + 1
+        return device["frame_seq"]
+
+
     @classmethod
     async def send_init_to_device(cls, device_id: str, init_params: Optional[Dict] = None):
         print("params: ", init_params)
@@ -125,7 +594,25 @@ class ConnectionManager:
 
 
     @classmethod
-    async def send_task_to_device(cls, user_id: str, device_id: str, task: str, task_params: Optional[Dict] = None):
+    async def send_task_to_device(cls, user_id: str, device_id: str, task: str, task_params: Optional[Dict] = None, task_context: Optional[Dict] = None) -> bool:
+        """False when the device is connected nowhere, True once sent or routed to the worker owning its websocket."""
+        if(device_id not in cls.active_devices):
+            device_presence = cls.presence.get("device", device_id)
+            if device_presence is None:
+                print(f"Websocket connection doen't exist for device_id: {device_id}")
+                return False
+
+            routed_message = {
+                "type": "SEND_TASK",
+                "user_id": user_id,
+                "device_id": device_id,
+                "task": task,
+                "task_params": task_params,
+                "task_context": task_context
+            }
+            await cls.presence.publish(worker_id=device_presence["worker_id"], message=routed_message)
+            return True
+
         task_id = str(uuid4())
         message = {
             "task_id": task_id,
@@ -133,13 +620,13 @@ class ConnectionManager:
             **(task_params if task_params else {})
         }
 
-        cls.active_devices[device_id]["tasks"][task_id] = {
-            "name": task,
-            "status": TaskStatus.PENDING_ACK,
-            "params": task_params
-        }
+        # Only actions with RECEIVED / COMPLETED acks are tracked, INFERENCE / RESET are fire-and-forget and must
+        # neither keep the device busy nor wait for an ack which never comes.
+        if task in cls.task_actions:
+            cls.tasks.add(task_id=task_id, device_id=device_id, user_id=user_id, name=task, params=task_params, context={ **(task_context or {}), "message": message })
+            cls.sync_device_presence(device_id=device_id)
 
-        await cls.send_message_to_device(device_id, message)
+        return await cls.send_message_to_device(device_id, message)
 
     
     @classmethod
@@ -148,15 +635,54 @@ class ConnectionManager:
             "action": task,
             **kwargs
         }
-        await cls.send_message_to_frontend(user_id, type, message)
+        await cls.send_message_to_frontend(user_id, type, message, device_id=kwargs.get("device_id", None), kind=FRONTEND_STREAM_KINDS.get(task, None))
 
 
     @classmethod
     def get_device_task(cls, device_id, task_id):
-        if device_id in cls.active_devices:
-            return cls.active_devices[device_id]["tasks"][task_id]
-        else:
-            return None
+        return cls.tasks.get_device_task(device_id=device_id, task_id=task_id)
+
+
+    @classmethod
+    async def handle_task_timeout(cls, task: dict, stage: str):
+        """Task not acknowledged in time is resent by its retry policy, otherwise it is marked failed and the device released."""
+        device_id = task["device_id"]
+        policy = cls.retry_policies.get(task["name"], cls.retry_policies["default"])
+        # Only actions with an ack protocol are resent, see register_task_action.
+        retryable = task["name"] in cls.task_actions
+        if stage == "ack" and retryable and policy.can_retry(task["attempts"]) and device_id in cls.active_devices:
+            delay = policy.delay(ack_timeout=cls.tasks.ack_timeout, attempt=task["attempts"] + 1)
+            cls.tasks.retry(task_id=task["task_id"], delay=delay)
+            cls.sync_device_presence(device_id=device_id)
+            print(f"{task['user_id']}:{device_id} - Resend {task['name']} task: {task['task_id']}, attempt: {task['attempts']}/{policy.max_attempts}, ack timeout: {delay:.1f}s.")
+            await cls.send_message_to_device(device_id, task["context"]["message"])
+            return
+
+        if device_id not in cls.active_devices and not cls.presence.is_local(cls.presence.get("resume", device_id)):
+            # The parked session was resumed on other worker, which owns the task now.
+            cls.tasks.remove(task_id=task["task_id"])
+            return
+
+        print(f"{task['user_id']}:{device_id} - {task['name']} task: {task['task_id']} timed out waiting for {stage}.")
+        if cls.set_device_connection_state(device_id=device_id, task_id=task["task_id"], connection_state="connected", task_status=TaskStatus.FAILED) is None:
+            # Device is parked in its resume grace window, the task must not be resent on resume nor keep it busy.
+            cls.tasks.update_status(task_id=task["task_id"], status=TaskStatus.FAILED)
+            cls.refresh_parked_session(device_id=device_id)
+        if cls.on_task_failed:
+            await cls.on_task_failed(task, "TIMEOUT")
+        await cls.active_frontend_task(user_id=task["user_id"], task=task["name"], type="text", device_id=device_id, status="ERROR", reason="TIMEOUT")
+
+
+    @classmethod
+    def get_task_stats(cls, user_id: str):
+        device_ids = { task["device_id"] for task in cls.tasks.tasks.values() if task["user_id"] == user_id }
+        return {
+            "in_flight": { device_id: cls.tasks.in_flight_count(device_id=device_id) for device_id in device_ids },
+            "tasks": [
+                { key: task[key] for key in ("task_id", "device_id", "name", "status", "attempts", "created_time", "updated_time") }
+                for task in cls.tasks.tasks.values() if task["user_id"] == user_id
+            ]
+        }
 
 
     @classmethod
@@ -172,241 +698,292 @@ class ConnectionManager:
 
 
     @classmethod
-    async def listen_device_message(cls, text_queue: asyncio.Queue, binary_queue: asyncio.Queue, db: AsyncSession, user_id:str, device_id: str, device_update_callback):
+    def register_handler(cls, action: str, handler, status: str | None = None):
+        """
+            Register `async handler(context: DeviceMessageContext, data: dict)` for device messages of the action.
+            Handler registered with status None handles every status without its own handler.
+        """
+        cls.handlers[(action, status)] = handler
+
+
+    @classmethod
+    def register_task_action(cls, action: str, on_completed=None):
+        """
+            Register the RECEIVED / COMPLETED / ERROR handlers of a task action sharing the task transition logic.
+            `async on_completed(context, task_info) -> dict` runs after the database update, returned fields are added
+            to the COMPLETED message sent to frontend.
+        """
+        cls.task_actions.add(action)
+        cls.register_handler(action=action, status="RECEIVED", handler=cls.handle_task_received)
+        cls.register_handler(action=action, status="COMPLETED", handler=lambda context, data: cls.handle_task_completed(context=context, data=data, on_completed=on_completed))
+        cls.register_handler(action=action, status="ERROR", handler=cls.handle_task_error)
+
+
+    @classmethod
+    def record_handler_timing(cls, action: str, status: str | None, elapsed: float):
+        """Default timing hook, replace `ConnectionManager.handler_timing_hook` to export it elsewhere."""
+        stats = cls.handler_stats.setdefault(f"{action}:{status}", { "count": 0, "total_ms": 0.0, "max_ms": 0.0 })
+        elapsed_ms = elapsed * 1000
+        stats["count"] += 1
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+
+
+    @classmethod
+    def get_handler_stats(cls):
+        return {
+            key: { **stats, "avg_ms": stats["total_ms"] / stats["count"] if stats["count"] else 0.0 }
+            for key, stats in cls.handler_stats.items()
+        }
+
+
+    @classmethod
+    async def handle_task_received(cls, context: DeviceMessageContext, data: dict):
+        cls.set_device_connection_state(device_id=context.device_id, task_id=data["task_id"], connection_state="busy", task_status=TaskStatus.ACKNOWLEDGED)
+        await cls.active_frontend_task(user_id=context.user_id, task=data["action"], type="text", device_id=context.device_id, status="RECEIVED")
+
+
+    @classmethod
+    async def handle_task_completed(cls, context: DeviceMessageContext, data: dict, on_completed=None):
+        cls.set_device_connection_state(device_id=context.device_id, task_id=data["task_id"], connection_state="connected", task_status=TaskStatus.COMPLETED)
+        task_info = cls.get_device_task(device_id=context.device_id, task_id=data["task_id"])
+        if task_info is None:
+            print(f"{context.log_id} - task info of {data['task_id']} is None")
+            return
+
+        await context.device_update_callback(context.user_id, context.device_id, task_info)
+        extra_fields = await on_completed(context, task_info) if on_completed else {}
+        await cls.active_frontend_task(user_id=context.user_id, task=data["action"], type="text", device_id=context.device_id, status="COMPLETED", **(extra_fields or {}))
+
+
+    @classmethod
+    async def handle_task_error(cls, context: DeviceMessageContext, data: dict):
+        cls.set_device_connection_state(device_id=context.device_id, task_id=data["task_id"], connection_state="connected", task_status=TaskStatus.FAILED)
+        task_info = cls.get_device_task(device_id=context.device_id, task_id=data["task_id"])
+        if task_info and cls.on_task_failed:
+            await cls.on_task_failed(task_info, "ERROR")
+        await cls.active_frontend_task(user_id=context.user_id, task=data["action"], type="text", device_id=context.device_id, status="ERROR")
+
+
+    @classmethod
+    async def handle_init_completed(cls, context: DeviceMessageContext, data: dict):
+        cls.set_device_connection_state(device_id=context.device_id, connection_state="connected", task_id=None, task_status=None)
+        await cls.active_frontend_task(user_id=context.user_id, task="CONNECTED", type="text", device_id=context.device_id)
+        if context.device_connected_callback:
+            async with context.session_maker() as db:
+                await context.device_connected_callback(db, context.user_id, context.device_id)
+        await cls.issue_resume_token(device_id=context.device_id)
+
+
+    @classmethod
+    async def handle_log(cls, context: DeviceMessageContext, data: dict):
+        message = data.get("message", None)
+        level = data.get("level", None)
+        if message and level:
+            LogManager.append(user_id=context.user_id, device_id=context.device_id, level=level, message=message)
+        else:
+            print("message or level is None")
+
+
+    @classmethod
+    async def send_log_batch(cls, user_id: str, device_id: str, lines: list):
+        await cls.active_frontend_task(user_id=user_id, task="LOG_BATCH", type="text", device_id=device_id, logs=lines)
+
+
+    @classmethod
+    async def handle_inference_result(cls, context: DeviceMessageContext, data: dict):
+        image_bytes = context.frames.put_metadata(data)
+        if image_bytes is not None:
+            await cls.process_inference_result(context=context, data=data, image_bytes=image_bytes)
+
+
+    @classmethod
+    async def handle_inference_frame(cls, context: DeviceMessageContext, frame: bytes):
+        paired = context.frames.put_frame(frame)
+        if paired is not None:
+            await cls.process_inference_result(context=context, data=paired[0], image_bytes=paired[1])
+
+
+    @classmethod
+    async def process_inference_result(cls, context: DeviceMessageContext, data: dict, image_bytes: bytes):
+        user_id = context.user_id
+        device_id = context.device_id
+
+        # Nobody watches this device, skip the image processing entirely.
+        if not cls.is_subscribed(user_id=user_id, device_id=device_id, kind="frames"):
+            return
+
+        content = data.get("content", None)
+        if content is None or "inference_results" not in content:
+            await cls.send_frame_to_frontend(user_id=user_id, device_id=device_id, image_bytes=image_bytes)
+            return
+
+        inference_results = content.get("inference_results")
+        if not isinstance(inference_results, list):
+            print(f"{device_id} Error: inference_results is not a list.")
+            return
+
+        if ConfigManage.ANNOTATION_MODE == "client":
+            # Pass the device JPEG through untouched, frontend overlays the boxes itself.
+            sending_metadata = {
+                "action": "INFERENCE_METADATA",
+                "device_id": device_id,
+                "inference_results": cls.resolve_inference_labels(device_id=device_id, inference_results=inference_results)
+            }
+            await cls.send_frame_to_frontend(user_id=user_id, device_id=device_id, image_bytes=image_bytes, metadata=sending_metadata)
+            return
+
+        image_bytes_with_boxes = await AnnotationManager.annotate(device_id=device_id, image_bytes=image_bytes, inference_results=inference_results)
+        if image_bytes_with_boxes is None:
+            return
+        await cls.send_frame_to_frontend(user_id=user_id, device_id=device_id, image_bytes=image_bytes_with_boxes)
+
+
+    @classmethod
+    async def on_mode_switch_completed(cls, context: DeviceMessageContext, task_info: dict):
+        await cls.update_device_session(device_id=context.device_id, mode=task_info["params"]["mode"])
+        return { "mode": task_info["params"]["mode"] }
+
+
+    @classmethod
+    async def on_ota_completed(cls, context: DeviceMessageContext, task_info: dict):
+        return { "firmware_name": task_info["params"]["firmware_name"] }
+
+
+    @classmethod
+    async def on_model_switch_completed(cls, context: DeviceMessageContext, task_info: dict):
+        cls.set_device_labels(device_id=context.device_id, labels=task_info["context"].get("labels"))
+        await cls.update_device_session(device_id=context.device_id, model_id=task_info["params"]["model_id"])
+        return { "model_name": task_info["params"]["model_name"] }
+
+
+    @classmethod
+    def register_default_handlers(cls):
+        cls.register_handler(action="INIT", status="COMPLETED", handler=cls.handle_init_completed)
+        cls.register_handler(action="LOG", handler=cls.handle_log)
+        cls.register_handler(action="INFERENCE_RESULT", handler=cls.handle_inference_result)
+        cls.register_task_action(action="MODE_SWITCH", on_completed=cls.on_mode_switch_completed)
+        cls.register_task_action(action="OTA", on_completed=cls.on_ota_completed)
+        cls.register_task_action(action="MODEL_DOWNLOAD")
+        cls.register_task_action(action="MODEL_SWITCH", on_completed=cls.on_model_switch_completed)
+
+
+    @classmethod
+    async def reap_stale_devices(cls):
+        """
+            Advance the heartbeat wheel every tick. A due entry whose device was heard from in time is scheduled again
+            at its new deadline, otherwise the websocket is closed and the device disconnected.
+            Only devices which sent at least one HEARTBEAT are reaped, firmware without heartbeat support is kept.
+            Entries are (device_id, inbox), an entry of a replaced connection is dropped.
+        """
+        timeout = ConfigManage.HEARTBEAT_INTERVAL * ConfigManage.HEARTBEAT_MISSED_LIMIT
+        while True:
+            try:
+                await asyncio.sleep(cls.heartbeat_wheel.tick)
+                now = time.monotonic()
+                for device_id, inbox in cls.heartbeat_wheel.advance():
+                    device = cls.active_devices.get(device_id)
+                    if device is None or device.get("inbox") is not inbox:
+                        continue
+                    if inbox.heartbeats == 0:
+                        cls.heartbeat_wheel.schedule((device_id, inbox), timeout)
+                        continue
+                    deadline = inbox.last_seen + timeout
+                    if deadline > now:
+                        cls.heartbeat_wheel.schedule((device_id, inbox), deadline - now)
+                        continue
+                    asyncio.create_task(cls.reap_device(device_id=device_id, device=device, idle=now - inbox.last_seen))
+
+            except asyncio.CancelledError:
+                break
+
+            except Exception:
+                print(traceback.format_exc())
+
+
+    @classmethod
+    async def reap_device(cls, device_id: str, device: dict, idle: float):
+        print(f"Device missed heartbeats for {idle:.1f}s, disconnect device_id: {device_id}")
+        websocket = device["websocket"]
+        await cls.disconnect_device(user_id=device["user_id"], device_id=device_id, websocket=websocket)
+        try:
+            await asyncio.wait_for(websocket.close(code=4408, reason="heartbeat timeout"), timeout=ConfigManage.HEARTBEAT_INTERVAL)
+        except Exception as e:
+            print(f"Close stale device websocket failed, device_id: {device_id}, {e}")
+
+
+    @classmethod
+    async def listen_device_message(cls, inbox: DeviceInbox, session_maker: Callable[[], AsyncSession], user_id:str, device_id: str, device_update_callback, device_connected_callback=None):
+        """
+            Consume the device inbox with two coroutines: control and telemetry lanes (control first) and media lane,
+            binary frames are paired with their INFERENCE_RESULT message by sequence, see FramePairer.
+        """
+        context = DeviceMessageContext(
+            session_maker=session_maker,
+            user_id=user_id,
+            device_id=device_id,
+            device_update_callback=device_update_callback,
+            device_connected_callback=device_connected_callback
+        )
+        if device_id in cls.active_devices:
+            cls.active_devices[device_id]["frame_pairer"] = context.frames
+            cls.active_devices[device_id]["inbox"] = inbox
+            if cls.heartbeat_task:
+                cls.heartbeat_wheel.schedule((device_id, inbox), ConfigManage.HEARTBEAT_INTERVAL * ConfigManage.HEARTBEAT_MISSED_LIMIT)
+
+        await asyncio.gather(
+            cls.consume_device_lanes(inbox=inbox, context=context, lanes=("control", "telemetry")),
+            cls.consume_device_lanes(inbox=inbox, context=context, lanes=("media",))
+        )
+
+
+    @classmethod
+    async def consume_device_lanes(cls, inbox: DeviceInbox, context: DeviceMessageContext, lanes: tuple):
         while True:
             try:
-                text_mes = await text_queue.get()
+                message = await inbox.get(lanes=lanes)
                 
-                if text_mes is None:
+                if message is None:
                     break
-                    
-                data: dict = json.loads(text_mes)
-                action = data.get("action", None)
-                task_id = data.get("task_id", None)
-                status = data.get("status", None)
-
-                if(action is None):
-                    print("Error: The message doen't contain action")
-                    continue
-
-                if((action != "INFERENCE_RESULT" and action != "LOG" and action != "INIT") and task_id is None):
-                    print("Error: The message doesn't contain task_id")
-                    continue
-
-                if(action != "LOG" and status is None):
-                    print("Error: The message doesn't contain status")
-                    continue
-        
-                match action:
-
-                    case "INIT":
-                        log_id = f"{user_id}:{device_id}"
-                        print(f"{log_id} - Received INIT task.")
-
-                        if status == "COMPLETED":
-                            print(f"{log_id} - status *COMPLETED*")
-                            cls.set_device_connection_state(device_id=device_id, connection_state="connected", task_id=None, task_status=None)
-                            await cls.active_frontend_task(user_id=user_id, task="CONNECTED", type="text", device_id=device_id)
-
-                    case "LOG":
-                        log_id = f"{user_id}:{device_id}"
-                        print(f"{log_id} - Received LOG task.")
-                        message = data.get("message", None)
-                        level = data.get("level", None)
-                        if message and level:
-                            await cls.active_frontend_task(user_id=user_id, task="LOG", type="text", device_id=device_id, level=level, message=message)
-                        else:
-                            print("message or level is None")
-       
-                    case "MODE_SWITCH":
-                        log_id = f"{user_id}:{device_id}"
-                        print(f"{log_id} - Received MODE_SWITCH task.")
-
-                        if status == "RECEIVED":
-                            print(f"{log_id} - status *RECEIVED*")
-                            cls.set_device_connection_state(device_id=device_id, task_id=task_id, connection_state="busy", task_status=TaskStatus.ACKNOWLEDGED)
-                            cls.device_info(device_id=device_id)
-                            await cls.active_frontend_task(user_id=user_id, task="MODE_SWITCH", type="text", device_id=device_id, status="RECEIVED")
-
-                        elif status == "COMPLETED":
-                            print(f"{log_id} - status *COMPLETED*")
-                            cls.set_device_connection_state(device_id=device_id, task_id=task_id, connection_state="connected", task_status=TaskStatus.COMPLETED)
-                            cls.device_info(device_id=device_id)
-                            task_info = cls.get_device_task(device_id=device_id, task_id=task_id)
-                            if task_info:
-                                await device_update_callback(db, user_id, device_id, task_info)
-                                await cls.active_frontend_task(user_id=user_id, task="MODE_SWITCH", type="text", device_id=device_id, status="COMPLETED", mode=task_info["params"]["mode"])
-                            else:
-                                print("task info is None")
-
-                        elif status == "ERROR":
-                            print(f"{log_id} - status *ERROR*")
-                            cls.set_device_connection_state(device_id=device_id, task_id=task_id, connection_state="connected", task_status=TaskStatus.FAILED)
-                            cls.device_info(device_id=device_id)
-                            await cls.active_frontend_task(user_id=user_id, task="MODE_SWITCH", type="text", device_id=device_id, status="ERROR")
-
-                    case "OTA":
-                        log_id = f"{user_id}:{device_id}"
-                        print(f"{log_id} - Received OTA task.")
-
-                        if status == "RECEIVED":
-                            print(f"{log_id} - status *RECEIVED*")
-                            cls.set_device_connection_state(device_id=device_id, task_id=task_id, connection_state="busy", task_status=TaskStatus.ACKNOWLEDGED)
-                            cls.device_info(device_id=device_id)
-                            await cls.active_frontend_task(user_id=user_id, task="OTA", type="text", device_id=device_id, status="RECEIVED")
-
-                        elif status == "COMPLETED":
-                            print(f"{log_id} - status *COMPLETED*")
-                            cls.set_device_connection_state(device_id=device_id, task_id=task_id, connection_state="connected", task_status=TaskStatus.COMPLETED)
-                            cls.device_info(device_id=device_id)
-                            task_info = cls.get_device_task(device_id=device_id, task_id=task_id)
-                            if task_info:
-                                await device_update_callback(db, user_id, device_id, task_info)
-                                await cls.active_frontend_task(user_id=user_id, task="OTA", type="text", device_id=device_id, status="COMPLETED", firmware_name=task_info["params"]["firmware_name"])
-
-                        elif status == "ERROR":
-                            print(f"{log_id} - status *ERROR*")
-                            cls.set_device_connection_state(device_id=device_id, task_id=task_id, connection_state="connected", task_status=TaskStatus.FAILED)
-                            cls.device_info(device_id=device_id)
-                            await cls.active_frontend_task(user_id=user_id, task="OTA", type="text", device_id=device_id, status="ERROR")
-
-                    case "MODEL_DOWNLOAD":
-                        log_id = f"{user_id}:{device_id}"
-                        print(f"{log_id} - Received MODEL_DOWNLOAD task.")
-
-                        if status == "RECEIVED":
-                            print(f"{log_id} - status *RECEIVED*")
-                            cls.set_device_connection_state(device_id=device_id, task_id=task_id, connection_state="busy", task_status=TaskStatus.ACKNOWLEDGED)
-                            cls.device_info(device_id=device_id)
-                            await cls.active_frontend_task(user_id=user_id, task="MODEL_DOWNLOAD", type="text", device_id=device_id, status="RECEIVED")
-
-                        elif status == "COMPLETED":
-                            print(f"{log_id} - status *COMPLETED*")
-                            cls.set_device_connection_state(device_id=device_id, task_id=task_id, connection_state="connected", task_status=TaskStatus.COMPLETED)
-                            cls.device_info(device_id=device_id)
-                            task_info = cls.get_device_task(device_id=device_id, task_id=task_id)
-                            if task_info:
-                                await device_update_callback(db, user_id, device_id, task_info)
-                                await cls.active_frontend_task(user_id=user_id, task="MODEL_DOWNLOAD", type="text", device_id=device_id, status="COMPLETED")
-
-
-                        elif status == "ERROR":
-                            print(f"{log_id} - status *ERROR*")
-                            cls.set_device_connection_state(device_id=device_id, task_id=task_id, connection_state="connected", task_status=TaskStatus.FAILED)
-                            cls.device_info(device_id=device_id)
-                            await cls.active_frontend_task(user_id=user_id, task="MODEL_DOWNLOAD", type="text", device_id=device_id, status="ERROR")
-
-                    case "MODEL_SWITCH":
-                        log_id = f"{user_id}:{device_id}"
-                        print(f"{log_id} - Received MODEL_SWITCH task.")
-
-                        if status == "RECEIVED":
-                            print(f"{log_id} - status *RECEIVED*")
-                            cls.set_device_connection_state(device_id=device_id, task_id=task_id, connection_state="busy", task_status=TaskStatus.ACKNOWLEDGED)
-                            cls.device_info(device_id=device_id)
-                            await cls.active_frontend_task(user_id=user_id, task="MODEL_SWITCH", type="text", device_id=device_id, status="RECEIVED")
-
-                        elif status == "COMPLETED":
-                            print(f"{log_id} - status *COMPLETED*")
-                            cls.set_device_connection_state(device_id=device_id, task_id=task_id, connection_state="connected", task_status=TaskStatus.COMPLETED)
-                            cls.device_info(device_id=device_id)
-                            task_info = cls.get_device_task(device_id=device_id, task_id=task_id)
-                            if task_info:
-                                await device_update_callback(db, user_id, device_id, task_info)
-                                await cls.active_frontend_task(user_id=user_id, task="MODEL_SWITCH", type="text", device_id=device_id, status="COMPLETED", model_name=task_info["params"]["model_name"])
-
-                        elif status == "ERROR":
-                            print(f"{log_id} - status *ERROR*")
-                            cls.set_device_connection_state(device_id=device_id, task_id=task_id, connection_state="connected", task_status=TaskStatus.FAILED)
-                            cls.device_info(device_id=device_id)
-                            await cls.active_frontend_task(user_id=user_id, task="MODEL_SWITCH", type="text", device_id=device_id, status="ERROR")
-
-                    case "INFERENCE_RESULT":
-                        binary_mes = await binary_queue.get()
-                        
-                        if binary_mes is None:
-                            print(f"Server received wrong inference serial from {device_id}")
-                            continue
-
-                        content = data.get("content", None)
-                        if content is None or "inference_results" not in content:
-                            print("INFERENCE_RESULT:", device_id)
-                            encoded_image = base64.b64encode(binary_mes).decode("utf-8")
-                            sending_message = {
-                                "action": "INFERENCE_RESULT",
-                                "device_id": device_id,
-                                "image_data": encoded_image
-                            }
-
-                            await cls.send_message_to_frontend(user_id=user_id, message_type="text", message=sending_message)
-
-                        elif content and "inference_results" in content:
-                    
-                            inference_results = content.get("inference_results")
-                            if not isinstance(inference_results, list):
-                                print(f"{device_id} Error: inference_results is not a list.")
-                            
-                            print("inference_results: ", inference_results)
-                            
-                            print(f"{device_id} Processing image...")
-                            image_stream = io.BytesIO(binary_mes)
-                            image = Image.open(image_stream)
-                            if image.mode != "RGB":
-                                image = image.convert("RGB")
-
-                            draw = ImageDraw.Draw(image)
-                            font = ImageFont.load_default()
-
-                            for result in inference_results:
-                                category = result.get('category', 'N/A')
-                                score = result.get('score', 0.0)
-                                box = result.get('box', [])
-
-                                print(f"Inference result category: {category}, score: {score}")
-                            
-                                if len(box) == 4:
-                                    left_up_x, left_up_y, right_down_x, right_down_y = map(int, box)
-                                
-                                    # 1. 繪製原始辨識框
-                                    draw.rectangle(
-                                        [(left_up_x, left_up_y), (right_down_x, right_down_y)],
-                                        outline="red",
-                                        width=2
-                                    )
-                                    
-                                    # 2. 顯示的文字
-                                    text = f"Category: {category}, Score: {score:.1%}"
-                                    
-                                    # 3. 在辨識框的左上角繪製文字
-                                    text_position = (left_up_x + 5, left_up_y + 5)
-                                    
-                                    # 為了讓文字更清晰，先畫一個小的背景矩形
-                                    text_bbox = draw.textbbox(text_position, text, font=font)
-                                    draw.rectangle(text_bbox, fill="red")
-                                    draw.text(text_position, text, fill="white", font=font)
-                                
-                                else:
-                                    print(f"[{device_id}] Warning: Invalid bounding box format: {box}")
-                                               
-                            output_stream = io.BytesIO()
-                            image.save(output_stream, format="JPEG")
-                            image_bytes_with_boxes = output_stream.getvalue()
-                            encoded_image = base64.b64encode(image_bytes_with_boxes).decode("utf-8")
-                            sending_message = {
-                                "action": "INFERENCE_RESULT",
-                                "device_id": device_id,
-                                "image_data": encoded_image
-                            }
-
-                            await cls.send_message_to_frontend(user_id=user_id, message_type="text", message=sending_message)
-
-            except json.JSONDecodeError:
-                print(traceback.format_exc())
-            
+
+                await cls.dispatch_device_message(context=context, message=message)
 
             except asyncio.CancelledError:
-                pass
-                
+                break
             
             except Exception:
-                print(traceback.format_exc())
\ No newline at end of file
+                print(traceback.format_exc())
+
+
+    @classmethod
+    async def dispatch_device_message(cls, context: DeviceMessageContext, message):
+        if isinstance(message, bytes):
+            start_time = time.perf_counter()
+            await cls.handle_inference_frame(context, message)
+            cls.handler_timing_hook("INFERENCE_FRAME", None, time.perf_counter() - start_time)
+            return
+
+        action = message.get("action", None)
+        status = message.get("status", None)
+
+        if(action is None):
+            print("Error: The message doen't contain action")
+            return
+
+        if(action in cls.task_actions and message.get("task_id", None) is None):
+            print("Error: The message doesn't contain task_id")
+            return
+
+        handler = cls.handlers.get((action, status)) or cls.handlers.get((action, None))
+        if handler is None:
+            if status is None:
+                print("Error: The message doesn't contain status")
+            return
+
+        start_time = time.perf_counter()
+        await handler(context, message)
+        cls.handler_timing_hook(action, status, time.perf_counter() - start_time)
+
+
+ConnectionManager.handler_timing_hook = ConnectionManager.record_handler_timing
+ConnectionManager.register_default_handlers()
@@ -29,4 +29,10 @@ class DatabaseError(BasedError):
 class UnknownError(BasedError):
     """When Undefined error occur, throw this error class"""
     def __init__(self, message: str = "Database operation failed", details: str = None):
-        super().__init__(message, details, code="UNKNOWN_ERROR", status_code=500)
\ No newline at end of file
+        super().__init__(message, details, code="UNKNOWN_ERROR", status_code=500)
+
+
+class FileTooLarge(BasedError):
+    """When uploaded file is larger than the size limit, throw this error class"""
+    def __init__(self, message: str = "Uploaded file is too large.", details: str = None):
+        super().__init__(message, details, code="FILE_TOO_LARGE", status_code=413)
@@ -0,0 +1,206 @@
+import time
+import struct
+import asyncio
+import traceback
+from collections import OrderedDict, deque
+
+
+class FrameContentType:
+    JPEG = 1
+
+
+class FrameCodec:
+    """
+        Binary frame sent to frontend with `send_bytes`, and by devices for INFERENCE_RESULT images,
+        all integers are big-endian.
+
+        | version (1B) | content type (1B) | sequence (4B) | device_id length (2B) | device_id (utf-8) | payload |
+    """
+
+    VERSION = 1
+    HEADER = struct.Struct(">BBIH")
+
+
+    @classmethod
+    def encode(cls, device_id: str, sequence: int, content_type: int, payload: bytes) -> bytes:
+        encoded_device_id = device_id.encode("utf-8")
+        header = cls.HEADER.pack(cls.VERSION, content_type, sequence & 0xFFFFFFFF, len(encoded_device_id))
+        return b"".join((header, encoded_device_id, payload))
+
+
+    @classmethod
+    def decode(cls, frame: bytes):
+        version, content_type, sequence, device_id_length = cls.HEADER.unpack_from(frame)
+        if version != cls.VERSION:
+            raise ValueError(f"Unsupported frame version: {version}")
+        offset = cls.HEADER.size
+        device_id = bytes(frame[offset:offset + device_id_length]).decode("utf-8")
+        return device_id, sequence, content_type, frame[offset + device_id_length:]
+
+
+class FrameMailbox:
+    """
+        One-slot mailbox for a (device, viewer) pair, only the newest frame is kept.
+        A dedicated writer task drains the slot, so a slow viewer never blocks the device listener.
+    """
+
+    def __init__(self, device_id: str, viewer_id: str, send_callback):
+        self.device_id = device_id
+        self.viewer_id = viewer_id
+        self.send_callback = send_callback
+        self.pending = None
+        self.delivered = 0
+        self.dropped = 0
+        self.has_frame = asyncio.Event()
+        self.writer = asyncio.create_task(self.run())
+
+
+    def put(self, messages: list):
+        """messages is a list of (message_type, message) sent in order as one frame."""
+        if self.pending is not None:
+            self.dropped += 1
+        self.pending = messages
+        self.has_frame.set()
+
+
+    async def run(self):
+        while True:
+            await self.has_frame.wait()
+            self.has_frame.clear()
+            messages, self.pending = self.pending, None
+            if messages is None:
+                continue
+
+            try:
+                for message_type, message in messages:
+                    await self.send_callback(message_type, message)
+                self.delivered += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.dropped += 1
+                print(f"[{self.viewer_id}:{self.device_id}] Send frame to frontend failed.")
+                print(traceback.format_exc())
+
+
+    def close(self):
+        if not self.writer.done():
+            self.writer.cancel()
+
+
+    def stats(self):
+        return {
+            "device_id": self.device_id,
+            "delivered": self.delivered,
+            "dropped": self.dropped
+        }
+
+
+class FramePairer:
+    """
+        Pairs INFERENCE_RESULT text messages of one device with their binary frames.
+
+        Device puts `seq` in the text message and the same sequence in the FrameCodec header of the binary frame,
+        they are matched exactly and whichever half arrives first waits in pending.
+        Legacy devices (no `seq`, raw image bytes) are paired in arrival order, whichever half comes first.
+        Pending halves older than `timeout` seconds, or beyond `max_pending`, are evicted and counted as orphaned,
+        so a lost half never shifts the following images.
+    """
+
+    def __init__(self, timeout: float, max_pending: int):
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self.metadata: "OrderedDict[int, tuple]" = OrderedDict()
+        self.frames: "OrderedDict[int, tuple]" = OrderedDict()
+        self.legacy_metadata: deque = deque()
+        self.legacy_frames: deque = deque()
+        self.paired = 0
+        self.legacy_paired = 0
+        self.orphaned_metadata = 0
+        self.orphaned_frames = 0
+
+
+    def put_metadata(self, data: dict) -> bytes | None:
+        """Returns the image of the message if its frame already arrived."""
+        self.evict()
+        sequence = data.get("seq", None)
+        if sequence is None:
+            if self.legacy_frames:
+                _, frame = self.legacy_frames.popleft()
+                self.legacy_paired += 1
+                return frame
+            self.legacy_metadata.append((time.monotonic(), data))
+            if len(self.legacy_metadata) > self.max_pending:
+                self.legacy_metadata.popleft()
+                self.orphaned_metadata += 1
+            return None
+
+        frame = self.frames.pop(sequence, None)
+        if frame:
+            self.paired += 1
+            return frame[1]
+
+        self.metadata[sequence] = (time.monotonic(), data)
+        if len(self.metadata) > self.max_pending:
+            self.metadata.popitem(last=False)
+            self.orphaned_metadata += 1
+        return None
+
+
+    def put_frame(self, frame: bytes) -> tuple[dict, bytes] | None:
+        """Returns (message, image) if the text message of the frame already arrived."""
+        self.evict()
+        if frame[:1] != bytes((FrameCodec.VERSION,)):
+            if not self.legacy_metadata:
+                self.legacy_frames.append((time.monotonic(), frame))
+                if len(self.legacy_frames) > self.max_pending:
+                    self.legacy_frames.popleft()
+                    self.orphaned_frames += 1
+                return None
+            _, data = self.legacy_metadata.popleft()
+            self.legacy_paired += 1
+            return data, frame
+
+        try:
+            _, sequence, _, payload = FrameCodec.decode(frame)
+        except (struct.error, ValueError, UnicodeDecodeError):
+            self.orphaned_frames += 1
+            return None
+
+        metadata = self.metadata.pop(sequence, None)
+        if metadata:
+            self.paired += 1
+            return metadata[1], payload
+
+        self.frames[sequence] = (time.monotonic(), payload)
+        if len(self.frames) > self.max_pending:
+            self.frames.popitem(last=False)
+            self.orphaned_frames += 1
+        return None
+
+
+    def evict(self):
+        deadline = time.monotonic() - self.timeout
+        for pending in (self.metadata, self.frames):
+            while pending and next(iter(pending.values()))[0] < deadline:
+                pending.popitem(last=False)
+                if pending is self.metadata:
+                    self.orphaned_metadata += 1
+                else:
+                    self.orphaned_frames += 1
+        while self.legacy_metadata and self.legacy_metadata[0][0] < deadline:
+            self.legacy_metadata.popleft()
+            self.orphaned_metadata += 1
+        while self.legacy_frames and self.legacy_frames[0][0] < deadline:
+            self.legacy_frames.popleft()
+            self.orphaned_frames += 1
+
+
+    def stats(self):
+        return {
+            "paired": self.paired,
+            "legacy_paired": self.legacy_paired,
+            "orphaned_metadata": self.orphaned_metadata,
+            "orphaned_frames": self.orphaned_frames,
+            "pending": len(self.metadata) + len(self.frames) + len(self.legacy_metadata) + len(self.legacy_frames)
+        }
@@ -0,0 +1,35 @@
+import math
+
+
+class TimerWheel:
+    """
+        Hashed timer wheel of `slots` buckets, one bucket per `tick` seconds.
+        Entries are not moved when the device is heard from, the reaper checks the real deadline when the bucket
+        is due and schedules the entry again if the device is still alive, so a heartbeat only costs a timestamp update.
+    """
+
+    def __init__(self, tick: float, slots: int):
+        self.tick = tick
+        self.buckets = [[] for _ in range(max(slots, 2))]
+        self.position = 0
+
+
+    @classmethod
+    def for_timeout(cls, tick: float, timeout: float):
+        return cls(tick=tick, slots=math.ceil(timeout / tick) + 2)
+
+
+    def schedule(self, entry, delay: float):
+        ticks = min(max(math.ceil(delay / self.tick), 1), len(self.buckets) - 1)
+        self.buckets[(self.position + ticks) % len(self.buckets)].append(entry)
+
+
+    def advance(self) -> list:
+        """Move one tick forward and return the entries of the bucket which is due."""
+        self.position = (self.position + 1) % len(self.buckets)
+        due, self.buckets[self.position] = self.buckets[self.position], []
+        return due
+
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self.buckets)
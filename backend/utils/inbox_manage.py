@@ -0,0 +1,183 @@
+import json
+import time
+import asyncio
+from collections import deque
+
+
+class InboxOverflow(Exception):
+    """Raised by a lane with `disconnect` overflow policy, the device websocket should be closed."""
+    pass
+
+
+class MessageLane:
+    """
+        Bounded FIFO of device messages of one priority, overflow policy when it is full:
+        - `block`: wait for room, the websocket receive loop stops reading so the device is back-pressured
+        - `drop-oldest`: evict the oldest message to make room
+        - `drop-newest`: reject the new message
+        - `disconnect`: raise InboxOverflow
+    """
+
+    OVERFLOW_POLICIES = ("block", "drop-oldest", "drop-newest", "disconnect")
+
+    def __init__(self, name: str, maxsize: int, overflow: str):
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy of {name} lane: {overflow}")
+        self.name = name
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.queue: deque = deque()
+        self.space = asyncio.Event()
+        self.space.set()
+        self.accepted = 0
+        self.dropped = 0
+        self.blocked = 0
+        self.high_water = 0
+        self.closed = False
+
+
+    async def put(self, message) -> bool:
+        if len(self.queue) >= self.maxsize:
+            if self.overflow == "block":
+                self.blocked += 1
+                while len(self.queue) >= self.maxsize and not self.closed:
+                    self.space.clear()
+                    await self.space.wait()
+            elif self.overflow == "disconnect":
+                self.dropped += 1
+                raise InboxOverflow(f"{self.name} lane is full ({self.maxsize} messages)")
+            elif self.overflow == "drop-newest":
+                self.dropped += 1
+                return False
+            else:
+                self.queue.popleft()
+                self.dropped += 1
+
+        self.queue.append(message)
+        self.accepted += 1
+        self.high_water = max(self.high_water, len(self.queue))
+        return True
+
+
+    def pop(self):
+        message = self.queue.popleft()
+        self.space.set()
+        return message
+
+
+    def close(self):
+        self.closed = True
+        self.space.set()
+
+
+    def stats(self):
+        return {
+            "depth": len(self.queue),
+            "capacity": self.maxsize,
+            "overflow": self.overflow,
+            "high_water": self.high_water,
+            "accepted": self.accepted,
+            "dropped": self.dropped,
+            "blocked": self.blocked
+        }
+
+
+class DeviceInbox:
+    """
+        Inbound messages of one device websocket split into prioritized lanes:
+        - control: INIT and task acks (MODE_SWITCH, OTA, MODEL_DOWNLOAD, MODEL_SWITCH...)
+        - telemetry: LOG
+        - media: INFERENCE_RESULT messages and binary image frames
+
+        Control and telemetry are consumed by one coroutine, control first, media by its own coroutine,
+        so task state transitions never wait behind image processing.
+        Every message refreshes `last_seen` for the heartbeat reaper, HEARTBEAT messages stop here.
+    """
+
+    LANES = ("control", "telemetry", "media")
+    TELEMETRY_ACTIONS = ("LOG",)
+    MEDIA_ACTIONS = ("INFERENCE_RESULT",)
+    HEARTBEAT_ACTION = "HEARTBEAT"
+
+
+    def __init__(self, device_id: str, lane_config: dict):
+        """lane_config: lane name -> (maxsize, overflow)"""
+        self.device_id = device_id
+        self.lanes = { name: MessageLane(name, *lane_config[name]) for name in self.LANES }
+        self.readiness = { name: asyncio.Event() for name in self.LANES }
+        self.invalid = 0
+        self.heartbeats = 0
+        self.last_seen = time.monotonic()
+        self.closed = False
+
+
+    def classify(self, message) -> str:
+        if isinstance(message, bytes):
+            return "media"
+        action = message.get("action", None)
+        if action in self.MEDIA_ACTIONS:
+            return "media"
+        if action in self.TELEMETRY_ACTIONS:
+            return "telemetry"
+        return "control"
+
+
+    async def put(self, raw_message):
+        """
+            raw_message is the text (json) or bytes received from websocket, text is parsed once here.
+            It waits while a `block` lane is full and raises InboxOverflow when a `disconnect` lane is full.
+        """
+        self.last_seen = time.monotonic()
+        if isinstance(raw_message, str):
+            try:
+                message = json.loads(raw_message)
+            except json.JSONDecodeError:
+                self.invalid += 1
+                print(f"[{self.device_id}] Invalid json message from device: {raw_message[:200]}")
+                return
+            if not isinstance(message, dict):
+                self.invalid += 1
+                return
+            if message.get("action") == self.HEARTBEAT_ACTION:
+                self.heartbeats += 1
+                return
+        else:
+            message = raw_message
+
+        lane = self.classify(message)
+        if await self.lanes[lane].put(message):
+            self.readiness[lane].set()
+
+
+    async def get(self, lanes: tuple):
+        """Next message of the first non-empty lane in `lanes` order, None once the inbox is closed."""
+        while not self.closed:
+            for name in lanes:
+                lane = self.lanes[name]
+                if lane.queue:
+                    return lane.pop()
+                self.readiness[name].clear()
+
+            waiters = [asyncio.ensure_future(self.readiness[name].wait()) for name in lanes]
+            try:
+                await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for waiter in waiters:
+                    waiter.cancel()
+        return None
+
+
+    def close(self):
+        self.closed = True
+        for name in self.LANES:
+            self.readiness[name].set()
+            self.lanes[name].close()
+
+
+    def stats(self):
+        return {
+            "invalid": self.invalid,
+            "heartbeats": self.heartbeats,
+            "idle_seconds": round(time.monotonic() - self.last_seen, 3),
+            "lanes": { name: lane.stats() for name, lane in self.lanes.items() }
+        }
@@ -0,0 +1,91 @@
+import time
+import asyncio
+import traceback
+from collections import deque
+from typing import Callable, Awaitable, Optional
+
+from utils.config_manage import ConfigManage
+from utils.log_store_manage import DeviceLogStore
+
+
+class DeviceLogBuffer:
+    """Ring buffer of the recent log lines of one device and the lines waiting for the next flush."""
+
+    def __init__(self, user_id: str, device_id: str, size: int):
+        self.user_id = user_id
+        self.device_id = device_id
+        self.lines: deque = deque(maxlen=size)
+        self.pending: list = []
+        self.flush_timer: Optional[asyncio.TimerHandle] = None
+
+
+class LogManager:
+    """
+        Device LOG lines are kept in a per-device ring buffer (LOG_BUFFER_SIZE lines) and forwarded to frontend
+        in one LOG_BATCH message per device every LOG_FLUSH_INTERVAL seconds, or as soon as LOG_BATCH_MAX_SIZE
+        lines are waiting. `on_flush(user_id, device_id, lines)` sends the batch, every batch is also persisted
+        to DeviceLogStore.
+    """
+
+    buffers: dict = {}
+    on_flush: Optional[Callable[[str, str, list], Awaitable[None]]] = None
+
+
+    @classmethod
+    def append(cls, user_id: str, device_id: str, level: str, message: str):
+        buffer = cls.buffers.get(device_id)
+        if buffer is None or buffer.user_id != user_id:
+            buffer = cls.buffers[device_id] = DeviceLogBuffer(user_id=user_id, device_id=device_id, size=ConfigManage.LOG_BUFFER_SIZE)
+
+        line = { "time": time.time(), "level": level, "message": message }
+        buffer.lines.append(line)
+        buffer.pending.append(line)
+
+        if len(buffer.pending) >= ConfigManage.LOG_BATCH_MAX_SIZE:
+            cls.schedule_flush(buffer=buffer, delay=0)
+        elif buffer.flush_timer is None:
+            cls.schedule_flush(buffer=buffer, delay=ConfigManage.LOG_FLUSH_INTERVAL)
+
+
+    @classmethod
+    def schedule_flush(cls, buffer: DeviceLogBuffer, delay: float):
+        if buffer.flush_timer:
+            buffer.flush_timer.cancel()
+        loop = asyncio.get_running_loop()
+        buffer.flush_timer = loop.call_later(delay, lambda: asyncio.create_task(cls.flush(device_id=buffer.device_id)))
+
+
+    @classmethod
+    async def flush(cls, device_id: str):
+        buffer = cls.buffers.get(device_id)
+        if buffer is None:
+            return
+        buffer.flush_timer = None
+        lines, buffer.pending = buffer.pending, []
+        if not lines:
+            return
+        DeviceLogStore.submit(device_id=device_id, lines=lines)
+        if cls.on_flush is None:
+            return
+        try:
+            await cls.on_flush(buffer.user_id, device_id, lines)
+        except Exception:
+            print(traceback.format_exc())
+
+
+    @classmethod
+    def tail(cls, user_id: str, device_id: str, limit: int):
+        buffer = cls.buffers.get(device_id)
+        if buffer is None or buffer.user_id != user_id or limit <= 0:
+            return []
+        return list(buffer.lines)[-limit:]
+
+
+    @classmethod
+    async def release_device(cls, device_id: str):
+        """Flush what is waiting, the ring buffer is kept for dashboards opened after the device left."""
+        buffer = cls.buffers.get(device_id)
+        if buffer and buffer.flush_timer:
+            buffer.flush_timer.cancel()
+            await cls.flush(device_id=device_id)
+        DeviceLogStore.close_device(device_id=device_id)
@@ -0,0 +1,292 @@
+import os
+import json
+import mmap
+import time
+import uuid
+import asyncio
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.config_manage import ConfigManage
+
+
+class SegmentWriter:
+
+    def __init__(self, path: str, start_ms: int):
+        self.path = path
+        self.start_ms = start_ms
+        self.file = open(path, "ab")
+        self.size = self.file.tell()
+
+
+class DeviceLogStore:
+    """
+        Append-only log of every device on local disk, `{STORAGE_PATH}/device_logs/{device_id}/{first time ms}.log`.
+
+        Every line is `{time ms, 13 digits} {json}\\n`, segments are time indexed by their name and lines inside a
+        segment are in time order, so reads binary search / scan memory-mapped segments and only decode returned lines.
+        A segment is rotated after LOG_STORE_SEGMENT_BYTES or LOG_STORE_SEGMENT_SECONDS, then segments older than
+        LOG_STORE_RETENTION_DAYS or beyond LOG_STORE_MAX_DEVICE_BYTES of the device are deleted. Retention also runs over
+        every device at startup and every LOG_STORE_RETENTION_INTERVAL seconds, so logs of quiet devices expire too.
+        Writes run in order on one background thread, reads on the default thread pool.
+    """
+
+    TIME_WIDTH = 13
+    SEGMENT_SUFFIX = ".log"
+
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="device-log-store")
+    writers: dict = {}
+    retention_runner: asyncio.Task | None = None
+
+
+    @classmethod
+    def enabled(cls):
+        return bool(ConfigManage.STORAGE_PATH)
+
+
+    @classmethod
+    def device_dir(cls, device_id: str):
+        # device_id comes from url on reads, only a uuid is accepted as directory name.
+        return os.path.join(ConfigManage.STORAGE_PATH, "device_logs", str(uuid.UUID(device_id)))
+
+
+    @classmethod
+    def list_segments(cls, device_id: str):
+        directory = cls.device_dir(device_id)
+        if not os.path.isdir(directory):
+            return []
+        segments = []
+        for name in os.listdir(directory):
+            if name.endswith(cls.SEGMENT_SUFFIX) and name[:-len(cls.SEGMENT_SUFFIX)].isdigit():
+                segments.append((int(name[:-len(cls.SEGMENT_SUFFIX)]), os.path.join(directory, name)))
+        return sorted(segments)
+
+
+    @classmethod
+    def submit(cls, device_id: str, lines: list):
+        """Queue lines ({"time", "level", "message"}) to be appended, returns immediately."""
+        if cls.enabled():
+            cls.executor.submit(cls.append_lines, device_id, lines)
+
+
+    @classmethod
+    def close_device(cls, device_id: str):
+        if cls.enabled():
+            cls.executor.submit(cls.close_writer, device_id)
+
+
+    @classmethod
+    def start(cls):
+        if cls.enabled():
+            cls.retention_runner = asyncio.create_task(cls.run_retention())
+
+
+    @classmethod
+    async def run_retention(cls):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                # On the writer thread, so a segment is never deleted while it is being appended.
+                await loop.run_in_executor(cls.executor, cls.enforce_all_retention)
+                await asyncio.sleep(ConfigManage.LOG_STORE_RETENTION_INTERVAL)
+
+            except asyncio.CancelledError:
+                break
+
+            except Exception:
+                print(traceback.format_exc())
+                await asyncio.sleep(ConfigManage.LOG_STORE_RETENTION_INTERVAL)
+
+
+    @classmethod
+    def shutdown(cls):
+        if cls.retention_runner:
+            cls.retention_runner.cancel()
+        for device_id in list(cls.writers.keys()):
+            cls.executor.submit(cls.close_writer, device_id)
+        cls.executor.shutdown(wait=True)
+
+
+    @classmethod
+    def append_lines(cls, device_id: str, lines: list):
+        try:
+            for line in lines:
+                time_ms = int(line["time"] * 1000)
+                writer = cls.get_writer(device_id=device_id, time_ms=time_ms)
+                record = json.dumps({ "level": line["level"], "message": line["message"] }, ensure_ascii=False)
+                data = f"{time_ms:0{cls.TIME_WIDTH}d} {record}\n".encode("utf-8")
+                writer.file.write(data)
+                writer.size += len(data)
+            writer = cls.writers.get(device_id)
+            if writer:
+                writer.file.flush()
+        except Exception:
+            print(f"Append device log of {device_id} failed.")
+            print(traceback.format_exc())
+
+
+    @classmethod
+    def get_writer(cls, device_id: str, time_ms: int) -> SegmentWriter:
+        writer = cls.writers.get(device_id)
+        if writer and (writer.size >= ConfigManage.LOG_STORE_SEGMENT_BYTES or time_ms - writer.start_ms >= ConfigManage.LOG_STORE_SEGMENT_SECONDS * 1000):
+            cls.close_writer(device_id=device_id)
+            cls.enforce_retention(device_id=device_id)
+            writer = None
+
+        if writer is None:
+            segments = cls.list_segments(device_id)
+            if segments and time_ms - segments[-1][0] < ConfigManage.LOG_STORE_SEGMENT_SECONDS * 1000 and os.path.getsize(segments[-1][1]) < ConfigManage.LOG_STORE_SEGMENT_BYTES:
+                start_ms, path = segments[-1]
+            else:
+                # Segment names must keep time order even if the clock went backwards.
+                start_ms = max(time_ms, segments[-1][0] + 1) if segments else time_ms
+                directory = cls.device_dir(device_id)
+                os.makedirs(directory, exist_ok=True)
+                path = os.path.join(directory, f"{start_ms:0{cls.TIME_WIDTH}d}{cls.SEGMENT_SUFFIX}")
+            writer = cls.writers[device_id] = SegmentWriter(path=path, start_ms=start_ms)
+        return writer
+
+
+    @classmethod
+    def close_writer(cls, device_id: str):
+        writer = cls.writers.pop(device_id, None)
+        if writer:
+            writer.file.close()
+
+
+    @classmethod
+    def enforce_all_retention(cls):
+        directory = os.path.join(ConfigManage.STORAGE_PATH, "device_logs")
+        if not os.path.isdir(directory):
+            return
+        for name in os.listdir(directory):
+            try:
+                cls.enforce_retention(device_id=name)
+            except ValueError:
+                continue
+            except Exception:
+                print(f"Enforce device log retention of {name} failed.")
+                print(traceback.format_exc())
+
+
+    @classmethod
+    def enforce_retention(cls, device_id: str):
+        segments = cls.list_segments(device_id)
+        cutoff_ms = int((time.time() - ConfigManage.LOG_STORE_RETENTION_DAYS * 86400) * 1000)
+        sizes = [os.path.getsize(path) for _, path in segments]
+        total_size = sum(sizes)
+        for index, (start_ms, path) in enumerate(segments):
+            # A segment ends where the next one starts, the newest one at its last write.
+            # The newest segment is kept unless it expired and is not open for writing.
+            if index == len(segments) - 1:
+                if device_id in cls.writers or os.path.getmtime(path) * 1000 >= cutoff_ms:
+                    break
+                expired = True
+            else:
+                expired = segments[index + 1][0] < cutoff_ms
+            if not expired and total_size <= ConfigManage.LOG_STORE_MAX_DEVICE_BYTES:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Already deleted by another worker.
+                pass
+            total_size -= sizes[index]
+
+
+    @classmethod
+    def decode_line(cls, raw: bytes):
+        record = json.loads(raw[cls.TIME_WIDTH + 1:])
+        return { "time": int(raw[:cls.TIME_WIDTH]) / 1000, "level": record.get("level"), "message": record.get("message") }
+
+
+    @classmethod
+    def open_segment(cls, path: str):
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+    @classmethod
+    def read_tail(cls, device_id: str, limit: int):
+        lines = []
+        for _, path in reversed(cls.list_segments(device_id)):
+            segment = cls.open_segment(path)
+            if segment is None:
+                continue
+            with segment:
+                end = len(segment)
+                # Skip a trailing partial line written concurrently.
+                if segment[end - 1:end] != b"\n":
+                    end = segment.rfind(b"\n", 0, end) + 1
+                while end > 0 and len(lines) < limit:
+                    start = segment.rfind(b"\n", 0, end - 1) + 1
+                    lines.append(cls.decode_line(segment[start:end - 1]))
+                    end = start
+            if len(lines) >= limit:
+                break
+        lines.reverse()
+        return lines
+
+
+    @classmethod
+    def line_start_after(cls, segment, position: int):
+        if position == 0:
+            return 0
+        index = segment.find(b"\n", position - 1)
+        return len(segment) if index == -1 else index + 1
+
+
+    @classmethod
+    def read_range(cls, device_id: str, start_time: float, end_time: float, limit: int):
+        start_ms = int(start_time * 1000)
+        end_ms = int(end_time * 1000)
+        segments = cls.list_segments(device_id)
+        lines = []
+        for index, (segment_start_ms, path) in enumerate(segments):
+            segment_end_ms = segments[index + 1][0] if index + 1 < len(segments) else None
+            if segment_start_ms > end_ms or (segment_end_ms is not None and segment_end_ms <= start_ms):
+                continue
+
+            segment = cls.open_segment(path)
+            if segment is None:
+                continue
+            with segment:
+                # Binary search the first line with time >= start_ms.
+                low, high = 0, len(segment)
+                while low < high:
+                    middle = (low + high) // 2
+                    line_start = cls.line_start_after(segment, middle)
+                    if line_start >= len(segment) or int(segment[line_start:line_start + cls.TIME_WIDTH]) >= start_ms:
+                        high = middle
+                    else:
+                        low = middle + 1
+
+                position = cls.line_start_after(segment, low)
+                while position < len(segment) and len(lines) < limit:
+                    line_end = segment.find(b"\n", position)
+                    if line_end == -1:
+                        break
+                    if int(segment[position:position + cls.TIME_WIDTH]) > end_ms:
+                        return lines
+                    lines.append(cls.decode_line(segment[position:line_end]))
+                    position = line_end + 1
+
+            if len(lines) >= limit:
+                break
+        return lines
+
+
+    @classmethod
+    async def tail(cls, device_id: str, limit: int):
+        if not cls.enabled() or limit <= 0:
+            return []
+        return await asyncio.to_thread(cls.read_tail, device_id, limit)
+
+
+    @classmethod
+    async def range(cls, device_id: str, start_time: float, end_time: float, limit: int):
+        if not cls.enabled() or limit <= 0:
+            return []
+        return await asyncio.to_thread(cls.read_range, device_id, start_time, end_time, limit)
@@ -0,0 +1,375 @@
+import os
+import json
+import uuid
+import fcntl
+import asyncio
+import socket
+import traceback
+from typing import Dict, Optional, Callable, Awaitable
+
+from utils.config_manage import ConfigManage
+
+
+class PresenceBackend:
+    """
+        Shared presence / task state and cross-process message routing used by ConnectionManager.
+
+        State is a key-value store grouped by namespace ("device", "frontend"). Every value written by a worker
+        carries its `worker_id`, so the owner of a websocket can be found from any worker. Reads are always
+        served from the local copy of the store, writes are applied locally and propagated by the backend.
+    """
+
+    def __init__(self, worker_id: Optional[str] = None):
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.store: Dict[str, Dict[str, dict]] = {}
+        self.on_message: Optional[Callable[[dict], Awaitable[None]]] = None
+
+
+    async def start(self, on_message: Callable[[dict], Awaitable[None]]):
+        self.on_message = on_message
+
+
+    async def stop(self):
+        pass
+
+
+    def get(self, namespace: str, key: str) -> Optional[dict]:
+        return self.store.get(namespace, {}).get(key)
+
+
+    def items(self, namespace: str):
+        return list(self.store.get(namespace, {}).items())
+
+
+    def set(self, namespace: str, key: str, value: dict):
+        self.apply_set(namespace=namespace, key=key, value={**value, "worker_id": self.worker_id})
+
+
+    def delete(self, namespace: str, key: str):
+        """Only delete the entry owned by this worker, a newer owner on other worker must be kept."""
+        self.apply_delete(namespace=namespace, key=key, owner=self.worker_id)
+
+
+    async def take(self, namespace: str, key: str) -> Optional[dict]:
+        """Remove and return the entry whoever owns it, only one of concurrent callers on any worker gets it."""
+        value = self.get(namespace, key)
+        if value is not None:
+            self.apply_delete(namespace=namespace, key=key)
+        return value
+
+
+    def is_local(self, value: Optional[dict]) -> bool:
+        return value is not None and value.get("worker_id") == self.worker_id
+
+
+    async def publish(self, worker_id: str, message: dict):
+        """Route message to the worker owning the target websocket."""
+        if worker_id == self.worker_id and self.on_message:
+            await self.on_message(message)
+        else:
+            print(f"Presence backend can not route message to worker: {worker_id}")
+
+
+    def apply_set(self, namespace: str, key: str, value: dict):
+        self.store.setdefault(namespace, {})[key] = value
+
+
+    def apply_delete(self, namespace: str, key: str, owner: Optional[str] = None) -> bool:
+        current = self.store.get(namespace, {}).get(key)
+        if current is None:
+            return False
+        if owner and current.get("worker_id") != owner:
+            return False
+        del self.store[namespace][key]
+        if not self.store[namespace]:
+            del self.store[namespace]
+        return True
+
+
+class InMemoryPresenceBackend(PresenceBackend):
+    """Single process backend, all state stays in this process."""
+    pass
+
+
+class LocalBroker:
+    """
+        Broker for workers on the same host, listening on unix socket with newline delimited json.
+        It keeps the authoritative store, broadcasts every change to other workers and routes published messages.
+        When a worker exits, all entries owned by it are removed.
+        The broker holds an exclusive flock on `<socket_path>.lock` while running, only the holder may remove the
+        socket file and listen on it, so two processes never host a broker at the same time.
+    """
+
+    STREAM_LIMIT = 32 * 1024 * 1024
+
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        self.store = PresenceBackend(worker_id="broker")
+        self.workers: Dict[str, asyncio.StreamWriter] = {}
+        self.server = None
+        self.lock_file = None
+
+
+    def acquire_lock(self) -> bool:
+        """False when another process holds the lock, the lock is released by the OS if the holder dies."""
+        lock_file = open(f"{self.socket_path}.lock", "a")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self.lock_file = lock_file
+        return True
+
+
+    def release_lock(self):
+        if self.lock_file:
+            self.lock_file.close()
+            self.lock_file = None
+
+
+    async def start(self):
+        if self.lock_file is None and not self.acquire_lock():
+            raise RuntimeError(f"Presence broker on {self.socket_path} is already hosted by another process")
+        # Holding the lock, the socket file can only be left over by a dead broker.
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self.server = await asyncio.start_unix_server(self.handle_worker, path=self.socket_path, limit=self.STREAM_LIMIT)
+        print(f"Presence broker listening on {self.socket_path}")
+
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        for writer in list(self.workers.values()):
+            writer.close()
+        self.workers.clear()
+        self.release_lock()
+
+
+    def write(self, writer: asyncio.StreamWriter, data: dict):
+        writer.write(json.dumps(data).encode("utf-8") + b"\n")
+
+
+    def broadcast(self, data: dict, exclude: Optional[str] = None):
+        for worker_id, writer in list(self.workers.items()):
+            if worker_id != exclude:
+                self.write(writer, data)
+
+
+    async def handle_worker(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        worker_id = None
+        try:
+            async for line in reader:
+                data = json.loads(line)
+                op = data.get("op")
+
+                if op == "hello":
+                    worker_id = data["worker_id"]
+                    self.workers[worker_id] = writer
+                    self.write(writer, {"op": "snapshot", "store": self.store.store})
+                    print(f"Presence broker registered worker: {worker_id}")
+
+                elif op == "set":
+                    self.store.apply_set(namespace=data["namespace"], key=data["key"], value=data["value"])
+                    self.broadcast(data, exclude=worker_id)
+
+                elif op == "delete":
+                    if self.store.apply_delete(namespace=data["namespace"], key=data["key"], owner=data.get("owner")):
+                        self.broadcast(data, exclude=worker_id)
+
+                elif op == "take":
+                    # Served in arrival order by the broker, so the entry goes to exactly one worker.
+                    value = self.store.get(data["namespace"], data["key"])
+                    if value is not None:
+                        self.store.apply_delete(namespace=data["namespace"], key=data["key"])
+                        self.broadcast({"op": "delete", "namespace": data["namespace"], "key": data["key"]}, exclude=worker_id)
+                    self.write(writer, {"op": "taken", "request_id": data["request_id"], "value": value})
+
+                elif op == "publish":
+                    target = self.workers.get(data["worker_id"])
+                    if target:
+                        self.write(target, {"op": "message", "message": data["message"]})
+                    else:
+                        print(f"Presence broker drop message for unknown worker: {data['worker_id']}")
+
+                await writer.drain()
+
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+
+        except Exception:
+            print(traceback.format_exc())
+
+        finally:
+            if worker_id and self.workers.get(worker_id) is writer:
+                del self.workers[worker_id]
+                for namespace in list(self.store.store.keys()):
+                    for key, value in self.store.items(namespace):
+                        if value.get("worker_id") == worker_id:
+                            self.store.apply_delete(namespace=namespace, key=key)
+                            self.broadcast({"op": "delete", "namespace": namespace, "key": key, "owner": worker_id})
+                print(f"Presence broker unregistered worker: {worker_id}")
+            writer.close()
+
+
+class LocalPresenceBackend(PresenceBackend):
+    """
+        Multi-process backend on one host, every worker connects to a LocalBroker through unix socket.
+        If no broker is running yet, the worker taking the broker lock first hosts it in-process,
+        the others wait for it to listen.
+    """
+
+    RECONNECT_DELAY = 1.0
+    CONNECT_ATTEMPTS = 10
+    REQUEST_TIMEOUT = 2.0
+
+    def __init__(self, socket_path: str, worker_id: Optional[str] = None):
+        super().__init__(worker_id=worker_id)
+        self.socket_path = socket_path
+        self.broker: Optional[LocalBroker] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.reader_task: Optional[asyncio.Task] = None
+        self.synced = asyncio.Event()
+        self.requests: Dict[str, asyncio.Future] = {}
+
+
+    async def start(self, on_message: Callable[[dict], Awaitable[None]]):
+        await super().start(on_message)
+        await self.connect()
+        self.reader_task = asyncio.create_task(self.read_broker())
+        await asyncio.wait_for(self.synced.wait(), timeout=5.0)
+        print(f"Presence backend connected to broker, worker_id: {self.worker_id}")
+
+
+    async def stop(self):
+        if self.reader_task:
+            self.reader_task.cancel()
+            self.reader_task = None
+        if self.writer:
+            self.writer.close()
+            self.writer = None
+        if self.broker:
+            await self.broker.stop()
+            self.broker = None
+
+
+    async def connect(self):
+        for _ in range(self.CONNECT_ATTEMPTS):
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.socket_path, limit=LocalBroker.STREAM_LIMIT)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                broker = LocalBroker(socket_path=self.socket_path)
+                if broker.acquire_lock():
+                    print(f"Presence broker not found on {self.socket_path}, host it in worker: {self.worker_id}")
+                    await broker.start()
+                    self.broker = broker
+                    reader, writer = await asyncio.open_unix_connection(self.socket_path, limit=LocalBroker.STREAM_LIMIT)
+                    break
+                else:
+                    # Another process holds the lock and is about to listen.
+                    await asyncio.sleep(self.RECONNECT_DELAY)
+        else:
+            raise ConnectionRefusedError(f"Presence broker on {self.socket_path} is not reachable")
+
+        self.reader = reader
+        self.writer = writer
+        self.write({"op": "hello", "worker_id": self.worker_id})
+
+
+    def write(self, data: dict):
+        if self.writer is None or self.writer.is_closing():
+            return
+        self.writer.write(json.dumps(data).encode("utf-8") + b"\n")
+
+
+    def set(self, namespace: str, key: str, value: dict):
+        super().set(namespace=namespace, key=key, value=value)
+        self.write({"op": "set", "namespace": namespace, "key": key, "value": self.get(namespace, key)})
+
+
+    def delete(self, namespace: str, key: str):
+        super().delete(namespace=namespace, key=key)
+        self.write({"op": "delete", "namespace": namespace, "key": key, "owner": self.worker_id})
+
+
+    async def take(self, namespace: str, key: str) -> Optional[dict]:
+        """None also when the broker did not answer in REQUEST_TIMEOUT seconds."""
+        request_id = uuid.uuid4().hex
+        future = asyncio.get_running_loop().create_future()
+        self.requests[request_id] = future
+        self.write({"op": "take", "namespace": namespace, "key": key, "request_id": request_id})
+        try:
+            value = await asyncio.wait_for(future, timeout=self.REQUEST_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"Presence broker did not answer take of {namespace}:{key}")
+            return None
+        finally:
+            self.requests.pop(request_id, None)
+        self.apply_delete(namespace=namespace, key=key)
+        return value
+
+
+    async def publish(self, worker_id: str, message: dict):
+        if worker_id == self.worker_id:
+            await super().publish(worker_id=worker_id, message=message)
+        else:
+            self.write({"op": "publish", "worker_id": worker_id, "message": message})
+
+
+    async def read_broker(self):
+        while True:
+            try:
+                async for line in self.reader:
+                    data = json.loads(line)
+                    op = data.get("op")
+
+                    if op == "snapshot":
+                        # Keep entries owned by this worker, they are re-announced below.
+                        own_entries = [(namespace, key, value) for namespace in self.store for key, value in self.items(namespace) if self.is_local(value)]
+                        self.store = data["store"]
+                        for namespace, key, value in own_entries:
+                            self.apply_set(namespace=namespace, key=key, value=value)
+                            self.write({"op": "set", "namespace": namespace, "key": key, "value": value})
+                        self.synced.set()
+
+                    elif op == "set":
+                        self.apply_set(namespace=data["namespace"], key=data["key"], value=data["value"])
+
+                    elif op == "delete":
+                        self.apply_delete(namespace=data["namespace"], key=data["key"], owner=data.get("owner"))
+
+                    elif op == "taken":
+                        future = self.requests.get(data["request_id"])
+                        if future and not future.done():
+                            future.set_result(data["value"])
+
+                    elif op == "message" and self.on_message:
+                        try:
+                            await self.on_message(data["message"])
+                        except Exception:
+                            print(traceback.format_exc())
+
+            except asyncio.CancelledError:
+                raise
+
+            except Exception:
+                print(traceback.format_exc())
+
+            print(f"Presence backend lost broker connection, worker_id: {self.worker_id}")
+            while True:
+                await asyncio.sleep(self.RECONNECT_DELAY)
+                try:
+                    await self.connect()
+                    break
+                except Exception as e:
+                    print(f"Presence backend reconnect failed: {e}")
+
+
+def create_presence_backend() -> PresenceBackend:
+    if ConfigManage.PRESENCE_BACKEND == "local":
+        return LocalPresenceBackend(socket_path=ConfigManage.PRESENCE_SOCKET_PATH)
+    return InMemoryPresenceBackend()
@@ -0,0 +1,47 @@
+import jwt
+from uuid import uuid4
+from datetime import datetime, timedelta, timezone
+from jwt.exceptions import InvalidTokenError
+
+from utils.config_manage import ConfigManage
+
+
+class ResumeTokenManager:
+    """
+        Resume token of a device session, issued after INIT handshake and re-issued when mode / model changes.
+        It carries the last known mode and model of the device and a `jti`, the token is only accepted while the
+        session parked with the same `jti` is inside its grace window (see ConnectionManager.park_device_session).
+    """
+
+    TOKEN_TYPE = "resume"
+    TOKEN_EXPIRE = timedelta(days=1)
+
+
+    @classmethod
+    def issue(cls, device_id: str, user_id: str, mode: str | None, model_id: str | None):
+        jti = str(uuid4())
+        payload = {
+            "type": cls.TOKEN_TYPE,
+            "jti": jti,
+            "device_id": device_id,
+            "user_id": user_id,
+            "mode": mode,
+            "model_id": model_id,
+            "exp": datetime.now(timezone.utc) + cls.TOKEN_EXPIRE
+        }
+        token = jwt.encode(payload=payload, key=ConfigManage.SECRET_KEY, algorithm=ConfigManage.ALGORITHM)
+        return token, jti
+
+
+    @classmethod
+    def verify(cls, token: str, device_id: str, user_id: str) -> dict | None:
+        try:
+            payload = jwt.decode(jwt=token, key=ConfigManage.SECRET_KEY, algorithms=ConfigManage.ALGORITHM)
+        except InvalidTokenError as e:
+            print(f"Invalid resume token of device: {device_id}, {e}")
+            return None
+
+        if payload.get("type") != cls.TOKEN_TYPE or payload.get("device_id") != device_id or payload.get("user_id") != user_id:
+            print(f"Resume token does not belong to device: {device_id}")
+            return None
+        return payload
@@ -0,0 +1,211 @@
+import math
+import uuid
+import asyncio
+import traceback
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, func
+
+from models.firmware_model import Firmware
+from models.firmware_rollout_model import FirmwareRollout, FirmwareRolloutDevice
+from utils.config_manage import ConfigManage
+from utils.connection_manage import ConnectionManager
+from utils.write_behind_manage import DeviceWriteBehind
+from utils.sql_manage import async_session_maker
+
+
+class RolloutManager:
+    """
+        Staged OTA rollout. Targets are split into waves when the rollout is created: a canary wave of
+        `canary_percent` of the devices, then waves growing by `wave_multiplier`.
+
+        One runner loop per RUNNING rollout, on the worker which created / resumed it, every ROLLOUT_POLL_INTERVAL seconds:
+        - sends OTA to the devices of the current wave which are online, the offline ones are SKIPPED
+        - pauses the rollout as soon as failed / sent devices of the wave is above `error_threshold`
+        - fails devices still running the OTA ROLLOUT_WAVE_TIMEOUT seconds after the wave started
+        - moves to the next wave once every sent device settled, the rollout is COMPLETED after the last one
+        Results come from any worker through the OTA task `rollout_id` context (see record_task_result) and the
+        write-behind queue, so the runner only reads the database.
+    """
+
+    runners: dict = {}
+
+
+    @classmethod
+    async def start(cls):
+        ConnectionManager.on_task_failed = cls.record_task_failed
+        asyncio.create_task(cls.pause_orphaned_rollouts())
+
+
+    @classmethod
+    async def stop(cls):
+        for runner in list(cls.runners.values()):
+            runner.cancel()
+
+
+    @classmethod
+    def plan_waves(cls, total: int, canary_percent: float, wave_multiplier: float) -> list:
+        """Size of every wave, e.g. 100 devices, 5%, x2 -> [5, 10, 20, 40, 25]."""
+        sizes = []
+        size = max(1, math.ceil(total * canary_percent / 100))
+        remaining = total
+        while remaining > 0:
+            sizes.append(min(size, remaining))
+            remaining -= sizes[-1]
+            size = max(size + 1, math.ceil(size * wave_multiplier))
+        return sizes
+
+
+    @classmethod
+    def start_runner(cls, rollout_id: uuid.UUID, runner_id: uuid.UUID):
+        runner = asyncio.create_task(cls.run(rollout_id=rollout_id, runner_id=runner_id))
+        cls.runners[runner_id] = runner
+        runner.add_done_callback(lambda _: cls.runners.pop(runner_id, None))
+
+
+    @classmethod
+    async def run(cls, rollout_id: uuid.UUID, runner_id: uuid.UUID):
+        print(f"Firmware rollout {rollout_id} runner {runner_id} started.")
+        while True:
+            try:
+                if await cls.step(rollout_id=rollout_id, runner_id=runner_id):
+                    break
+                await asyncio.sleep(ConfigManage.ROLLOUT_POLL_INTERVAL)
+
+            except asyncio.CancelledError:
+                break
+
+            except Exception:
+                print(traceback.format_exc())
+                await asyncio.sleep(ConfigManage.ROLLOUT_POLL_INTERVAL)
+        print(f"Firmware rollout {rollout_id} runner {runner_id} stopped.")
+
+
+    @classmethod
+    async def step(cls, rollout_id: uuid.UUID, runner_id: uuid.UUID) -> bool:
+        """Advance the rollout by one check, True when this runner must stop."""
+        async with async_session_maker() as db:
+            result = await db.execute(select(FirmwareRollout).where(FirmwareRollout.id == rollout_id))
+            rollout = result.scalar_one_or_none()
+            if rollout is None or rollout.status != "RUNNING" or rollout.runner_id != runner_id:
+                return True
+
+            query = select(FirmwareRolloutDevice.status, func.count(FirmwareRolloutDevice.id))   \
+                .where(FirmwareRolloutDevice.rollout_id == rollout_id)                          \
+                .where(FirmwareRolloutDevice.wave == rollout.current_wave)                      \
+                .group_by(FirmwareRolloutDevice.status)
+            counts = dict((await db.execute(query)).all())
+            # Keeps updated_time fresh, see pause_orphaned_rollouts.
+            rollout.updated_time = func.now()
+
+            if counts.get("PENDING"):
+                await cls.dispatch_wave(db=db, rollout=rollout)
+                return False
+
+            sent = counts.get("SENT", 0)
+            failed = counts.get("FAILED", 0)
+            dispatched = sent + failed + counts.get("COMPLETED", 0)
+            if dispatched and failed / dispatched > rollout.error_threshold:
+                rollout.status = "PAUSED"
+                rollout.pause_reason = f"ERROR_RATE: {failed}/{dispatched} devices of wave {rollout.current_wave + 1} failed."
+                await db.commit()
+                print(f"Firmware rollout {rollout_id} paused, {rollout.pause_reason}")
+                return True
+
+            if sent:
+                if datetime.now() - rollout.wave_started_time >= timedelta(seconds=ConfigManage.ROLLOUT_WAVE_TIMEOUT):
+                    query = update(FirmwareRolloutDevice)                                   \
+                        .where(FirmwareRolloutDevice.rollout_id == rollout_id)              \
+                        .where(FirmwareRolloutDevice.wave == rollout.current_wave)          \
+                        .where(FirmwareRolloutDevice.status == "SENT")                      \
+                        .values(status="FAILED", reason="TIMEOUT")
+                    await db.execute(query)
+                await db.commit()
+                return False
+
+            if rollout.current_wave + 1 >= rollout.wave_count:
+                rollout.status = "COMPLETED"
+                await db.commit()
+                print(f"Firmware rollout {rollout_id} completed.")
+                return True
+
+            rollout.current_wave += 1
+            rollout.wave_started_time = None
+            await db.commit()
+            return False
+
+
+    @classmethod
+    async def dispatch_wave(cls, db, rollout: FirmwareRollout):
+        result = await db.execute(select(Firmware).where(Firmware.id == rollout.firmware_id).where(Firmware.deleted_time == None))
+        firmware = result.scalar_one_or_none()
+        if firmware is None:
+            rollout.status = "PAUSED"
+            rollout.pause_reason = "FIRMWARE_DELETED"
+            await db.commit()
+            return
+
+        query = select(FirmwareRolloutDevice)                                       \
+            .where(FirmwareRolloutDevice.rollout_id == rollout.id)                  \
+            .where(FirmwareRolloutDevice.wave == rollout.current_wave)              \
+            .where(FirmwareRolloutDevice.status == "PENDING")
+        targets = (await db.execute(query)).scalars().all()
+
+        device_ids = []
+        for target in targets:
+            if ConnectionManager.get_device_connection_state(device_id=str(target.device_id)):
+                target.status = "SENT"
+                device_ids.append(str(target.device_id))
+            else:
+                target.status = "SKIPPED"
+                target.reason = "OFFLINE"
+        rollout.wave_started_time = rollout.wave_started_time or datetime.now()
+        # State is committed before sending so a fast result is not overwritten.
+        await db.commit()
+
+        user_id = str(rollout.user_id)
+        task_params = {
+            "firmware_id": str(firmware.id),
+            "firmware_name": firmware.name,
+            "download_path":  f"{ConfigManage.SERVER_DOMAIN}/api/firmware/download/{user_id}/{firmware.id}"
+        }
+        task_context = { "rollout_id": str(rollout.id) }
+        semaphore = asyncio.Semaphore(ConfigManage.BULK_COMMAND_CONCURRENCY)
+
+        async def send(device_id: str):
+            async with semaphore:
+                await ConnectionManager.send_task_to_device(user_id=user_id, device_id=device_id, task="OTA", task_params=task_params, task_context=task_context)
+
+        print(f"Firmware rollout {rollout.id} wave {rollout.current_wave + 1}/{rollout.wave_count}: send OTA to {len(device_ids)} devices, {len(targets) - len(device_ids)} offline.")
+        await asyncio.gather(*[send(device_id) for device_id in device_ids], return_exceptions=True)
+
+
+    @classmethod
+    def record_task_result(cls, task_info: dict, status: str, reason: str | None = None):
+        rollout_id = (task_info.get("context") or {}).get("rollout_id")
+        if rollout_id:
+            DeviceWriteBehind.enqueue_rollout_result(rollout_id=rollout_id, device_id=task_info["device_id"], status=status, reason=reason)
+
+
+    @classmethod
+    async def record_task_failed(cls, task_info: dict, reason: str):
+        cls.record_task_result(task_info=task_info, status="FAILED", reason=reason)
+
+
+    @classmethod
+    async def pause_orphaned_rollouts(cls):
+        """
+            RUNNING rollouts whose runner stopped with its worker (restart, crash) are paused, to be resumed by hand.
+            Runners touch their rollout every poll, so only rollouts untouched for several polls are paused.
+        """
+        stale_seconds = ConfigManage.ROLLOUT_POLL_INTERVAL * 5 + 10
+        await asyncio.sleep(stale_seconds)
+        try:
+            async with async_session_maker() as db:
+                query = update(FirmwareRollout)                                                          \
+                    .where(FirmwareRollout.status == "RUNNING")                                          \
+                    .where(FirmwareRollout.updated_time < func.now() - timedelta(seconds=stale_seconds)) \
+                    .values(status="PAUSED", pause_reason="RUNNER_LOST")
+                await db.execute(query)
+                await db.commit()
+        except Exception:
+            print(traceback.format_exc())
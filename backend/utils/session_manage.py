@@ -0,0 +1,115 @@
+import asyncio
+import traceback
+from uuid import uuid4
+from fastapi import WebSocket
+
+
+class FrontendSession:
+    """
+        One frontend websocket (browser tab, wall display...) of a user.
+        Messages are serialized once by the caller and put into a bounded outbound queue,
+        a dedicated writer task sends them, so a slow session never blocks other sessions.
+
+        Until the session sends its first SUBSCRIBE message it receives every stream of the user (subscriptions is None),
+        afterwards only the subscribed (device_id, kind) streams, device_id "*" matches every device.
+    """
+
+    STREAM_KINDS = ("frames", "logs", "tasks")
+
+    def __init__(self, user_id: str, websocket: WebSocket, queue_size: int):
+        self.session_id = str(uuid4())
+        self.user_id = user_id
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.subscriptions: dict[str, set] | None = None
+        self.sent = 0
+        self.dropped = 0
+        self.writer = asyncio.create_task(self.run())
+
+
+    def subscribe(self, device_id: str, kinds: list[str]):
+        if self.subscriptions is None:
+            self.subscriptions = {}
+        self.subscriptions.setdefault(device_id, set()).update(kind for kind in kinds if kind in self.STREAM_KINDS)
+
+
+    def unsubscribe(self, device_id: str, kinds: list[str] | None = None):
+        if self.subscriptions is None:
+            self.subscriptions = {}
+        if device_id not in self.subscriptions:
+            return
+        if kinds:
+            self.subscriptions[device_id].difference_update(kinds)
+        if not kinds or not self.subscriptions[device_id]:
+            del self.subscriptions[device_id]
+
+
+    def is_subscribed(self, device_id: str | None, kind: str | None) -> bool:
+        return interest_matches(interest=self.subscriptions, device_id=device_id, kind=kind)
+
+
+    def interest(self):
+        if self.subscriptions is None:
+            return None
+        return { device_id: list(kinds) for device_id, kinds in self.subscriptions.items() }
+
+
+    def enqueue(self, message_type: str, payload):
+        """payload is a json string for `text` and bytes for `byte`, when the queue is full the oldest message is dropped."""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait((message_type, payload))
+
+
+    async def send(self, message_type: str, payload):
+        if message_type == "text":
+            await self.websocket.send_text(payload)
+        elif message_type == "byte":
+            await self.websocket.send_bytes(payload)
+
+
+    async def run(self):
+        while True:
+            message_type, payload = await self.queue.get()
+            try:
+                await self.send(message_type, payload)
+                self.sent += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                print(f"[{self.user_id}:{self.session_id}] Send message to frontend session failed, stop writer.")
+                print(traceback.format_exc())
+                break
+
+
+    def close(self):
+        if not self.writer.done():
+            self.writer.cancel()
+
+
+    def stats(self):
+        return {
+            "session_id": self.session_id,
+            "queue_size": self.queue.qsize(),
+            "subscriptions": self.interest(),
+            "sent": self.sent,
+            "dropped": self.dropped
+        }
+
+
+def interest_matches(interest: dict | None, device_id: str | None, kind: str | None) -> bool:
+    """interest None means subscribed to everything, message without device_id or kind is not a stream and always matches."""
+    if interest is None or device_id is None or kind is None:
+        return True
+    return kind in interest.get(device_id, ()) or kind in interest.get("*", ())
+
+
+def merge_interests(interests: list):
+    merged = {}
+    for interest in interests:
+        if interest is None:
+            return None
+        for device_id, kinds in interest.items():
+            merged.setdefault(device_id, set()).update(kinds)
+    return { device_id: list(kinds) for device_id, kinds in merged.items() }
@@ -0,0 +1,80 @@
+import os
+import uuid
+import asyncio
+import hashlib
+from fastapi import UploadFile
+
+from utils.config_manage import ConfigManage
+import utils.exception as GeneralExc
+
+
+class StorageManager:
+    """
+        Stores uploaded artifacts (firmware, AI model) under STORAGE_PATH.
+        The upload is copied UPLOAD_CHUNK_SIZE bytes at a time, disk writes and hashing run off the event loop,
+        so a large file neither sits in memory nor blocks websockets. The copy goes to a `.part` file next to the
+        target which replaces the target only once complete, readers never see a partial file.
+    """
+
+    @classmethod
+    def check_upload_size(cls, file: UploadFile, max_size: int):
+        """Fail fast on the size known from the request, the copy still counts the bytes it really writes."""
+        if file.size is not None and file.size > max_size:
+            raise GeneralExc.FileTooLarge(details=f"{file.filename} is {file.size} bytes, the limit is {max_size} bytes.")
+
+
+    @classmethod
+    async def save_upload(cls, file: UploadFile, file_path: str, max_size: int):
+        """Returns { "size", "sha256" } of the stored file, raises FileTooLarge or OSError, nothing is left behind on failure."""
+        cls.check_upload_size(file=file, max_size=max_size)
+        directory = os.path.dirname(file_path)
+        temp_path = os.path.join(directory, f".{uuid.uuid4()}.part")
+        await asyncio.to_thread(os.makedirs, directory, exist_ok=True)
+
+        output = await asyncio.to_thread(open, temp_path, "wb")
+        checksum = hashlib.sha256()
+        size = 0
+        try:
+            while True:
+                chunk = await file.read(ConfigManage.UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise GeneralExc.FileTooLarge(details=f"{file.filename} is larger than the limit of {max_size} bytes.")
+                await asyncio.to_thread(cls.write_chunk, output, checksum, chunk)
+
+            await asyncio.to_thread(cls.close_file, output)
+            await asyncio.to_thread(os.replace, temp_path, file_path)
+
+        except BaseException:
+            # Also on cancellation (client went away), so it is not awaited.
+            cls.discard_file(output, temp_path)
+            raise
+
+        return { "size": size, "sha256": checksum.hexdigest() }
+
+
+    @classmethod
+    def write_chunk(cls, output, checksum, chunk: bytes):
+        checksum.update(chunk)
+        output.write(chunk)
+
+
+    @classmethod
+    def close_file(cls, output):
+        output.flush()
+        os.fsync(output.fileno())
+        output.close()
+
+
+    @classmethod
+    def discard_file(cls, output, path: str):
+        output.close()
+        cls.remove_file(path)
+
+
+    @classmethod
+    def remove_file(cls, path: str):
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,218 @@
+import time
+import json
+import random
+import asyncio
+import traceback
+from collections import OrderedDict
+from typing import Dict, Optional, Callable, Awaitable
+
+
+class TaskStatus:
+    PENDING_ACK = "PENDING_ACK"
+    ACKNOWLEDGED = "ACKNOWLEDGED"
+    IN_PROGRESS = "IN_PROGRESS"
+    COMPLETED = "COMPLETED"
+    FAILED = "FAILED"
+
+    TERMINAL = (COMPLETED, FAILED)
+    IN_FLIGHT = (PENDING_ACK, ACKNOWLEDGED, IN_PROGRESS)
+
+
+class RetryPolicy:
+    """
+        Resend policy of a task not acknowledged in time, the same task_id is reused so device can deduplicate.
+        Wait before attempt n (n >= 2) is `ack_timeout * multiplier ** (n - 2)`, capped at `max_delay`, plus random jitter
+        of up to `jitter` of it.
+    """
+
+    def __init__(self, max_attempts: int = 1, multiplier: float = 2.0, max_delay: float = 300.0, jitter: float = 0.2):
+        self.max_attempts = max(max_attempts, 1)
+        self.multiplier = multiplier
+        self.max_delay = max_delay
+        self.jitter = jitter
+
+
+    def can_retry(self, attempts: int) -> bool:
+        return attempts < self.max_attempts
+
+
+    def delay(self, ack_timeout: float, attempt: int) -> float:
+        delay = min(ack_timeout * self.multiplier ** max(attempt - 2, 0), self.max_delay)
+        return delay + random.uniform(0, delay * self.jitter)
+
+
+    @classmethod
+    def from_config(cls, default: dict, overrides: str | None) -> Dict[str, "RetryPolicy"]:
+        """overrides is a json object of action name to policy fields, for example {"OTA": {"max_attempts": 5}}."""
+        policies = {}
+        for action, fields in (json.loads(overrides) if overrides else {}).items():
+            policies[action] = cls(**{ **default, **fields })
+        policies["default"] = cls(**default)
+        return policies
+
+
+class TaskStore:
+    """
+        Lifecycle store of tasks sent to devices.
+
+        - Bounded size, when full the oldest terminal task is evicted first.
+        - Terminal tasks (COMPLETED / FAILED) are evicted after `terminal_ttl` seconds.
+        - A timer is armed for every in-flight task: PENDING_ACK must be acknowledged within `ack_timeout`,
+          ACKNOWLEDGED / IN_PROGRESS must finish within `progress_timeout`, otherwise `on_timeout(task, stage)` is called
+          with stage "ack" or "progress".
+        - `attempts` of a task counts how many times it was sent, see `retry`.
+    """
+
+    def __init__(self, max_size: int, terminal_ttl: float, ack_timeout: float, progress_timeout: float):
+        self.max_size = max_size
+        self.terminal_ttl = terminal_ttl
+        self.ack_timeout = ack_timeout
+        self.progress_timeout = progress_timeout
+        self.tasks: "OrderedDict[str, dict]" = OrderedDict()
+        self.device_tasks: Dict[str, set] = {}
+        self.timers: Dict[str, asyncio.TimerHandle] = {}
+        self.on_timeout: Optional[Callable[[dict, str], Awaitable[None]]] = None
+
+
+    def add(self, task_id: str, device_id: str, user_id: str, name: str, params: Optional[Dict], context: Optional[Dict]) -> dict:
+        while len(self.tasks) >= self.max_size:
+            self.evict_one()
+
+        now = time.time()
+        task = {
+            "task_id": task_id,
+            "device_id": device_id,
+            "user_id": user_id,
+            "name": name,
+            "status": TaskStatus.PENDING_ACK,
+            "params": params,
+            "context": context or {},
+            "attempts": 1,
+            "created_time": now,
+            "updated_time": now
+        }
+        self.tasks[task_id] = task
+        self.device_tasks.setdefault(device_id, set()).add(task_id)
+        self.arm_timer(task_id, self.ack_timeout, self.fire_timeout, "ack")
+        return task
+
+
+    def restore(self, task: dict) -> dict:
+        """Adopt an in-flight task handed over by another worker, its timer restarts for the current status."""
+        while len(self.tasks) >= self.max_size:
+            self.evict_one()
+        self.tasks[task["task_id"]] = task
+        self.device_tasks.setdefault(task["device_id"], set()).add(task["task_id"])
+        return self.update_status(task_id=task["task_id"], status=task["status"])
+
+
+    def get(self, task_id: str) -> Optional[dict]:
+        return self.tasks.get(task_id)
+
+
+    def get_device_task(self, device_id: str, task_id: str) -> Optional[dict]:
+        task = self.tasks.get(task_id)
+        if task and task["device_id"] == device_id:
+            return task
+        return None
+
+
+    def get_device_tasks(self, device_id: str) -> list:
+        return [self.tasks[task_id] for task_id in self.device_tasks.get(device_id, ())]
+
+
+    def update_status(self, task_id: str, status: str) -> Optional[dict]:
+        task = self.tasks.get(task_id)
+        if task is None:
+            return None
+
+        task["status"] = status
+        task["updated_time"] = time.time()
+
+        if status in TaskStatus.TERMINAL:
+            self.arm_timer(task_id, self.terminal_ttl, self.expire)
+        elif status == TaskStatus.PENDING_ACK:
+            self.arm_timer(task_id, self.ack_timeout, self.fire_timeout, "ack")
+        else:
+            self.arm_timer(task_id, self.progress_timeout, self.fire_timeout, "progress")
+        return task
+
+
+    def retry(self, task_id: str, delay: float) -> Optional[dict]:
+        """Count one more send attempt and wait `delay` seconds for its ack."""
+        task = self.tasks.get(task_id)
+        if task is None:
+            return None
+
+        task["attempts"] += 1
+        task["status"] = TaskStatus.PENDING_ACK
+        task["updated_time"] = time.time()
+        self.arm_timer(task_id, delay, self.fire_timeout, "ack")
+        return task
+
+
+    def remove(self, task_id: str):
+        self.cancel_timer(task_id=task_id)
+        task = self.tasks.pop(task_id, None)
+        if task:
+            device_task_ids = self.device_tasks.get(task["device_id"])
+            if device_task_ids is not None:
+                device_task_ids.discard(task_id)
+                if not device_task_ids:
+                    del self.device_tasks[task["device_id"]]
+
+
+    def remove_device(self, device_id: str):
+        for task_id in list(self.device_tasks.get(device_id, ())):
+            self.remove(task_id=task_id)
+
+
+    def in_flight_count(self, device_id: Optional[str] = None) -> int:
+        tasks = self.get_device_tasks(device_id) if device_id else self.tasks.values()
+        return sum(1 for task in tasks if task["status"] in TaskStatus.IN_FLIGHT)
+
+
+    def has_in_flight(self, device_id: str, exclude_task_id: Optional[str] = None) -> bool:
+        return any(task["status"] in TaskStatus.IN_FLIGHT and task["task_id"] != exclude_task_id for task in self.get_device_tasks(device_id))
+
+
+    def evict_one(self):
+        for task_id, task in self.tasks.items():
+            if task["status"] in TaskStatus.TERMINAL:
+                self.remove(task_id=task_id)
+                return
+        task_id = next(iter(self.tasks))
+        print(f"Task store is full of in-flight tasks, evict oldest task: {task_id}")
+        self.remove(task_id=task_id)
+
+
+    def arm_timer(self, task_id: str, delay: float, callback, *args):
+        self.cancel_timer(task_id=task_id)
+        loop = asyncio.get_running_loop()
+        self.timers[task_id] = loop.call_later(delay, callback, task_id, *args)
+
+
+    def cancel_timer(self, task_id: str):
+        timer = self.timers.pop(task_id, None)
+        if timer:
+            timer.cancel()
+
+
+    def expire(self, task_id: str):
+        self.timers.pop(task_id, None)
+        self.remove(task_id=task_id)
+
+
+    def fire_timeout(self, task_id: str, stage: str):
+        self.timers.pop(task_id, None)
+        task = self.tasks.get(task_id)
+        if task is None or task["status"] not in TaskStatus.IN_FLIGHT or self.on_timeout is None:
+            return
+        asyncio.create_task(self.run_timeout(task=task, stage=stage))
+
+
+    async def run_timeout(self, task: dict, stage: str):
+        try:
+            await self.on_timeout(task, stage)
+        except Exception:
+            print(traceback.format_exc())
@@ -0,0 +1,143 @@
+import asyncio
+import traceback
+from typing import Optional
+from sqlalchemy import update, insert, bindparam
+
+from models.device_model import Device
+from models.device_to_model_model import DeviceModelRelation
+from models.firmware_rollout_model import FirmwareRolloutDevice
+from utils.config_manage import ConfigManage
+from utils.sql_manage import async_session_maker
+
+
+class DeviceWriteBehind:
+    """
+        Write-behind queue of device columns changed by completed tasks (firmware_id, operation_model, current_model_id)
+        and of device / model relations added by MODEL_DOWNLOAD, and OTA results of firmware rollout devices.
+
+        Updates of one device are merged, the last value of a column wins. Everything waiting is written in one
+        transaction with one executemany statement per set of changed columns, WRITE_BEHIND_FLUSH_INTERVAL seconds after
+        the first change or as soon as WRITE_BEHIND_BATCH_SIZE devices are waiting, and on shutdown (see stop).
+    """
+
+    # device_id -> { "user_id", "values" }
+    pending_updates: dict = {}
+    pending_relations: set = set()
+    # (rollout_id, device_id) -> (status, reason)
+    pending_rollout_results: dict = {}
+    flush_timer: Optional[asyncio.TimerHandle] = None
+    flush_lock: Optional[asyncio.Lock] = None
+
+
+    @classmethod
+    def enqueue_update(cls, user_id: str, device_id: str, values: dict):
+        pending = cls.pending_updates.setdefault(device_id, { "user_id": user_id, "values": {} })
+        pending["user_id"] = user_id
+        pending["values"].update(values)
+        cls.schedule_flush()
+
+
+    @classmethod
+    def enqueue_relation(cls, device_id: str, model_id: str):
+        cls.pending_relations.add((device_id, model_id))
+        cls.schedule_flush()
+
+
+    @classmethod
+    def enqueue_rollout_result(cls, rollout_id: str, device_id: str, status: str, reason: str | None = None):
+        cls.pending_rollout_results[(rollout_id, device_id)] = (status, reason)
+        cls.schedule_flush()
+
+
+    @classmethod
+    def schedule_flush(cls):
+        loop = asyncio.get_running_loop()
+        if len(cls.pending_updates) + len(cls.pending_relations) + len(cls.pending_rollout_results) >= ConfigManage.WRITE_BEHIND_BATCH_SIZE:
+            if cls.flush_timer:
+                cls.flush_timer.cancel()
+            cls.flush_timer = loop.call_soon(lambda: asyncio.create_task(cls.flush()))
+        elif cls.flush_timer is None:
+            cls.flush_timer = loop.call_later(ConfigManage.WRITE_BEHIND_FLUSH_INTERVAL, lambda: asyncio.create_task(cls.flush()))
+
+
+    @classmethod
+    async def flush(cls):
+        if cls.flush_lock is None:
+            cls.flush_lock = asyncio.Lock()
+        # Flushes never overlap, a later value must not be written before an earlier one.
+        async with cls.flush_lock:
+            cls.flush_timer = None
+            updates, cls.pending_updates = cls.pending_updates, {}
+            relations, cls.pending_relations = cls.pending_relations, set()
+            rollout_results, cls.pending_rollout_results = cls.pending_rollout_results, {}
+            if not updates and not relations and not rollout_results:
+                return
+
+            try:
+                async with async_session_maker() as db:
+                    await cls.write(db=db, updates=updates, relations=relations, rollout_results=rollout_results)
+                    await db.commit()
+                return
+            except Exception:
+                print(f"Write-behind flush of {len(updates)} device updates, {len(relations)} relations and {len(rollout_results)} rollout results failed, retry one by one.")
+                print(traceback.format_exc())
+
+            # One bad row must not lose the whole batch.
+            for device_id, pending in updates.items():
+                await cls.write_one(updates={ device_id: pending })
+            for relation in relations:
+                await cls.write_one(relations={ relation })
+            for key, value in rollout_results.items():
+                await cls.write_one(rollout_results={ key: value })
+
+
+    @classmethod
+    async def write_one(cls, updates: dict | None = None, relations: set | None = None, rollout_results: dict | None = None):
+        try:
+            async with async_session_maker() as db:
+                await cls.write(db=db, updates=updates or {}, relations=relations or set(), rollout_results=rollout_results or {})
+                await db.commit()
+        except Exception:
+            print(f"Write-behind drop device updates: {updates}, relations: {relations}, rollout results: {rollout_results}")
+            print(traceback.format_exc())
+
+
+    @classmethod
+    async def write(cls, db, updates: dict, relations: set, rollout_results: dict):
+        groups: dict = {}
+        for device_id, pending in updates.items():
+            if pending["values"]:
+                groups.setdefault(tuple(sorted(pending["values"])), []).append(
+                    { "b_device_id": device_id, "b_user_id": pending["user_id"], **{ f"b_{column}": value for column, value in pending["values"].items() } }
+                )
+
+        for columns, rows in groups.items():
+            query = update(Device.__table__)                                \
+                .where(Device.id == bindparam("b_device_id"))              \
+                .where(Device.user_id == bindparam("b_user_id"))           \
+                .values({ column: bindparam(f"b_{column}") for column in columns })
+            await db.execute(query, rows)
+
+        if relations:
+            await db.execute(insert(DeviceModelRelation), [{ "device_id": device_id, "model_id": model_id } for device_id, model_id in relations])
+
+        if rollout_results:
+            # Only devices still waiting for their result, a device failed by wave timeout stays failed.
+            query = update(FirmwareRolloutDevice.__table__)                                 \
+                .where(FirmwareRolloutDevice.rollout_id == bindparam("b_rollout_id"))      \
+                .where(FirmwareRolloutDevice.device_id == bindparam("b_device_id"))        \
+                .where(FirmwareRolloutDevice.status == "SENT")                             \
+                .values(status=bindparam("b_status"), reason=bindparam("b_reason"))
+            await db.execute(query, [
+                { "b_rollout_id": rollout_id, "b_device_id": device_id, "b_status": status, "b_reason": reason }
+                for (rollout_id, device_id), (status, reason) in rollout_results.items()
+            ])
+
+
+    @classmethod
+    async def stop(cls):
+        """Flush everything still waiting, called by the app lifespan before the database engine is disposed."""
+        if cls.flush_timer:
+            cls.flush_timer.cancel()
+        await cls.flush()
+
@@ -22,7 +22,7 @@ const DeviceDetail = () => {
   const param = useParams<{id:string}>();
   const id = param.id;
   
-  const { stateQueue, setStateQueue } = useWs();
+  const { stateQueue, setStateQueue, isConnected, subscribe, unsubscribe } = useWs();
   const [activeMode, setActiveMode] = useState('STAND_BY_MODE');
   const [device, setDevice] = useState<Device | null>(null);
   const [isGetDevice, setIsGetDevice ] = useState<boolean>(true);
@@ -62,6 +62,15 @@ const DeviceDetail = () => {
   }, [id])
 
 
+  useEffect(() => {
+      if (!id || !isConnected) return;
+      subscribe(id, ["frames", "logs"]);
+      return () => {
+        unsubscribe(id, ["frames", "logs"]);
+      }
+  }, [id, isConnected])
+
+
   useEffect(() => {
       if (!stateQueue.length) return;
       const message = stateQueue[0];
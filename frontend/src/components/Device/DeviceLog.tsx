@@ -1,13 +1,31 @@
 import { useEffect, useRef } from "react";
 import { DeviceLogsSectionProps } from "@/components/device/types";
 import { useWs, DeviceLogType } from "@/context/WebSocketContext";
+import getDeviceLogsAPI from "@/api/device/getDeviceLogsAPI";
 import { ListChecks } from "lucide-react";
 
 const DeviceLog: React.FC<DeviceLogsSectionProps> = ({ device_id }) => {
-    const { deviceLogs } = useWs();
+    const { deviceLogs, setDeviceLogs } = useWs();
     const logContainerRef = useRef<HTMLDivElement>(null);
     const currentLogs = deviceLogs[device_id] || [];
 
+    // Recent lines kept by backend, so a late opened page does not start empty.
+    useEffect(() => {
+        const getDeviceLogs = async () => {
+            try{
+                const result = await getDeviceLogsAPI(device_id);
+                const tailLogs = result.data.logs.map(({ level, message }: DeviceLogType) => ({ level, message }));
+                setDeviceLogs((prev) => ({
+                    ...prev,
+                    [device_id]: prev[device_id]?.length ? prev[device_id] : tailLogs
+                }));
+            }catch(error){
+                console.error("Get device logs failed:", error);
+            }
+        }
+        getDeviceLogs();
+    }, [device_id]);
+
     useEffect(() => {
         if (logContainerRef.current) {
             logContainerRef.current.scrollTop = logContainerRef.current.scrollHeight;
@@ -8,8 +8,9 @@ import { processApiError } from '@/lib/error';
 
 
 const InferenceSection: React.FC<InferenceSectionProps> = ({ device_id, device_status, activeMode, isInference, setIsInference }) => {
-    const { deviceImages, setDeviceImages } = useWs();
+    const { deviceImages, setDeviceImages, deviceDetections } = useWs();
     const [imageUrl, setImageUrl] = useState<string | null>(null);
+    const [imageSize, setImageSize] = useState<{ width: number, height: number } | null>(null);
     const [lastInferenceText, setLastInferenceText] = useState<string>("Waiting for inference data..."); // For inference text
     
     useEffect(() => {
@@ -84,9 +85,36 @@ const InferenceSection: React.FC<InferenceSectionProps> = ({ device_id, device_s
 
     return (
         <> 
-            <div className="w-full aspect-video flex items-center justify-center bg-gray-200 rounded-lg text-gray-500 overflow-hidden">
+            <div className="relative w-full aspect-video flex items-center justify-center bg-gray-200 rounded-lg text-gray-500 overflow-hidden">
                 {imageUrl ? (
-                    <img src={imageUrl} alt="Live Inference Feed" className="w-full h-full object-cover" />
+                    <>
+                        <img
+                            src={imageUrl}
+                            alt="Live Inference Feed"
+                            className="w-full h-full object-cover"
+                            onLoad={(e) => setImageSize({ width: e.currentTarget.naturalWidth, height: e.currentTarget.naturalHeight })}
+                        />
+                        {/* Bounding boxes sent by server in client annotation mode */}
+                        {imageSize && deviceDetections[device_id] && (
+                            <svg
+                                className="absolute inset-0 w-full h-full pointer-events-none"
+                                viewBox={`0 0 ${imageSize.width} ${imageSize.height}`}
+                                preserveAspectRatio="xMidYMid slice"
+                            >
+                                {deviceDetections[device_id].filter((result) => result.box.length === 4).map((result, index) => {
+                                    const [x1, y1, x2, y2] = result.box;
+                                    return (
+                                        <g key={index}>
+                                            <rect x={x1} y={y1} width={x2 - x1} height={y2 - y1} fill="none" stroke="red" strokeWidth={2} />
+                                            <text x={x1 + 5} y={y1 + 14} fill="white" stroke="red" strokeWidth={3} paintOrder="stroke" fontSize={12}>
+                                                {`${result.label}: ${(result.score * 100).toFixed(1)}%`}
+                                            </text>
+                                        </g>
+                                    );
+                                })}
+                            </svg>
+                        )}
+                    </>
                 ) : (
                     <div className="text-center">
                     <ImageIcon className="w-16 h-16 mx-auto text-gray-400 mb-2" />
@@ -12,10 +12,15 @@ interface WebSocketContextType {
     setDeviceImages: Dispatch<SetStateAction<Record<string, Blob[]>>>;
     deviceLogs: Record<string, DeviceLogType[]>;
     setDeviceLogs: Dispatch<SetStateAction<Record<string, DeviceLogType[]>>>;
+    deviceDetections: Record<string, InferenceDetectionType[]>;
     newDevices: Device[];
     setNewDevices: Dispatch<SetStateAction<Device[]>>;
+    subscribe: (device_id: string, kinds?: StreamKindType[]) => void;
+    unsubscribe: (device_id: string, kinds?: StreamKindType[]) => void;
 }
 
+export type StreamKindType = "frames" | "logs" | "tasks";
+
 interface ConnectionStateType {
     action: string;
     device_id: string;
@@ -29,6 +34,13 @@ export interface DeviceLogType {
     message: string;
 }
 
+export interface InferenceDetectionType {
+    category: number | string;
+    label: string;
+    score: number;
+    box: number[];
+}
+
 const WebSocketContext = createContext<WebSocketContextType>({
     isConnected: false,
     status:"disconnected",
@@ -38,8 +50,11 @@ const WebSocketContext = createContext<WebSocketContextType>({
     setDeviceImages: () => {},
     deviceLogs: {},
     setDeviceLogs: () => {},
+    deviceDetections: {},
     newDevices: [],
-    setNewDevices: () => {}
+    setNewDevices: () => {},
+    subscribe: () => {},
+    unsubscribe: () => {}
 })
 
 
@@ -48,12 +63,34 @@ const base64ToBlob = async (base64Str: string, type: string = "image/jpeg") => {
     return res.blob();
 }
 
+/**
+ * Binary image frame from backend (big-endian):
+ * version (1B) | content type (1B) | sequence (4B) | device_id length (2B) | device_id | payload
+ */
+const FRAME_CONTENT_TYPES: Record<number, string> = { 1: "image/jpeg" };
+
+const decodeBinaryFrame = (buffer: ArrayBuffer) => {
+    const view = new DataView(buffer);
+    const contentType = view.getUint8(1);
+    const sequence = view.getUint32(2);
+    const deviceIdLength = view.getUint16(6);
+    const deviceId = new TextDecoder().decode(new Uint8Array(buffer, 8, deviceIdLength));
+    const payload = buffer.slice(8 + deviceIdLength);
+    return {
+        device_id: deviceId,
+        sequence,
+        blob: new Blob([payload], { type: FRAME_CONTENT_TYPES[contentType] || "application/octet-stream" })
+    };
+}
+
 export const WebSocketProvider: React.FC<{children: ReactNode}> = ({children}) => {
     
     const MAX_BUFFER_SIZE = 100;
     const MAX_LOG_SIZE = 100;
     const ws = useRef<WebSocket | null>(null);
     const isMounted = useRef(true);
+    // INFERENCE_METADATA waiting for its frame, backend always sends it right before the frame it belongs to.
+    const pendingDetections = useRef<Record<string, InferenceDetectionType[]>>({});
     const { user } = useAuth();
     const [isConnected, setIsConnected] = useState<boolean>(false);
     const [status, setStatus] = useState<string>("disconnected");
@@ -61,8 +98,27 @@ export const WebSocketProvider: React.FC<{children: ReactNode}> = ({children}) =
     const [stateQueue, setStateQueue] = useState<ConnectionStateType[]>([]);
     const [deviceImages, setDeviceImages] = useState<Record<string, Blob[]>>({});
     const [deviceLogs, setDeviceLogs] = useState<Record<string, DeviceLogType[]>>({});
+    const [deviceDetections, setDeviceDetections] = useState<Record<string, InferenceDetectionType[]>>({});
     
 
+    /**
+     * Only subscribed device streams are pushed by backend, device_id "*" means all devices.
+     */
+    const sendStreamAction = (action: "SUBSCRIBE" | "UNSUBSCRIBE", device_id: string, kinds?: StreamKindType[]) => {
+        if(ws.current && ws.current.readyState === WebSocket.OPEN){
+            ws.current.send(JSON.stringify({ action, device_id, kinds }));
+        }
+    }
+
+    const subscribe = (device_id: string, kinds: StreamKindType[] = ["frames", "logs", "tasks"]) => {
+        sendStreamAction("SUBSCRIBE", device_id, kinds);
+    }
+
+    const unsubscribe = (device_id: string, kinds?: StreamKindType[]) => {
+        sendStreamAction("UNSUBSCRIBE", device_id, kinds);
+    }
+
+
     useEffect(() => {
 
         if(user){
@@ -73,20 +129,64 @@ export const WebSocketProvider: React.FC<{children: ReactNode}> = ({children}) =
 
             const requestURI = `${process.env.NEXT_PUBLIC_BACKEND_WEBSOCKET_HOSTNAME}/api/user/ws/${user.id}`;
             const websocket = new WebSocket(requestURI);
+            websocket.binaryType = "arraybuffer";
             ws.current = websocket;
 
     
             websocket.onopen = () => {
                 if(isMounted.current){
+                    // Device cards need task events of every device, frames and logs are subscribed by detail page.
+                    subscribe("*", ["tasks"]);
                     setIsConnected(true);
                     setStatus("connected");
                     console.log('WebSocket connected');
                 }
             }
     
+            const pushDeviceImage = (device_id: string, imageBlob: Blob) => {
+                setDeviceImages((prev) => {
+                    const existingImages = prev[device_id] || [];
+                    const updatedImages = [...existingImages, imageBlob]
+                    if (updatedImages.length > MAX_BUFFER_SIZE){
+                        updatedImages.shift();
+                    }
+                    return {
+                        ...prev,
+                        [device_id]: updatedImages
+                    }
+                });
+            }
+
+            /**
+             * Boxes follow the frame they belong to, a frame without metadata (mode without detections,
+             * server annotated image) clears the boxes of the previous one.
+             * Taken as soon as the frame arrives, before any await, metadata of the next frame may come meanwhile.
+             */
+            const takePendingDetections = (device_id: string) => {
+                const detections = pendingDetections.current[device_id] || [];
+                delete pendingDetections.current[device_id];
+                return detections;
+            }
+
+            const pushDeviceFrame = (device_id: string, imageBlob: Blob, detections: InferenceDetectionType[]) => {
+                setDeviceDetections((prev) => ({
+                    ...prev,
+                    [device_id]: detections
+                }));
+                pushDeviceImage(device_id, imageBlob);
+            }
+    
             websocket.onmessage = async (event) => {
                 if (isMounted.current){
-                    if(typeof event.data === "string") {
+                    if(event.data instanceof ArrayBuffer) {
+                        try{
+                            const { device_id, blob } = decodeBinaryFrame(event.data);
+                            pushDeviceFrame(device_id, blob, takePendingDetections(device_id));
+                        }catch(e){
+                            console.error("Failed to decode binary frame: ", e);
+                        }
+
+                    }else if(typeof event.data === "string") {
                         try{
                             const data = JSON.parse(event.data)
                             if(data.action === "NEW_DEVICE"){
@@ -120,6 +220,12 @@ export const WebSocketProvider: React.FC<{children: ReactNode}> = ({children}) =
                                 if(status === "RECEIVED"){
                                     setStateQueue(prev => [...prev, { action: "BUSY", device_id}]);
                                 }else if(status === "COMPLETED"){
+                                    // Boxes of the previous mode must not stay on the next frames.
+                                    delete pendingDetections.current[device_id];
+                                    setDeviceDetections((prev) => ({
+                                        ...prev,
+                                        [device_id]: []
+                                    }));
                                     setStateQueue(prev => [...prev, { action: "CONNECTED", device_id, mode}]);
                                 }else if(status === "ERROR"){
                                     setStateQueue(prev => [...prev, { action: "CONNECTED", device_id}]);
@@ -154,24 +260,32 @@ export const WebSocketProvider: React.FC<{children: ReactNode}> = ({children}) =
                                 const { device_id, image_data } = data;
                                 console.log("INFERENECE_RESULT: ", device_id);
                                 
+                                const detections = takePendingDetections(device_id);
                                 try{
                                     const imageBlob = await base64ToBlob(image_data);
-                                    setDeviceImages((prev) => {
-                                        const existingImages = prev[device_id] || [];
-                                        const updatedImages = [...existingImages, imageBlob]
-                                        if (updatedImages.length > MAX_BUFFER_SIZE){
-                                            updatedImages.shift();
-                                        }
-                                        return {
-                                            ...prev,
-                                            [device_id]: updatedImages
-                                        }
-                                    });
+                                    pushDeviceFrame(device_id, imageBlob, detections);
 
                                 }catch(e){
                                     console.error("Error converting Base64 to Blob:", e);
                                 }
                             
+                            }else if(data.action === "INFERENCE_METADATA"){
+
+                                const { device_id, inference_results } = data;
+                                pendingDetections.current[device_id] = inference_results;
+
+                            }else if(data.action === "LOG_BATCH"){
+
+                                const { device_id, logs } = data;
+                                setDeviceLogs((prev) => {
+                                    const existingLogs = prev[device_id] || [];
+                                    const receivedLogs = logs.map(({ level, message }: DeviceLogType) => ({ level, message }));
+                                    return {
+                                        ...prev,
+                                        [device_id]: [...existingLogs, ...receivedLogs].slice(-MAX_LOG_SIZE)
+                                    };
+                                })
+
                             }else if(data.action === "LOG"){
 
                                 const { device_id, level, message } = data;
@@ -231,7 +345,7 @@ export const WebSocketProvider: React.FC<{children: ReactNode}> = ({children}) =
 
 
     return (
-        <WebSocketContext.Provider value={{isConnected, status, stateQueue, setStateQueue, deviceImages, setDeviceImages, deviceLogs, setDeviceLogs, newDevices, setNewDevices}}>
+        <WebSocketContext.Provider value={{isConnected, status, stateQueue, setStateQueue, deviceImages, setDeviceImages, deviceLogs, setDeviceLogs, deviceDetections, newDevices, setNewDevices, subscribe, unsubscribe}}>
             {children}
         </WebSocketContext.Provider>
     )
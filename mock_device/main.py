@@ -102,8 +102,21 @@ async def send_periodic_logs(websocket):
             break
 
 
+async def send_heartbeats(websocket, interval: float):
+    print(f"Heartbeat task started, interval: {interval}")
+    while True:
+        try:
+            await asyncio.sleep(interval)
+            await websocket.send(json.dumps({ "action": "HEARTBEAT" }))
+
+        except websockets.exceptions.ConnectionClosed:
+            print("Connection closed. Stopping heartbeat task.")
+            break
+
+
 async def handle_received_messages(websocket):
     print("Message receiving task started.")
+    heartbeat_task = None
     async for message in websocket:
         try:
             data = json.loads(message)
@@ -112,6 +125,9 @@ async def handle_received_messages(websocket):
             print("Received message: ", data)
             print("="*30)
 
+            if action in ("INIT", "RESUMED") and data.get("heartbeat_interval") and heartbeat_task is None:
+                heartbeat_task = asyncio.create_task(send_heartbeats(websocket, interval=data["heartbeat_interval"]))
+
             if action == "INIT":
                 response = await init_task(status="COMPLETED", delay=5)
                 await websocket.send(json.dumps(response))
@@ -144,6 +160,9 @@ async def handle_received_messages(websocket):
                 response = await model_switch_task(task_id=task_id, status="COMPLETED", delay=5)
                 await websocket.send(json.dumps(response))
 
+            elif action == "RESUMED":
+                pass
+
             elif action == "INFERENCE":
                 text_response, bytes_response = await inference_task(delay=2)
                 await websocket.send(message=bytes_response)